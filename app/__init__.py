@@ -1,36 +1,87 @@
 """This file contains API endpoint logic for the APP"""
 from flask_api import FlaskAPI, status
-from flask_sqlalchemy import SQLAlchemy
-from flask_bcrypt import Bcrypt
-from flask_mail import Mail
 from instance.config import app_config
+from app.blacklist import BlacklistIndex
+from app.cache import ResponseCache, TokenCache
+from app.hashing import PasswordHasher
+from app.metrics import Metrics
+from app.pool import PooledSQLAlchemy
+from app.profiling import RequestProfiler
+from app.routing import ReplicaRouter
+from app.startup import LazyBlueprints, LazyExtension, StartupTimer
 # Lets initialise our db
-db = SQLAlchemy()
+db = PooledSQLAlchemy()
 
-# Lets create an instance of the mail App
-mail = Mail()
+# Lets create an instance of the mail App, loaded on first use when lazy
+mail = LazyExtension('flask_mail:Mail')
 
+# Lets create a cache of verified access tokens shared by our views
+token_cache = TokenCache()
 
-def create_app(config_name):
-    """This wraps our flask app into one function for easy creation of the app
-     using our environment config and varying contexts
-    """
-    from app.models import ShoppingList, User, ShoppingListItem
+# Lets cache the responses of the GET endpoints per user
+response_cache = ResponseCache()
+
+# Lets keep an in-memory index of blacklisted tokens
+blacklist_index = BlacklistIndex()
+
+# Lets send read-only requests to the read replicas
+replica_router = ReplicaRouter()
 
-    # Lets initialize an instance of our flask API
-    app = FlaskAPI(__name__, instance_relative_config=True)
+# Lets record the Prometheus metrics of every request
+metrics = Metrics()
 
-    # Lets create an instance of our Bcrytpt extension to overide the default
-    bcrypt = Bcrypt(app)
+# Lets count the queries and time the work of every request
+request_profiler = RequestProfiler()
 
-    # Load our flask instance with config from config file
-    app.config.from_object(app_config[config_name])
+# Lets create the password hasher that runs bcrypt off the request thread
+password_hasher = PasswordHasher()
 
-    # Diasble track modifications  reduce performance over head
-    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Lets register the blueprints, on first use when lazy
+blueprints = LazyBlueprints([
+    # authentication
+    'app.auth:auth_blueprint',
+    # shoppinglists
+    'app.shoppinglist:shoppinglist_blueprint',
+    # shopping list items
+    'app.item:item_blueprint',
+    # shopping search items ans lists
+    'app.search:search_blueprint',
+    # cache and pool counters and the Prometheus metrics
+    'app.instrumentation:instrumentation_blueprint',
+])
 
-    db.init_app(app)
-    mail.init_app(app)
+
+def create_app(config_name):
+    """This wraps our flask app into one function for easy creation of the app
+     using our environment config and varying contexts
+    """
+    # Lets time each step so slow startups can be tracked down
+    timer = StartupTimer()
+    with timer.phase('models'):
+        from app.models import ShoppingList, User, ShoppingListItem
+        # The search indexes are created along with the tables, whether or
+        # not the blueprints are registered yet
+        from app.search import engine  # noqa: F401
+
+    with timer.phase('config'):
+        # Lets initialize an instance of our flask API
+        app = FlaskAPI(__name__, instance_relative_config=True)
+
+        # Load our flask instance with config from config file
+        app.config.from_object(app_config[config_name])
+
+        # Diasble track modifications  reduce performance over head
+        app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+    for name, extension in [('db', db), ('metrics', metrics), ('mail', mail),
+                            ('token_cache', token_cache),
+                            ('response_cache', response_cache),
+                            ('replica_router', replica_router),
+                            ('request_profiler', request_profiler),
+                            ('blacklist_index', blacklist_index),
+                            ('password_hasher', password_hasher)]:
+        with timer.phase(name):
+            extension.init_app(app)
 
     # decorator used to allow cross origin requests
     @app.after_request
@@ -39,30 +90,21 @@ def create_app(config_name):
 
         response.headers["Access-Control-Allow-Credentials"] = "true"
         response.headers["Access-Control-Allow-Methods"] = "GET,HEAD,OPTIONS," \
-                                                        "POST,PUT,DELETE"
+                                                        "POST,PUT,PATCH,DELETE"
         response.headers["Access-Control-Allow-Headers"] = "Access-Control-Allow-" \
             "Headers, Origin,Accept, X-Requested-With, Content-Type, " \
             "Access-Control-Request-Method, Access-Control-Request-Headers," \
-            "Access-Control-Allow-Origin, Authorization"
+            "Access-Control-Allow-Origin, Authorization, If-None-Match, " \
+            "If-Modified-Since"
+        # Lets allow clients to read the link to the next page and the
+        # validators they send back on conditional requests
+        response.headers["Access-Control-Expose-Headers"] = \
+            "Link, ETag, Last-Modified, X-Cache, Server-Timing"
 
         return response
 
-    # Import the required blueprints
-    from .auth import auth_blueprint
-    from .shoppinglist import shoppinglist_blueprint
-    from .item import item_blueprint
-    from .search import search_blueprint
-
-    # authentication
-    app.register_blueprint(auth_blueprint)
-
-    # shoppinglists
-    app.register_blueprint(shoppinglist_blueprint)
-
-    # shopping list items
-    app.register_blueprint(item_blueprint)
-
-    # shopping search items ans lists
-    app.register_blueprint(search_blueprint)
+    with timer.phase('blueprints'):
+        blueprints.init_app(app)
 
+    app.startup_timings = timer.finish()
     return app
@@ -0,0 +1,94 @@
+"""This file contains the index advisor, which runs EXPLAIN on the queries
+behind the hot endpoints and flags the ones that scan a whole table
+"""
+from datetime import datetime
+
+from app import db, outbox, reads
+from app.models import BlacklistToken, ShoppingList, ShoppingListItem, User
+from app.search import engine
+
+
+def hot_queries():
+    """Returns the name and query of every query the busy endpoints run,
+    built by the same helpers the views use"""
+    return [
+        ('login: user by email', User.query.filter_by(
+            email='user@example.com')),
+        ('auth: blacklist check', BlacklistToken.query.filter_by(
+            token_digest=BlacklistToken.digest('token'))),
+        ('GET /shoppinglists/', ShoppingList.page_query(1, 100)),
+        ('GET /shoppinglists/ next page', ShoppingList.page_query(
+            1, 100, after_id=100)),
+        ('GET /shoppinglists/ fingerprint',
+         ShoppingList.fingerprint_query(1)),
+        ('GET /shoppinglists/?include=items', reads.items_query([1, 2], 100)),
+        ('GET /shoppinglists/<id>', ShoppingList.query.filter_by(id=1)),
+        ('GET /shoppinglists/<id>/items', ShoppingListItem.page_query(
+            1, 1, 100)),
+        ('GET /shoppinglists/<id>/items fingerprint',
+         ShoppingListItem.fingerprint_query(1, 1)),
+        ('GET /shoppinglists/<id>/items?since=', ShoppingListItem.page_query(
+            1, 1, 100, after_id=100, since=datetime(2017, 1, 1))),
+        ('search: shoppinglists', engine.search_query(
+            ShoppingList, engine.user_shoppinglists(1), 'milk').limit(10)),
+        ('search: items', engine.search_query(
+            ShoppingListItem, engine.user_items(1), 'milk').limit(10)),
+        ('outbox: due emails', outbox.due_query(
+            50, 5, now=datetime(2017, 1, 1))),
+        ('blacklist: purge expired', BlacklistToken.query.filter(
+            BlacklistToken.expires_at < datetime(2017, 1, 1))),
+    ]
+
+
+def explain(query):
+    """Returns the lines of the query plan chosen for query"""
+    dialect = db.engine.dialect
+    compiled = query.statement.compile(dialect=dialect)
+    if dialect.positional:
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+    else:
+        params = compiled.params
+
+    if dialect.name == 'sqlite':
+        rows = db.session.connection().execute(
+            'EXPLAIN QUERY PLAN ' + str(compiled), params)
+        return [row[-1] for row in rows]
+    connection = db.session.connection()
+    # Postgres prefers a Seq Scan over an index on small tables, lets make
+    # it pick the index whenever there is one so the advice does not
+    # depend on the data. This only lasts until the transaction ends.
+    connection.execute('SET LOCAL enable_seqscan = off')
+    rows = connection.execute('EXPLAIN ' + str(compiled), params)
+    return [row[0] for row in rows]
+
+
+def subqueries(plan):
+    """Returns the names SQLite gives the subqueries of a plan"""
+    return set(line.strip().split(' ', 1)[1] for line in plan
+               if line.strip().startswith(('CO-ROUTINE ', 'MATERIALIZE ')))
+
+
+def is_full_scan(line, subquery_names=()):
+    """Checks if a plan line reads a whole table, rather than the rows of
+    one of subquery_names"""
+    line = line.strip()
+    if 'Seq Scan' in line:
+        return True
+    # SQLite says SCAN for full passes and SEARCH when it uses an index
+    return (line.startswith('SCAN') and 'VIRTUAL TABLE' not in line and
+            'USING' not in line and line[5:] not in subquery_names)
+
+
+def advise():
+    """Explains every hot query and returns the report along with the
+    number of queries that scan a whole table"""
+    report = []
+    flagged = 0
+    for name, query in hot_queries():
+        plan = explain(query)
+        names = subqueries(plan)
+        scans = [line.strip() for line in plan if is_full_scan(line, names)]
+        flagged += bool(scans)
+        report.append('{} {}'.format('SCAN' if scans else 'ok  ', name))
+        report.extend('       ' + line for line in plan)
+    return report, flagged
@@ -1,16 +1,24 @@
 """This file contains the API logic for handling Auhtentication based requests
 for registration and login
 """
-import uuid
-
-from app import mail
-from app.models import BlacklistToken, User
+from app.hashing import HasherBusy
+from app.models import BlacklistToken, OutboxMail, User
 from flask import Blueprint, jsonify, make_response, request
 from flask.views import MethodView
-from flask_mail import Message
 
 from . import auth_blueprint
 
+# Seconds clients are asked to wait when the password hasher is busy
+RETRY_AFTER = 1
+
+
+def hasher_busy(error):
+    """Returns the 503 response asking the client to retry after the
+    password hasher raised error"""
+    response = make_response(jsonify({'message': str(error)}))
+    response.headers['Retry-After'] = str(RETRY_AFTER)
+    return response, 503
+
 
 class RegistrationView(MethodView):
     """This class registers a new user."""
@@ -47,6 +55,9 @@ class RegistrationView(MethodView):
                     'message': 'You registered successfully. Please log in.'
                 }
                 return make_response(jsonify(response)), 201
+            except HasherBusy as e:
+                # Too many passwords are being hashed, ask them to retry
+                return hasher_busy(e)
             except Exception as e:
                 # Return to requestor a message with the error that occured
                 response = {'message': str(e)}
@@ -67,23 +78,22 @@ class PasswordResetView(MethodView):
         # lets check if the user exists
         try:
             user = User.query.filter_by(email=request.data['email']).first()
-            access_token = user.generate_token(user.id)
         except Exception as e:
             response = {'message': str(e)}
             return make_response(jsonify(response)), 400
 
-        if user and access_token:
+        if user:
             # TODO: implement this
-            msg = Message(
-                "Shopping list API Password Reset",
-                sender="Shopping List API<test.mail.ug@gmail.com",
-                recipients=["luwyxx@gmail.com"])
-            msg.html = "Hello, click <a href='{}?auth_token={}'>here</a> to reset your \
-            password. If you didnt not request this please ignore".format(
-                request.base_url, access_token.decode())
-
             try:
-                mail.send(msg)
+                # The outbox worker renders the email with a reset token
+                # and sends it once it is queued
+                OutboxMail.enqueue(
+                    "Shopping list API Password Reset",
+                    sender="Shopping List API<test.mail.ug@gmail.com",
+                    recipients=["luwyxx@gmail.com"],
+                    template='password_reset_link',
+                    user_id=user.id,
+                    link=request.base_url)
                 response = {
                     'message':
                     'You request for password reset has been received. Check your email \
@@ -108,23 +118,16 @@ class PasswordResetView(MethodView):
             # Check if user is authenticated
             if not isinstance(user_id, str):
                 user = User.query.filter_by(id=user_id).first()
-                # Lets generate some string to use as the new password
-                password = str(uuid.uuid4())
-                password.replace("-", "")
-                password = password[0:8]
-                user.password = user.hash_password(password)
-                user.save()
 
-                # Lets prepare the email content
-                msg = Message(
-                    "Shopping list API Password Reset",
-                    sender="Shopping List API<test.mail.ug@gmail.com",
-                    recipients=["luwyxx@gmail.com"])
-                msg.html = "Your password was succesfully reset, you can use \
-                <b>{}</b> to login".format(password)
-                # Lets send the email
+                # Lets queue the email for the outbox worker, which sets
+                # the new password when it sends it
                 try:
-                    mail.send(msg)
+                    OutboxMail.enqueue(
+                        "Shopping list API Password Reset",
+                        sender="Shopping List API<test.mail.ug@gmail.com",
+                        recipients=["luwyxx@gmail.com"],
+                        template='new_password',
+                        user_id=user.id)
                     # blacklist the token used
                     blacklist_token = BlacklistToken(token=access_token)
                     blacklist_token.save()
@@ -187,6 +190,12 @@ class LoginView(MethodView):
             # Try to authenticate the found user using their password
             if user and user.password_is_valid(request.data['password']):
 
+                # Lets upgrade the stored hash if the bcrypt cost changed
+                if user.password_needs_rehash():
+                    user.password = user.hash_password(
+                        request.data['password'])
+                    user.save()
+
                 # Generate the access token for authentication
                 access_token = user.generate_token(user.id)
                 if access_token:
@@ -202,6 +211,10 @@ class LoginView(MethodView):
                 }
                 return make_response(jsonify(response)), 401
 
+        except HasherBusy as e:
+            # Too many passwords are being checked, ask them to retry
+            return hasher_busy(e)
+
         except Exception as e:
             # Prepare and send a response with the error that has occured
             response = {'message': str(e)}
@@ -0,0 +1,308 @@
+"""This file contains the in-memory index of blacklisted tokens that lets
+most blacklist checks be answered without a database query
+"""
+import hashlib
+import logging
+import math
+import os
+import struct
+import threading
+import time
+
+from flask import current_app
+
+from app.cache import RedisBackend
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter(object):
+    """A fixed size Bloom filter over strings.
+
+    might_contain never returns False for a key that was added, and returns
+    True for a key that was not added with a probability of about
+    error_rate as long as no more than capacity keys are added.
+    """
+
+    _header = struct.Struct('>QQQQ')
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.capacity = max(int(capacity), 1)
+        self.error_rate = error_rate
+        self.size = int(math.ceil(
+            -self.capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(
+            int(round(self.size / float(self.capacity) * math.log(2))), 1)
+        self.count = 0
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        # Lets derive all bit positions from two halves of one digest
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'big')
+        second = int.from_bytes(digest[8:], 'big') | 1
+        size = self.size
+        return [(first + i * second) % size for i in range(self.hash_count)]
+
+    def add(self, key):
+        """Adds key to the filter"""
+        bits = self.bits
+        is_new = False
+        for position in self._positions(key):
+            mask = 1 << (position & 7)
+            if not bits[position >> 3] & mask:
+                bits[position >> 3] |= mask
+                is_new = True
+        # Keys that were already present are not counted again
+        if is_new:
+            self.count += 1
+
+    def might_contain(self, key):
+        """Returns False when key was certainly never added"""
+        bits = self.bits
+        for position in self._positions(key):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def dump(self, file_obj, max_id=0):
+        """Writes the filter to a binary file along with the highest
+        blacklist row id it covers"""
+        file_obj.write(self._header.pack(
+            self.capacity, int(self.error_rate * 1e9), self.count, max_id))
+        file_obj.write(self.bits)
+
+    @classmethod
+    def load(cls, file_obj):
+        """Reads a filter written by dump, returns the filter and the
+        highest row id it covers"""
+        capacity, error_rate, count, max_id = cls._header.unpack(
+            file_obj.read(cls._header.size))
+        bloom = cls(capacity, error_rate / 1e9)
+        bits = file_obj.read()
+        if len(bits) != len(bloom.bits):
+            raise ValueError('Corrupt blacklist index snapshot')
+        bloom.bits = bytearray(bits)
+        bloom.count = count
+        return bloom, max_id
+
+
+class BlacklistIndex(object):
+    """Keeps a Bloom filter of the digests of every blacklisted token.
+
+    The filter is loaded on first use, from the snapshot at
+    BLACKLIST_INDEX_PATH when one exists and otherwise from the
+    blacklist_tokens table. Tokens blacklisted in this process are added
+    straight away, and rows written by other processes are picked up every
+    BLACKLIST_INDEX_REFRESH seconds by scanning ids past the highest one
+    seen. A positive answer must still be confirmed against the database.
+    Once the filter holds more tokens than it was sized for, a bigger one
+    is built in a background thread while the old one keeps answering.
+
+    When the response cache uses Redis, every blacklisted token also bumps
+    a counter there, and a negative answer is only given once the index
+    has scanned the rows behind the current count, so a logout reaches
+    every worker at once. Otherwise a negative answer is final, which is
+    only safe in a single worker process.
+    """
+
+    version_key = 'blacklist_index:version'
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._bloom = None
+        self._shared = None
+        self._grower = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Configure the index from the app config"""
+        from app import response_cache
+
+        self.capacity = app.config.get('BLACKLIST_INDEX_CAPACITY', 1000000)
+        self.error_rate = app.config.get('BLACKLIST_INDEX_ERROR_RATE', 0.001)
+        self.refresh_interval = app.config.get('BLACKLIST_INDEX_REFRESH', 5)
+        # Ids are not always committed in order, so each refresh re-reads
+        # this many rows below the highest id seen
+        self.refresh_overlap = app.config.get('BLACKLIST_INDEX_OVERLAP', 100)
+        self.snapshot_path = app.config.get('BLACKLIST_INDEX_PATH')
+        backend = response_cache.backend
+        self._shared = backend.client if isinstance(
+            backend, RedisBackend) else None
+        self.reset()
+
+    @property
+    def shared(self):
+        """Whether every worker process sees the tokens the others
+        blacklist at once"""
+        return self._shared is not None
+
+    def reset(self):
+        """Drops the in-memory filter so it is reloaded on next use"""
+        with self._lock:
+            self._bloom = None
+            self._max_id = 0
+            self._refreshed_at = 0
+            self._version = None
+            # Tokens blacklisted while a bigger filter is being built
+            self._pending = None
+
+    def _new_filter(self, expected):
+        return BloomFilter(max(self.capacity, expected * 2), self.error_rate)
+
+    def _scan(self, bloom, after_id):
+        """Adds blacklist rows with an id above after_id to bloom and
+        returns the highest id found"""
+        from app.models import BlacklistToken
+
+        max_id = after_id
+        rows = BlacklistToken.query.with_entities(
+            BlacklistToken.id, BlacklistToken.token_digest).filter(
+                BlacklistToken.id > after_id).order_by(
+                    BlacklistToken.id).yield_per(10000)
+        for row_id, token_digest in rows:
+            bloom.add(token_digest)
+            max_id = max(max_id, row_id)
+        return max_id
+
+    def build(self):
+        """Builds a new filter from the whole blacklist table and returns it
+        along with the highest row id it covers"""
+        from app.models import BlacklistToken
+
+        bloom = self._new_filter(BlacklistToken.query.count())
+        max_id = self._scan(bloom, 0)
+        return bloom, max_id
+
+    def load(self):
+        """Loads the filter from the snapshot or the database"""
+        bloom = None
+        if self.snapshot_path and os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, 'rb') as snapshot:
+                bloom, max_id = BloomFilter.load(snapshot)
+            max_id = self._scan(bloom, max_id)
+        if bloom is None:
+            bloom, max_id = self.build()
+        self._bloom, self._max_id = bloom, max_id
+        self._refreshed_at = time.monotonic()
+
+    def rebuild(self):
+        """Rebuilds the filter from the database and writes the snapshot
+        when BLACKLIST_INDEX_PATH is set"""
+        bloom, max_id = self.build()
+        if self.snapshot_path:
+            tmp_path = self.snapshot_path + '.tmp'
+            with open(tmp_path, 'wb') as snapshot:
+                bloom.dump(snapshot, max_id)
+            os.replace(tmp_path, self.snapshot_path)
+        with self._lock:
+            self._bloom, self._max_id = bloom, max_id
+            self._refreshed_at = time.monotonic()
+        return bloom
+
+    def _catch_up(self):
+        self._max_id = self._scan(
+            self._bloom, max(self._max_id - self.refresh_overlap, 0))
+        self._refreshed_at = time.monotonic()
+
+    def _refresh(self):
+        if self._bloom is None:
+            self.load()
+        elif time.monotonic() - self._refreshed_at >= self.refresh_interval:
+            self._catch_up()
+
+        # Lets grow the filter once it holds more tokens than it was sized
+        # for, otherwise its false positive rate keeps climbing. Building
+        # it scans the whole table, which no request should wait for.
+        if self._bloom.count > self._bloom.capacity and self._pending is None:
+            self._pending = []
+            self._grower = threading.Thread(
+                target=self._grow, name='blacklist-index-grow',
+                args=(current_app._get_current_object(), self._pending),
+                daemon=True)
+            self._grower.start()
+
+    def _grow(self, app, pending):
+        """Builds a bigger filter and swaps it in for the current one"""
+        try:
+            with app.app_context():
+                bloom, max_id = self.build()
+        except Exception:
+            logger.exception('Could not grow the blacklist index')
+            bloom = None
+        with self._lock:
+            if self._pending is not pending:
+                # The index was reset meanwhile
+                return
+            self._pending = None
+            if bloom is None:
+                return
+            for token_digest in pending:
+                bloom.add(token_digest)
+            self._bloom, self._max_id = bloom, max_id
+            # Lets pick up the rows committed while it was built straight
+            # away
+            self._refreshed_at = 0
+            self._version = None
+
+    def _shared_version(self):
+        try:
+            # The counter only exists once a token was blacklisted
+            return self._shared.get(self.version_key) or b'0'
+        except Exception as e:
+            logger.warning('Blacklist index version is unavailable: %s', e)
+            return None
+
+    def might_contain(self, token_digest):
+        """Returns False when the token is certainly not blacklisted"""
+        with self._lock:
+            self._refresh()
+            if self._bloom.might_contain(token_digest):
+                return True
+        if self._shared is None:
+            return False
+
+        # Lets read the counter outside the lock, other workers bump it
+        # only once their rows are committed
+        version = self._shared_version()
+        if version is None:
+            # Without the counter the database has the final say
+            return True
+        with self._lock:
+            if version != self._version:
+                self._catch_up()
+                self._version = version
+            return self._bloom.might_contain(token_digest)
+
+    def add(self, token_digest, row_id=None):
+        """Records a token that was just blacklisted"""
+        if self._shared is not None:
+            try:
+                self._shared.incr(self.version_key)
+            except Exception as e:
+                logger.warning('Blacklist index version is unavailable: %s',
+                               e)
+        with self._lock:
+            if self._bloom is None:
+                # It will be read from the database when first loaded
+                return
+            self._bloom.add(token_digest)
+            if self._pending is not None:
+                self._pending.append(token_digest)
+            if row_id is not None:
+                self._max_id = max(self._max_id, row_id)
+
+    def stats(self):
+        """Returns the size and fill of the filter"""
+        with self._lock:
+            if self._bloom is None:
+                return {'loaded': False}
+            return {
+                'loaded': True,
+                'count': self._bloom.count,
+                'capacity': self._bloom.capacity,
+                'bytes': len(self._bloom.bits),
+                'hash_count': self._bloom.hash_count,
+                'max_id': self._max_id
+            }
@@ -0,0 +1,300 @@
+"""This file contains the caches used by the API"""
+import hashlib
+import itertools
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, request
+
+
+class LRUCache(object):
+    """A thread safe, size bounded cache whose entries expire after a TTL.
+
+    The least recently used entry is evicted once max_size is reached and
+    hits and misses are counted so the cache can be tuned.
+    """
+
+    def __init__(self, max_size=1024, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        """Returns the value stored under key or default if it is missing
+        or has expired"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return default
+
+            # Mark the entry as the most recently used
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, ttl=None):
+        """Stores value under key, evicting the least recently used entry
+        when the cache is full"""
+        if self.max_size <= 0:
+            return
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        """Removes key from the cache if present"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Removes all entries and resets the counters"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """Returns the size and hit/miss counters of the cache"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': float(self.hits) / lookups if lookups else 0.0
+            }
+
+
+class TokenCache(LRUCache):
+    """Caches verified access tokens against the id of their user.
+
+    Only tokens that decoded successfully and were not blacklisted are
+    stored, so a hit lets check_logged_in skip the signature check and
+    the blacklist query. Entries are dropped as soon as a token gets
+    blacklisted in this process, which other worker processes never see,
+    so it is turned off in production.
+    """
+
+    def __init__(self, app=None):
+        super(TokenCache, self).__init__()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Configure the cache from the app config"""
+        self.max_size = app.config.get('TOKEN_CACHE_SIZE', 10000)
+        self.ttl = app.config.get('TOKEN_CACHE_TTL', 60)
+        self.clear()
+
+
+class MemoryBackend(object):
+    """Keeps cached responses in an LRUCache of this process.
+
+    The generations of the users are kept in an LRUCache of the same size,
+    and every generation handed out is new, so a user whose generation was
+    evicted moves on to a new one rather than back to an old one.
+    Invalidations only reach this process, so it must not be used when the
+    API runs in several worker processes.
+    """
+
+    def __init__(self, max_size, ttl):
+        self.entries = LRUCache(max_size, ttl)
+        self._generations = LRUCache(max_size, max(ttl, 24 * 60 * 60))
+        self._next_generation = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Returns the entry stored under key, or None"""
+        return self.entries.get(key)
+
+    def set(self, key, value):
+        """Stores an entry, a tuple of body, status and headers"""
+        self.entries.set(key, value)
+
+    def generation(self, user_id):
+        """Returns the current generation of the data of user_id"""
+        generation = self._generations.get(user_id)
+        if generation is not None:
+            return generation
+        with self._lock:
+            generation = self._generations.get(user_id)
+            if generation is None:
+                generation = next(self._next_generation)
+                self._generations.set(user_id, generation)
+            return generation
+
+    def bump(self, user_id):
+        """Moves user_id on to a new generation"""
+        with self._lock:
+            self._generations.set(user_id, next(self._next_generation))
+
+    def clear(self):
+        """Removes all entries and generations"""
+        self._generations.clear()
+        self.entries.clear()
+
+    def stats(self):
+        """Returns the size of the cache"""
+        stats = self.entries.stats()
+        return {'size': stats['size'], 'max_size': stats['max_size']}
+
+
+class RedisBackend(object):
+    """Keeps cached responses in Redis, shared by every worker process.
+
+    client only needs the get, set, incr and expire commands, so a local
+    stand-in can take the place of a Redis server.
+    """
+
+    def __init__(self, client, ttl, prefix='response_cache:'):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+        # A generation must outlive the entries cached under it, or they
+        # would be served again once it expires and restarts from 0
+        self.generation_ttl = max(ttl, 24 * 60 * 60)
+
+    @classmethod
+    def from_url(cls, url, ttl):
+        """Connects to the Redis server at url"""
+        import redis
+        return cls(redis.StrictRedis.from_url(url), ttl)
+
+    def get(self, key):
+        """Returns the entry stored under key, or None"""
+        value = self.client.get(self.prefix + key)
+        if value is None:
+            return None
+        body, status, headers = json.loads(value.decode())
+        return body.encode('latin-1'), status, headers
+
+    def set(self, key, value):
+        """Stores an entry, a tuple of body, status and headers"""
+        body, status, headers = value
+        self.client.set(
+            self.prefix + key,
+            json.dumps([body.decode('latin-1'), status, headers]),
+            ex=self.ttl)
+
+    def generation(self, user_id):
+        """Returns the current generation of the data of user_id"""
+        return int(
+            self.client.get('{}generation:{}'.format(self.prefix, user_id)) or
+            0)
+
+    def bump(self, user_id):
+        """Moves user_id on to a new generation"""
+        key = '{}generation:{}'.format(self.prefix, user_id)
+        self.client.incr(key)
+        self.client.expire(key, self.generation_ttl)
+
+    def clear(self):
+        """Entries are left to expire, they can not be told apart from
+        the rest of the Redis keys cheaply"""
+
+    def stats(self):
+        """The size of the cache is not tracked"""
+        return {}
+
+
+class ResponseCache(object):
+    """A read-through cache of the responses of the GET endpoints.
+
+    Responses are cached per user along with the generation of that user's
+    data. Saving or deleting a list or an item bumps the generation of its
+    owner, so their cached responses are never served again and simply
+    expire. RESPONSE_CACHE_BACKEND picks 'memory', which only suits a
+    single process, or 'redis' at RESPONSE_CACHE_REDIS_URL.
+    """
+
+    def __init__(self, app=None):
+        self.backend = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Configure the cache from the app config"""
+        self.enabled = app.config.get('RESPONSE_CACHE_ENABLED', True)
+        self.max_body_size = app.config.get('RESPONSE_CACHE_MAX_BODY_SIZE',
+                                            1024 * 1024)
+        ttl = app.config.get('RESPONSE_CACHE_TTL', 60)
+        if app.config.get('RESPONSE_CACHE_BACKEND', 'memory') == 'redis':
+            self.backend = RedisBackend.from_url(
+                app.config['RESPONSE_CACHE_REDIS_URL'], ttl)
+        else:
+            self.backend = MemoryBackend(
+                app.config.get('RESPONSE_CACHE_SIZE', 10000), ttl)
+        self.clear()
+
+    def key(self, resource, user_id):
+        """Returns the key of the current request to resource by user_id"""
+        request_key = hashlib.sha1('{} {}'.format(
+            request.headers.get('Accept', ''), request.url).encode())
+        return '{}:{}:{}:{}'.format(user_id,
+                                    self.backend.generation(user_id),
+                                    resource, request_key.hexdigest())
+
+    def get(self, key):
+        """Returns the response cached under key, or None"""
+        if not self.enabled:
+            return None
+        value = self.backend.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        body, status, headers = value
+        return current_app.response_class(body, status, headers)
+
+    def set(self, key, response):
+        """Caches a successful response under key"""
+        if not self.enabled or response.status_code != 200 or \
+                response.direct_passthrough:
+            return
+        body = response.get_data()
+        if len(body) > self.max_body_size:
+            return
+        self.backend.set(key, (body, response.status_code,
+                               list(response.headers.items())))
+
+    def invalidate(self, user_id):
+        """Stops serving the cached responses of user_id"""
+        if self.backend is not None and user_id is not None:
+            self.backend.bump(user_id)
+
+    def clear(self):
+        """Removes all entries and resets the counters"""
+        self.backend.clear()
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """Returns the hit/miss counters of this process and the size of
+        the cache"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': float(self.hits) / lookups if lookups else 0.0
+            }
+        stats.update(self.backend.stats())
+        return stats
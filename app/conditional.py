@@ -0,0 +1,52 @@
+"""This file contains helpers for answering conditional GET requests.
+
+Collection endpoints look up the fingerprint of their rows, namely the
+revision of the owner's lists, which every write to them or their items
+moves on, and the date of that revision, see User.revise. The fingerprint
+and the query string make up a strong ETag and the date is the
+Last-Modified date. When the client already holds that version a 304 is
+returned without building the body.
+"""
+import hashlib
+from datetime import datetime
+
+from flask import current_app, request
+from werkzeug.http import http_date
+
+
+def validators(*fingerprint):
+    """Returns the ETag and Last-Modified date of a collection.
+
+    The last item of fingerprint must be the date of the latest change to
+    the collection, or None when it never changed.
+    """
+    digest = hashlib.sha1(repr((fingerprint, request.full_path)).encode())
+    return '"{}"'.format(digest.hexdigest()), fingerprint[-1]
+
+
+def is_not_modified(etag, last_modified):
+    """Checks if the client's cached copy of the collection is current"""
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag.strip('"'))
+    if request.if_modified_since and last_modified is not None:
+        # Revisions are dated in whole seconds, one second apart at least
+        return last_modified <= request.if_modified_since.replace(
+            tzinfo=None)
+    return False
+
+
+def headers(etag, last_modified):
+    """Returns the validator headers to send with the collection"""
+    validator_headers = {'ETag': etag}
+    # A burst of changes can date the latest one ahead of the clock. No
+    # other date is safe to send for it, since every revision needs its
+    # own, so only the ETag is sent until the clock catches up.
+    if last_modified is not None and last_modified <= datetime.utcnow():
+        validator_headers['Last-Modified'] = http_date(last_modified)
+    return validator_headers
+
+
+def not_modified(etag, last_modified):
+    """Returns an empty 304 response carrying the validators"""
+    return current_app.response_class(
+        status=304, headers=headers(etag, last_modified))
@@ -1,6 +1,8 @@
-from flask import request
+from flask import current_app, g, request
 from functools import wraps
+from app import replica_router, response_cache, token_cache
 from app.models import User
+from app.profiling import timed
 
 
 def check_logged_in(function):
@@ -15,14 +17,62 @@ def check_logged_in(function):
             access_token = auth_header.split(" ")[1]
 
             if access_token:
-                # Decode user info from jwt hashed token
-                user_id = User.decode_token(access_token)
+                with timed('auth'):
+                    # Lets use the cached user id of an already verified
+                    # token
+                    user_id = token_cache.get(access_token)
+                    if user_id is None:
+                        # Decode user info from jwt hashed token
+                        user_id = User.decode_token(access_token)
+                        if not isinstance(user_id, str):
+                            token_cache.set(access_token, user_id)
 
                 # Check if user is user is authenticated
                 if not isinstance(user_id, str):
+                    g.user_id = user_id
                     return function(self, user_id, *args, **kwargs)
                 else:
                     message = user_id
         return {"message": message}, 401
 
-    return wrapper
\ No newline at end of file
+    return wrapper
+
+
+def cached_response(resource):
+    """Serves a GET method from the response cache, where its responses are
+    kept per user. Goes below check_logged_in, which passes the user id."""
+
+    def decorator(function):
+        @wraps(function)
+        def wrapper(self, user_id, *args, **kwargs):
+            if not response_cache.enabled:
+                return function(self, user_id, *args, **kwargs)
+
+            key = response_cache.key(resource, user_id)
+            response = response_cache.get(key)
+            if response is not None:
+                response.headers['X-Cache'] = 'HIT'
+                # The cached validators still answer conditional requests
+                return response.make_conditional(request.environ)
+
+            response = current_app.make_response(
+                function(self, user_id, *args, **kwargs))
+            response_cache.set(key, response)
+            response.headers['X-Cache'] = 'MISS'
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def read_from_replica(function):
+    """Lets a read-only GET method query a read replica, unless the user
+    wrote something recently. Goes below check_logged_in."""
+
+    @wraps(function)
+    def wrapper(self, user_id, *args, **kwargs):
+        replica_router.route(user_id)
+        return function(self, user_id, *args, **kwargs)
+
+    return wrapper
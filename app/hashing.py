@@ -0,0 +1,87 @@
+"""This file contains the password hasher that runs bcrypt on a bounded
+pool of worker threads
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from app.startup import LazyExtension
+
+
+class HasherBusy(Exception):
+    """Raised when too many passwords are already waiting to be hashed, or
+    when a hash took longer than BCRYPT_TIMEOUT seconds"""
+
+
+class PasswordHasher(object):
+    """Hashes and checks passwords with bcrypt.
+
+    The work runs on BCRYPT_POOL_SIZE threads so that no more than that
+    many hashes compete for the CPU at once, and at most
+    BCRYPT_MAX_PENDING further requests may wait for a free thread before
+    HasherBusy is raised. Setting BCRYPT_POOL_SIZE to 0 hashes inline on
+    the calling thread. With LAZY_EXTENSIONS set, bcrypt is loaded when the
+    first password is hashed or checked.
+    """
+
+    def __init__(self, app=None):
+        self._bcrypt = LazyExtension('flask_bcrypt:Bcrypt')
+        self._executor = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Configure the hasher from the app config"""
+        self._bcrypt.init_app(app)
+        self.log_rounds = app.config.get('BCRYPT_LOG_ROUNDS', 12)
+        self.pool_size = app.config.get('BCRYPT_POOL_SIZE', os.cpu_count())
+        self.max_pending = app.config.get('BCRYPT_MAX_PENDING', 64)
+        self.timeout = app.config.get('BCRYPT_TIMEOUT', 30)
+
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+            self._executor = None
+            self._slots = threading.BoundedSemaphore(
+                self.pool_size + self.max_pending)
+
+    def _run(self, function, *args):
+        if not self.pool_size:
+            return function(*args)
+
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy('Too many requests, please try again later')
+        try:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(self.pool_size)
+                future = self._executor.submit(function, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(self.timeout)
+        except TimeoutError:
+            raise HasherBusy('Hashing the password timed out, please try '
+                             'again later')
+
+    def generate(self, password):
+        """Returns the bcrypt hash of password as a string"""
+        return self._run(self._bcrypt.generate_password_hash, password,
+                         self.log_rounds).decode()
+
+    def check(self, password_hash, password):
+        """Returns True if password matches password_hash"""
+        return self._run(
+            self._bcrypt.check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """Returns True if password_hash was made with a different cost
+        than the configured one"""
+        try:
+            # bcrypt hashes look like $2b$<cost>$<salt and hash>
+            return int(password_hash.split('$')[2]) != self.log_rounds
+        except (IndexError, ValueError):
+            return True
@@ -0,0 +1,7 @@
+"""This file handles the Instrumentation blueprint"""
+from flask import Blueprint
+
+# This instance of a Blueprint that represents the instrumentation blueprint
+instrumentation_blueprint = Blueprint('instrumentation', __name__)
+
+from . import views
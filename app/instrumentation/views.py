@@ -0,0 +1,50 @@
+"""This file contains the endpoints reporting the state of the caches and
+the database pool of this worker process, the Prometheus metrics of all
+of them and whether the worker is ready for traffic"""
+from app import (blacklist_index, db, metrics, replica_router,
+                 response_cache, token_cache, warmup)
+from app.pool import pool_stats
+from flask import Response, current_app
+from flask.views import MethodView
+
+from . import instrumentation_blueprint
+
+
+class InstrumentationView(MethodView):
+    def get(self):
+        """Returns the counters of the caches, indexes and database pool"""
+        return {
+            'db_pool': pool_stats(db.engine),
+            'replicas': replica_router.stats(),
+            'response_cache': response_cache.stats(),
+            'token_cache': token_cache.stats(),
+            'blacklist_index': blacklist_index.stats(),
+            'startup_ms': current_app.startup_timings
+        }, 200
+
+
+class MetricsView(MethodView):
+    def get(self):
+        """Returns the Prometheus metrics of every worker process"""
+        body, content_type = metrics.render()
+        return Response(body, status=200, content_type=content_type)
+
+
+class ReadinessView(MethodView):
+    def get(self):
+        """Returns 200 once the worker warmed up and can reach the database,
+        and 503 until then"""
+        checks = warmup.readiness()
+        return checks, 200 if all(checks.values()) else 503
+
+
+instrumentation_view = InstrumentationView.as_view('instrumentation_view')
+metrics_view = MetricsView.as_view('metrics_view')
+readiness_view = ReadinessView.as_view('readiness_view')
+
+instrumentation_blueprint.add_url_rule(
+    '/v1/instrumentation', view_func=instrumentation_view, methods=['GET'])
+instrumentation_blueprint.add_url_rule(
+    '/metrics', view_func=metrics_view, methods=['GET'])
+instrumentation_blueprint.add_url_rule(
+    '/v1/ready', view_func=readiness_view, methods=['GET'])
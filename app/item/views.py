@@ -1,7 +1,13 @@
 """This file contains API endpoint logic for the APP"""
-from app.decorators import check_logged_in
+from app import conditional, reads
+from app.decorators import (cached_response, check_logged_in,
+                            read_from_replica)
 from app.models import ShoppingList, ShoppingListItem
-from flask import jsonify, make_response, request
+from app.pagination import (PaginationError, link_header, next_link,
+                            page_args, since_arg)
+from app.serializers import jsonify
+from app.serializers.item import item_serializer, saved_item_serializer
+from flask import current_app, make_response, request
 from flask.views import MethodView
 
 from . import item_blueprint
@@ -9,40 +15,44 @@ from . import item_blueprint
 
 class ItemView(MethodView):
     @check_logged_in
+    @cached_response('items')
+    @read_from_replica
     def get(self, user_id, id):
-        shoppinglist = ShoppingList.query.filter_by(id=id).first()
-        if not shoppinglist:
+        try:
+            limit, after_id = page_args()
+            since = since_arg()
+        except PaginationError as e:
+            return {"message": str(e)}, 400
+
+        # Lets answer from the client's cache when the items are unchanged
+        fingerprint = ShoppingListItem.fingerprint(id, user_id)
+        if fingerprint is None:
             # When no shopping list is found, we throw an error
             return {"message": "Sorry, this shopping list doesnt exist"}, 404
+        etag, last_modified = conditional.validators(*fingerprint)
+        if conditional.is_not_modified(etag, last_modified):
+            return conditional.not_modified(etag, last_modified)
 
-        # Handdle GET View list/Show list request here
-        shoppinglist_items = ShoppingListItem.query.filter_by(
-            shoppinglist_id=shoppinglist.id)
-
-        results = []
+        # Handdle GET View list/Show list request here, fetching just the
+        # columns of a page of its items
+        shoppinglist_items, next_url = next_link(
+            reads.item_page(id, user_id, limit, after_id, since), limit)
 
         # Prepare shopping list item query results for returning
         # to requestor
-        for item in shoppinglist_items:
-            obj = {
-                'id': item.id,
-                'name': item.name,
-                'description': item.description,
-                'date_created': item.date_created,
-                'date_modified': item.date_modified,
-                'shopping_list_id': item.shoppinglist_id,
-                'type': 'item'
-            }
-            results.append(obj)
-
-        if len(results) == 0:
+        results = item_serializer.many(shoppinglist_items)
+
+        if len(results) == 0 and after_id is None and since is None:
             # Return a message if search didnot yield any results
             return {"message": "Sorry, this shopping list is empty"}, 404
-        return make_response(jsonify(results)), 200
+        headers = conditional.headers(etag, last_modified)
+        headers.update(link_header(next_url))
+        return make_response(jsonify(results)), 200, headers
 
     @check_logged_in
     def post(self, user_id, id):
-        shoppinglist = ShoppingList.query.filter_by(id=id).first()
+        shoppinglist = ShoppingList.query.filter_by(
+            id=id, user_id=user_id).first()
         if not shoppinglist:
             # When no shopping list is found, we throw an error
             return {"message": "Sorry, this shopping list doesnt exist"}, 404
@@ -57,27 +67,123 @@ class ItemView(MethodView):
             shoppinglist_item.save()
 
             # Prepare a response and return it to the requestor
-            response = jsonify({
-                'id':
-                shoppinglist_item.id,
-                'name':
-                shoppinglist_item.name,
-                'description':
-                shoppinglist_item.description,
-                'date_created':
-                shoppinglist.description,
-                'date_created':
-                shoppinglist_item.date_created,
-                'date_modified':
-                shoppinglist_item.date_modified,
-                'user_id':
-                user_id,
-                'shoppinglist_id':
-                id
-            })
+            response = jsonify(saved_item_serializer.one(
+                shoppinglist_item, user_id=user_id))
             return make_response(response), 201
 
 
+class ItemBatchView(MethodView):
+    """Handles creating, updating and deleting many items of a shopping
+    list in one request"""
+
+    @check_logged_in
+    def post(self, user_id, id):
+        shoppinglist = ShoppingList.query.filter_by(
+            id=id, user_id=user_id).first()
+        if not shoppinglist:
+            # When no shopping list is found, we throw an error
+            return {"message": "Sorry, this shopping list doesnt exist"}, 404
+
+        # Lets validate the whole batch before inserting anything
+        items = request.data
+        max_batch_size = current_app.config['MAX_BATCH_SIZE']
+        if not isinstance(items, list) or not items:
+            return {"message": "Please send a list of items."}, 400
+        if len(items) > max_batch_size:
+            return {
+                "message": "Sorry, at most {} items can be added at "
+                "once.".format(max_batch_size)
+            }, 400
+
+        new_items = []
+        for index, item in enumerate(items):
+            name = str(item.get('name', '')) if isinstance(item, dict) \
+                else ''
+            if not name:
+                return {
+                    "message": "Name field not passed for item {}.".format(
+                        index)
+                }, 400
+            new_items.append({
+                'name': name,
+                'description': str(item.get('description', ''))
+            })
+
+        created = ShoppingListItem.bulk_create(id, new_items)
+
+        # Prepare a response and return it to the requestor
+        results = saved_item_serializer.many(created, user_id=user_id)
+        return make_response(jsonify(results)), 201
+
+    def batch_ids(self):
+        """Returns the item ids the batch request targets, None meaning all
+        the items of the list, along with an error response if the ids
+        are not valid"""
+        ids = request.data.get('ids') if isinstance(request.data, dict) \
+            else None
+        if ids == 'all':
+            return None, None
+        max_batch_size = current_app.config['MAX_BATCH_SIZE']
+        if not isinstance(ids, list) or not ids or not all(
+                type(item_id) is int for item_id in ids):
+            return None, ({
+                "message": "Please send the item ids or \"all\"."
+            }, 400)
+        if len(ids) > max_batch_size:
+            return None, ({
+                "message": "Sorry, at most {} items can be changed at "
+                "once.".format(max_batch_size)
+            }, 400)
+        return ids, None
+
+    def list_not_found(self, user_id, id):
+        """Returns a 404 response if the user has no list with this id"""
+        if not ShoppingList.query.filter_by(id=id, user_id=user_id).first():
+            return {"message": "Sorry, this shopping list doesnt exist"}, 404
+
+    @check_logged_in
+    def patch(self, user_id, id):
+        ids, error = self.batch_ids()
+        if error:
+            return error
+
+        # Only the fields that were sent are changed
+        values = {}
+        for field in ('name', 'description'):
+            if request.data.get(field):
+                values[field] = str(request.data[field])
+        if not values:
+            return {"message": "Please send a name or description."}, 400
+
+        updated = ShoppingListItem.bulk_update(id, user_id, ids, values)
+        if not updated:
+            return self.list_not_found(user_id, id) or ({
+                "message": "No items were updated.",
+                "count": 0
+            }, 200)
+        return {
+            "message": "{} shoppinglist items updated".format(updated),
+            "count": updated
+        }, 200
+
+    @check_logged_in
+    def delete(self, user_id, id):
+        ids, error = self.batch_ids()
+        if error:
+            return error
+
+        deleted = ShoppingListItem.bulk_delete(id, user_id, ids)
+        if not deleted:
+            return self.list_not_found(user_id, id) or ({
+                "message": "No items were deleted.",
+                "count": 0
+            }, 200)
+        return {
+            "message": "{} shoppinglist items deleted".format(deleted),
+            "count": deleted
+        }, 200
+
+
 class ItemManipulationView(MethodView):
     @check_logged_in
     def delete(self, user_id, id, item_id):
@@ -119,20 +225,14 @@ class ItemManipulationView(MethodView):
         shoppinglist_item.save()
 
         # Prepare response and return it to the user
-        response = {
-            'id': shoppinglist_item.id,
-            'name': shoppinglist_item.name,
-            'description': shoppinglist_item.description,
-            'date_created': shoppinglist_item.date_created,
-            'date_modified': shoppinglist_item.date_modified,
-            'user_id': user_id,
-            'shoppinglist_id': id
-        }
+        response = saved_item_serializer.one(
+            shoppinglist_item, user_id=user_id)
         return make_response(jsonify(response)), 200
 
 
 item_view = ItemView.as_view('item_view')
 item_manipulation_view = ItemManipulationView.as_view('item_manipulation_view')
+item_batch_view = ItemBatchView.as_view('item_batch_view')
 
 item_blueprint.add_url_rule(
     '/v1/shoppinglists/<int:id>/items',
@@ -143,3 +243,8 @@ item_blueprint.add_url_rule(
     '/v1/shoppinglists/<int:id>/items/<int:item_id>',
     view_func=item_manipulation_view,
     methods=['PUT', 'DELETE'])
+
+item_blueprint.add_url_rule(
+    '/v1/shoppinglists/<int:id>/items/batch',
+    view_func=item_batch_view,
+    methods=['POST', 'PATCH', 'DELETE'])
@@ -0,0 +1,128 @@
+"""This file contains the Prometheus metrics of the API.
+
+Every request is counted by endpoint, method and status code and its
+latency goes into a histogram per endpoint. The database pool and the
+caches are sampled into gauges and counters after requests, at most once
+every METRICS_SAMPLE_INTERVAL seconds, and when the metrics are scraped.
+
+When the API runs in several worker processes, point the
+PROMETHEUS_MULTIPROC_DIR environment variable at an empty directory
+before starting them. Each worker then writes its metrics there and
+GET /metrics adds up the metrics of all of them.
+"""
+import os
+import threading
+import time
+
+from flask import g, request
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY,
+                               CollectorRegistry, Counter, Gauge, Histogram,
+                               generate_latest, multiprocess)
+
+# Request latencies, in seconds, the histograms count up to
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75,
+                   1.0, 2.5, 5.0, 10.0)
+
+REQUESTS = Counter('shoppinglist_requests_total', 'Requests handled',
+                   ['endpoint', 'method', 'status'])
+LATENCY = Histogram('shoppinglist_request_duration_seconds',
+                    'Time taken to handle requests', ['endpoint', 'method'],
+                    buckets=LATENCY_BUCKETS)
+DB_POOL_CONNECTIONS = Gauge('shoppinglist_db_pool_connections',
+                            'Database connections of the pool',
+                            ['state'], multiprocess_mode='livesum')
+DB_POOL_EVENTS = Counter('shoppinglist_db_pool_events_total',
+                         'Pool checkouts, overflows and timeouts', ['event'])
+CACHE_SIZE = Gauge('shoppinglist_cache_entries', 'Entries held by a cache',
+                   ['cache'], multiprocess_mode='livesum')
+CACHE_LOOKUPS = Counter('shoppinglist_cache_lookups_total',
+                        'Cache lookups by result', ['cache', 'result'])
+
+# Pool counters that only ever go up, and the gauges of its connections
+POOL_EVENTS = ('checkouts', 'overflow_events', 'timeouts')
+POOL_STATES = ('checked_out', 'checked_in', 'overflow')
+
+
+def registry():
+    """Returns the registry of every worker process when running with
+    PROMETHEUS_MULTIPROC_DIR, and of this process otherwise"""
+    if not os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        return REGISTRY
+    workers = CollectorRegistry()
+    multiprocess.MultiProcessCollector(workers)
+    return workers
+
+
+class Metrics(object):
+    """Records the metrics of every request of the app when METRICS_ENABLED
+    is set"""
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._seen = {}
+        self._sampled = 0.0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Configure the metrics from the app config"""
+        self.enabled = app.config.get('METRICS_ENABLED', True)
+        self.sample_interval = app.config.get('METRICS_SAMPLE_INTERVAL', 1)
+        if not self.enabled:
+            return
+        app.before_request(self._start)
+        app.after_request(self._finish)
+
+    def _start(self):
+        g.metrics_started = time.perf_counter()
+
+    def _finish(self, response):
+        started = g.get('metrics_started')
+        if started is None:
+            return response
+        endpoint = request.endpoint or 'unmatched'
+        LATENCY.labels(endpoint, request.method).observe(
+            time.perf_counter() - started)
+        REQUESTS.labels(endpoint, request.method, response.status_code).inc()
+
+        if time.monotonic() - self._sampled >= self.sample_interval:
+            self.sample()
+        return response
+
+    def _count(self, counter, labels, key, value):
+        # Counts what happened since the last sample, or everything since
+        # the counters of a cleared cache went back to zero
+        last = self._seen.get(key, 0)
+        self._seen[key] = value
+        delta = value - last if value >= last else value
+        if delta:
+            counter.labels(*labels).inc(delta)
+
+    def sample(self):
+        """Records the state of the database pool and the caches"""
+        from app import db, response_cache, token_cache
+        from app.pool import pool_stats
+
+        with self._lock:
+            self._sampled = time.monotonic()
+            pool = pool_stats(db.engine)
+            if 'checkouts' in pool:
+                for state in POOL_STATES:
+                    DB_POOL_CONNECTIONS.labels(state).set(pool[state])
+                for event in POOL_EVENTS:
+                    self._count(DB_POOL_EVENTS, [event], event, pool[event])
+
+            for name, cache in [('response', response_cache),
+                                ('token', token_cache)]:
+                stats = cache.stats()
+                if 'size' in stats:
+                    CACHE_SIZE.labels(name).set(stats['size'])
+                for result in ['hits', 'misses']:
+                    self._count(CACHE_LOOKUPS, [name, result],
+                                (name, result), stats[result])
+
+    def render(self):
+        """Returns the metrics of every worker in the text format and its
+        content type"""
+        self.sample()
+        return generate_latest(registry()), CONTENT_TYPE_LATEST
@@ -1,11 +1,13 @@
 """This file contains the classes that define the structure
 of The API's database tables
 """
+import hashlib
+import uuid
 from datetime import datetime, timedelta
 
 import jwt
-from app import db
-from flask_bcrypt import Bcrypt
+from app import (blacklist_index, db, password_hasher, response_cache,
+                 token_cache)
 
 
 class User(db.Model):
@@ -17,20 +19,31 @@ class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(256), nullable=False, unique=True)
     password = db.Column(db.String(256), nullable=False)
+    # Every change to the user's lists or items moves these on, see revise
+    lists_revision = db.Column(
+        db.Integer, nullable=False, default=0, server_default='0')
+    lists_modified_at = db.Column(db.DateTime, nullable=True)
+    # The database deletes the lists of a deleted user, see ShoppingList
     shoppinglists = db.relationship(
         'ShoppingList',
         order_by='ShoppingList.id',
-        cascade="all, delete-orphan")
+        cascade="all, delete-orphan",
+        passive_deletes=True)
 
     def __init__(self, email, password):
         """Initialize the user with an email and a password."""
         self.email = email
-        self.password = Bcrypt().generate_password_hash(password).decode()
+        self.password = password_hasher.generate(password)
 
     def password_is_valid(self, password):
         """Validates user password by comparing hash and the user's password
         """
-        return Bcrypt().check_password_hash(self.password, password)
+        return password_hasher.check(self.password, password)
+
+    def password_needs_rehash(self):
+        """Checks if the password was hashed with a different cost than the
+        one currently configured"""
+        return password_hasher.needs_rehash(self.password)
 
     def save(self):
         """This Creates or updates the user in Database
@@ -39,7 +52,30 @@ class User(db.Model):
         db.session.commit()
 
     def hash_password(self, password):
-        return Bcrypt().generate_password_hash(password).decode()
+        return password_hasher.generate(password)
+
+    @staticmethod
+    def revise(user_id):
+        """Records a change to the lists or items of user_id, left for the
+        caller to commit.
+
+        The user's row stays locked until the commit, so their changes get
+        revisions in commit order. Each revision is dated in whole seconds
+        and at least a second after the one before, so no two revisions
+        share a Last-Modified date.
+        """
+        row = db.session.query(User.lists_modified_at).filter(
+            User.id == user_id).with_for_update().first()
+        if row is None:
+            return
+        modified_at = datetime.utcnow().replace(microsecond=0)
+        if row.lists_modified_at is not None and \
+                row.lists_modified_at >= modified_at:
+            modified_at = row.lists_modified_at + timedelta(seconds=1)
+        User.query.filter_by(id=user_id).update({
+            'lists_revision': User.lists_revision + 1,
+            'lists_modified_at': modified_at
+        }, synchronize_session=False)
 
     def generate_token(self, user_id):
         """This Generates the access token"""
@@ -49,7 +85,9 @@ class User(db.Model):
             payload = {
                 'exp': datetime.utcnow() + timedelta(minutes=525600000),
                 'iat': datetime.utcnow(),
-                'sub': user_id
+                'sub': user_id,
+                # A unique id keeps tokens issued in the same second apart
+                'jti': uuid.uuid4().hex
             }
             # Create the byte string token using the payload and the SECRET key
             encoded_jwt = jwt.encode(payload, 'mys3cr3t', algorithm='HS256')
@@ -81,9 +119,19 @@ class User(db.Model):
 
 
 class ShoppingList(db.Model):
-    """This class represents the shoppinglists table."""
+    """This class represents the shoppinglists table.
+
+    Deleting a list or its owner deletes its items with ON DELETE CASCADE
+    rather than loading them first. A soft deleted list is detached from
+    its owner, so every query of the owner's lists leaves it out, and
+    marked with deleted_at for the purge worker in app/purge.py to delete
+    in chunks.
+    """
 
     __tablename__ = 'shoppinglist'
+    __table_args__ = (
+        # Lists are always fetched per user in id order
+        db.Index('ix_shoppinglist_user_id_id', 'user_id', 'id'), )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(255))
@@ -97,13 +145,18 @@ class ShoppingList(db.Model):
         onupdate=db.func.current_timestamp())
 
     # Define user id column for associated user
-    user_id = db.Column(db.Integer, db.ForeignKey(User.id))
+    user_id = db.Column(
+        db.Integer, db.ForeignKey(User.id, ondelete='CASCADE'))
+
+    # When the list was soft deleted and is waiting to be purged
+    deleted_at = db.Column(db.DateTime, nullable=True, index=True)
 
     # Define a one-to-many relationship with items that belong
     shoppinglist_items = db.relationship(
         'ShoppingListItem',
         order_by='ShoppingListItem.id',
-        cascade="all, delete-orphan")
+        cascade="all, delete-orphan",
+        passive_deletes=True)
 
     def __init__(self, name, user_id, description):
         """Initialize with name and user id"""
@@ -113,18 +166,83 @@ class ShoppingList(db.Model):
 
     def save(self):
         """Save modifications or create the list model in the database"""
+        user_id = self.user_id
         db.session.add(self)
+        User.revise(user_id)
         db.session.commit()
+        response_cache.invalidate(user_id)
 
     @staticmethod
     def get_all(user_id):
         """Get all lists belonging to user_id"""
         return ShoppingList.query.filter_by(user_id=user_id)
 
+    @staticmethod
+    def page_query(user_id, limit, after_id=None):
+        """Query up to limit + 1 lists belonging to user_id in id order,
+        starting after the list with id after_id"""
+        query = ShoppingList.get_all(user_id)
+        if after_id is not None:
+            query = query.filter(ShoppingList.id > after_id)
+        return query.order_by(ShoppingList.id).limit(limit + 1)
+
+    @staticmethod
+    def get_page(user_id, limit, after_id=None):
+        """Get a page of the lists belonging to user_id"""
+        return ShoppingList.page_query(user_id, limit, after_id).all()
+
+    @staticmethod
+    def fingerprint_query(user_id):
+        """Query the revision of the lists of user_id and when it was made,
+        which change whenever the lists or their items do"""
+        return db.session.query(
+            User.lists_revision, User.lists_modified_at).filter(
+                User.id == user_id)
+
+    @staticmethod
+    def fingerprint(user_id):
+        """Get the fingerprint of the lists belonging to user_id and their
+        items. The date of the latest change comes last."""
+        return ShoppingList.fingerprint_query(user_id).first() or (0, None)
+
+    @staticmethod
+    def owner_id(shoppinglist_id):
+        """Returns the id of the user who owns a list. The list is usually
+        in the session already, so this seldom needs a query."""
+        shoppinglist = ShoppingList.query.get(shoppinglist_id)
+        return shoppinglist.user_id if shoppinglist else None
+
+    @staticmethod
+    def touch(shoppinglist_id):
+        """Marks a list as modified, left for the caller to commit"""
+        ShoppingList.query.filter_by(id=shoppinglist_id).update(
+            {'date_modified': db.func.current_timestamp()},
+            synchronize_session=False)
+
     def delete(self):
         """Delete User model from the database"""
+        user_id = self.user_id
         db.session.delete(self)
+        User.revise(user_id)
         db.session.commit()
+        response_cache.invalidate(user_id)
+
+    @staticmethod
+    def soft_delete(shoppinglist_id, user_id):
+        """Detaches a list from user_id and marks it for the purge worker
+        with a single UPDATE, however many items it has. Returns False if
+        user_id has no such list."""
+        now = datetime.utcnow()
+        deleted = ShoppingList.query.filter_by(
+            id=shoppinglist_id, user_id=user_id).update(
+                {'user_id': None, 'deleted_at': now, 'date_modified': now},
+                synchronize_session=False)
+        if deleted:
+            User.revise(user_id)
+        db.session.commit()
+        if deleted:
+            response_cache.invalidate(user_id)
+        return bool(deleted)
 
     def __repr__(self):
         """Lets return a printable representation of this object as
@@ -136,13 +254,18 @@ class ShoppingListItem(db.Model):
     """This class represents the shoppinglists item table."""
 
     __tablename__ = 'item_shoppinglist'
+    __table_args__ = (
+        # Items are always fetched per list in id order
+        db.Index('ix_item_shoppinglist_shoppinglist_id_id', 'shoppinglist_id',
+                 'id'), )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(255))
     description = db.Column(db.String(255), nullable=True)
 
     # Define a relational column to the parent shopping list
-    shoppinglist_id = db.Column(db.Integer, db.ForeignKey(ShoppingList.id))
+    shoppinglist_id = db.Column(
+        db.Integer, db.ForeignKey(ShoppingList.id, ondelete='CASCADE'))
     date_created = db.Column(db.DateTime, default=db.func.current_timestamp())
     date_modified = db.Column(
         db.DateTime,
@@ -157,18 +280,148 @@ class ShoppingListItem(db.Model):
 
     def save(self):
         """Save or update items in the database"""
+        user_id = ShoppingList.owner_id(self.shoppinglist_id)
         db.session.add(self)
+        User.revise(user_id)
         db.session.commit()
+        response_cache.invalidate(user_id)
 
     @staticmethod
     def get_all(shoppinglist_id):
         """Returns all items in the shopping list specified"""
         return ShoppingList.query.filter_by(shoppinglist_id=shoppinglist_id)
 
+    @staticmethod
+    def page_query(shoppinglist_id, user_id, limit, after_id=None,
+                   since=None):
+        """Query up to limit + 1 items of a shopping list owned by user_id
+        in id order, starting after the item with id after_id and only
+        including items modified after since.
+
+        The ownership check and the items come from a single query that
+        outer joins the list to its items.
+        """
+        item_filter = [ShoppingListItem.shoppinglist_id == ShoppingList.id]
+        if after_id is not None:
+            item_filter.append(ShoppingListItem.id > after_id)
+        if since is not None:
+            item_filter.append(ShoppingListItem.date_modified > since)
+
+        # Lets label the list id so it does not clash with the item id
+        return db.session.query(
+            ShoppingList.id.label('list_id'), ShoppingListItem).outerjoin(
+                ShoppingListItem, db.and_(*item_filter)).filter(
+                    ShoppingList.id == shoppinglist_id,
+                    ShoppingList.user_id == user_id).order_by(
+                        ShoppingListItem.id).limit(limit + 1)
+
+    @staticmethod
+    def get_page(shoppinglist_id, user_id, limit, after_id=None, since=None):
+        """Get a page of the items of a shopping list owned by user_id, or
+        None when the list does not exist or belongs to someone else"""
+        rows = ShoppingListItem.page_query(
+            shoppinglist_id, user_id, limit, after_id, since).all()
+        if not rows:
+            return None
+        return [item for _, item in rows if item is not None]
+
+    @staticmethod
+    def fingerprint_query(shoppinglist_id, user_id):
+        """Query the revision of the lists of user_id and when it was made,
+        provided user_id owns the shopping list"""
+        return db.session.query(
+            User.lists_revision, User.lists_modified_at).join(
+                ShoppingList, ShoppingList.user_id == User.id).filter(
+                    ShoppingList.id == shoppinglist_id, User.id == user_id)
+
+    @staticmethod
+    def fingerprint(shoppinglist_id, user_id):
+        """Get the fingerprint of the items of a shopping list owned by
+        user_id, or None when the list does not exist or belongs to someone
+        else. The date of the latest change comes last."""
+        return ShoppingListItem.fingerprint_query(
+            shoppinglist_id, user_id).first()
+
+    @staticmethod
+    def bulk_create(shoppinglist_id, items):
+        """Inserts items, a list of dicts with a name and a description,
+        into a shopping list in one transaction and returns the created
+        rows.
+
+        Postgres gets a single multi-row INSERT ... RETURNING, other
+        databases get the inserts of a single flush and one SELECT.
+        """
+        table = ShoppingListItem.__table__
+        rows = [{
+            'name': item['name'],
+            'description': item['description'],
+            'shoppinglist_id': shoppinglist_id
+        } for item in items]
+
+        if db.engine.dialect.name == 'postgresql':
+            created = db.session.execute(
+                table.insert().values(rows).returning(*table.c)).fetchall()
+        else:
+            new_items = [ShoppingListItem(**row) for row in rows]
+            db.session.add_all(new_items)
+            db.session.flush()
+            created = db.session.execute(table.select().where(
+                table.c.id.in_([item.id for item in new_items])).order_by(
+                    table.c.id)).fetchall()
+        user_id = ShoppingList.owner_id(shoppinglist_id)
+        User.revise(user_id)
+        db.session.commit()
+        response_cache.invalidate(user_id)
+        return created
+
+    @staticmethod
+    def owned_query(shoppinglist_id, user_id, ids=None):
+        """Query the items of a shopping list owned by user_id, limited to
+        ids unless it is None. The ownership check is a subquery so the
+        statement can be run as a single UPDATE or DELETE."""
+        owned_list = db.select([ShoppingList.id]).where(db.and_(
+            ShoppingList.id == shoppinglist_id,
+            ShoppingList.user_id == user_id))
+        query = ShoppingListItem.query.filter(
+            ShoppingListItem.shoppinglist_id.in_(owned_list))
+        if ids is not None:
+            query = query.filter(ShoppingListItem.id.in_(ids))
+        return query
+
+    @staticmethod
+    def bulk_update(shoppinglist_id, user_id, ids, values):
+        """Updates the items with one UPDATE and returns how many changed"""
+        updated = ShoppingListItem.owned_query(
+            shoppinglist_id, user_id, ids).update(
+                values, synchronize_session=False)
+        if updated:
+            User.revise(user_id)
+        db.session.commit()
+        if updated:
+            response_cache.invalidate(user_id)
+        return updated
+
+    @staticmethod
+    def bulk_delete(shoppinglist_id, user_id, ids):
+        """Deletes the items with one DELETE and returns how many went"""
+        deleted = ShoppingListItem.owned_query(
+            shoppinglist_id, user_id, ids).delete(synchronize_session=False)
+        if deleted:
+            ShoppingList.touch(shoppinglist_id)
+            User.revise(user_id)
+        db.session.commit()
+        if deleted:
+            response_cache.invalidate(user_id)
+        return deleted
+
     def delete(self):
         """Deletes shopping list item from the database"""
+        user_id = ShoppingList.owner_id(self.shoppinglist_id)
         db.session.delete(self)
+        ShoppingList.touch(self.shoppinglist_id)
+        User.revise(user_id)
         db.session.commit()
+        response_cache.invalidate(user_id)
 
     def __repr__(self):
         """ Prints out a representation of the item object"""
@@ -182,26 +435,121 @@ class BlacklistToken(db.Model):
     __tablename__ = 'blacklist_tokens'
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    token = db.Column(db.String(500), unique=True, nullable=False)
+    # Tokens are stored as a fixed width SHA-256 hex digest
+    token_digest = db.Column(db.String(64), unique=True, nullable=False)
     blacklisted_on = db.Column(db.DateTime, nullable=False)
+    # Once the token expires the entry is no longer needed
+    expires_at = db.Column(db.DateTime, nullable=True, index=True)
 
     def __init__(self, token):
         self.token = token
+        self.token_digest = BlacklistToken.digest(token)
         self.blacklisted_on = datetime.now()
+        self.expires_at = BlacklistToken.token_expiry(token)
 
     def __repr__(self):
-        return '<id: token: {}'.format(self.token)
+        return '<id: token digest: {}'.format(self.token_digest)
 
     def save(self):
         """Save or update items in the database"""
         db.session.add(self)
         db.session.commit()
 
+        # Lets record the token in the index and make sure a cached copy
+        # of it can no longer be used
+        blacklist_index.add(self.token_digest, self.id)
+        token_cache.delete(self.token)
+
+    @staticmethod
+    def digest(token):
+        """Returns the digest a token is blacklisted under"""
+        return hashlib.sha256(str(token).encode()).hexdigest()
+
+    @staticmethod
+    def token_expiry(token):
+        """Returns when token expires, or None if it carries no expiry"""
+        try:
+            payload = jwt.decode(token, verify=False)
+            return datetime.utcfromtimestamp(payload['exp'])
+        except (jwt.InvalidTokenError, KeyError, TypeError, ValueError):
+            return None
+
     @staticmethod
     def check_blacklist(auth_token):
         # check whether auth token has been blacklisted
-        result = BlacklistToken.query.filter_by(token=str(auth_token)).first()
+        token_digest = BlacklistToken.digest(auth_token)
+
+        # Only tokens the index might hold need a database lookup
+        if not blacklist_index.might_contain(token_digest):
+            return False
+        result = BlacklistToken.query.filter_by(
+            token_digest=token_digest).first()
         if result:
             return True
         else:
             return False
+
+    @staticmethod
+    def purge_expired(now=None):
+        """Deletes entries for tokens that have expired and returns how
+        many were removed"""
+        now = now or datetime.utcnow()
+        deleted = BlacklistToken.query.filter(
+            BlacklistToken.expires_at < now).delete(synchronize_session=False)
+        db.session.commit()
+        return deleted
+
+
+class OutboxMail(db.Model):
+    """
+    This represents the table of emails waiting to be sent.
+
+    Rows hold no secrets, only the template to render and the user it is
+    for. The outbox worker renders the email when it sends it, see
+    app/outbox.py.
+    """
+    __tablename__ = 'mail_outbox'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    subject = db.Column(db.String(255), nullable=False)
+    sender = db.Column(db.String(255), nullable=False)
+    # Recipients are stored as a comma separated list
+    recipients = db.Column(db.Text, nullable=False)
+    template = db.Column(db.String(64), nullable=False)
+    user_id = db.Column(
+        db.Integer, db.ForeignKey(User.id, ondelete='CASCADE'), nullable=True)
+    # The page a link in the email points to
+    link = db.Column(db.String(255), nullable=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __init__(self, subject, sender, recipients, template, user_id=None,
+                 link=None):
+        self.subject = subject
+        self.sender = sender
+        self.recipients = ','.join(recipients)
+        self.template = template
+        self.user_id = user_id
+        self.link = link
+        self.attempts = 0
+        self.created_at = datetime.utcnow()
+        self.next_attempt_at = self.created_at
+
+    def __repr__(self):
+        return '<Outbox mail: {} to {}>'.format(self.subject, self.recipients)
+
+    def save(self):
+        """Save or update the email in the database"""
+        db.session.add(self)
+        db.session.commit()
+
+    @staticmethod
+    def enqueue(subject, sender, recipients, template, user_id=None,
+                link=None):
+        """Queues an email for the outbox worker to render and send"""
+        outbox_mail = OutboxMail(subject, sender, recipients, template,
+                                 user_id, link)
+        outbox_mail.save()
+        return outbox_mail
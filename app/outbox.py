@@ -0,0 +1,149 @@
+"""This file contains the worker that sends the emails queued in the
+mail_outbox table and the templates it renders them from.
+
+Emails are rendered when they are sent, so secrets such as reset tokens
+and new passwords are only ever in the email itself.
+"""
+import logging
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from app import db, mail, password_hasher
+from app.models import OutboxMail, User
+from flask import current_app
+from flask_mail import Message
+
+logger = logging.getLogger(__name__)
+
+
+def outbox_user(outbox_mail):
+    """Returns the user outbox_mail is for"""
+    user = User.query.get(outbox_mail.user_id)
+    if user is None:
+        raise LookupError('User {} no longer exists'.format(
+            outbox_mail.user_id))
+    return user
+
+
+def render_password_reset_link(outbox_mail):
+    """Renders the link to reset the user's password, with a new token"""
+    user = outbox_user(outbox_mail)
+    html = "Hello, click <a href='{}?auth_token={}'>here</a> to reset your " \
+        "password. If you didnt not request this please ignore".format(
+            outbox_mail.link, user.generate_token(user.id).decode())
+    return html, lambda: None
+
+
+def render_new_password(outbox_mail):
+    """Renders a new password for the user, which replaces the old one once
+    the email is sent"""
+    user = outbox_user(outbox_mail)
+    # Lets generate some string to use as the new password
+    password = uuid.uuid4().hex[0:8]
+    password_hash = password_hasher.generate(password)
+    html = "Your password was succesfully reset, you can use <b>{}</b> to " \
+        "login".format(password)
+
+    def set_password():
+        user.password = password_hash
+    return html, set_password
+
+
+# The render function of each template. It returns the HTML of the email
+# and a function applying the changes it announces once it is sent.
+TEMPLATES = {
+    'password_reset_link': render_password_reset_link,
+    'new_password': render_new_password,
+}
+
+
+def due_query(batch_size, max_attempts, now=None):
+    """Query up to batch_size emails that are due to be sent, longest
+    waiting first"""
+    return OutboxMail.query.filter(
+        OutboxMail.next_attempt_at <= (now or datetime.utcnow()),
+        OutboxMail.attempts < max_attempts).order_by(
+            OutboxMail.next_attempt_at).limit(batch_size)
+
+
+def due_mail(batch_size, max_attempts):
+    """Returns the emails that are due to be sent, locking them so that
+    concurrent workers skip them"""
+    return due_query(batch_size, max_attempts).with_for_update(
+        skip_locked=True).all()
+
+
+def record_failure(outbox_mail, error, retry_delay, max_attempts):
+    """Schedules a failed email to be retried with exponential backoff, or
+    deletes it after its last attempt"""
+    outbox_mail.attempts += 1
+    if outbox_mail.attempts >= max_attempts:
+        logger.error('Giving up on %r after %d attempts: %s', outbox_mail,
+                     outbox_mail.attempts, error)
+        db.session.delete(outbox_mail)
+        return
+    outbox_mail.last_error = str(error)
+    outbox_mail.next_attempt_at = datetime.utcnow() + timedelta(
+        seconds=retry_delay * 2 ** (outbox_mail.attempts - 1))
+    logger.warning('Failed to send %r (attempt %d): %s', outbox_mail,
+                   outbox_mail.attempts, error)
+
+
+def drain(batch_size=None, max_attempts=None):
+    """Sends one batch of due emails over a single SMTP connection.
+
+    Sent emails are removed from the outbox and failed ones are retried
+    later, until they fail max_attempts times and are removed as well.
+    Returns the number of emails sent and the number that failed.
+    """
+    config = current_app.config
+    batch_size = batch_size or config['MAIL_OUTBOX_BATCH_SIZE']
+    max_attempts = max_attempts or config['MAIL_OUTBOX_MAX_ATTEMPTS']
+    retry_delay = config['MAIL_OUTBOX_RETRY_DELAY']
+
+    batch = due_mail(batch_size, max_attempts)
+    if not batch:
+        db.session.commit()
+        return 0, 0
+
+    sent = failed = 0
+    try:
+        with mail.connect() as connection:
+            for outbox_mail in batch:
+                try:
+                    html, on_sent = TEMPLATES[outbox_mail.template](
+                        outbox_mail)
+                    connection.send(Message(
+                        outbox_mail.subject,
+                        sender=outbox_mail.sender,
+                        recipients=outbox_mail.recipients.split(','),
+                        html=html))
+                except Exception as e:
+                    record_failure(outbox_mail, e, retry_delay, max_attempts)
+                    failed += 1
+                else:
+                    on_sent()
+                    db.session.delete(outbox_mail)
+                    sent += 1
+    except Exception as e:
+        # We could not talk to the mail server, so retry whatever is left
+        for outbox_mail in batch[sent + failed:]:
+            record_failure(outbox_mail, e, retry_delay, max_attempts)
+            failed += 1
+
+    db.session.commit()
+    return sent, failed
+
+
+def run_worker(poll_interval=None, batch_size=None):
+    """Keeps draining the outbox, sleeping when there is nothing to send"""
+    poll_interval = poll_interval or current_app.config[
+        'MAIL_OUTBOX_POLL_INTERVAL']
+    while True:
+        sent, failed = drain(batch_size)
+        if sent or failed:
+            logger.info('Sent %d emails, %d failed', sent, failed)
+        if sent + failed < (batch_size or
+                            current_app.config['MAIL_OUTBOX_BATCH_SIZE']):
+            time.sleep(poll_interval)
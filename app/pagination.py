@@ -0,0 +1,87 @@
+"""This file contains helpers for keyset (cursor based) pagination.
+
+A page is requested with the `limit` and `cursor` query parameters. The
+cursor is an opaque token holding the id of the last row of the previous
+page, so every page is fetched with an indexed `id > cursor` range scan
+however deep into the collection it is.
+"""
+import base64
+import binascii
+
+from dateutil import parser, tz
+from flask import current_app, request, url_for
+
+
+class PaginationError(ValueError):
+    """Raised when the limit or cursor parameters are not valid"""
+
+
+def encode_cursor(last_id):
+    """Returns the cursor for the page after the row with id last_id"""
+    return base64.urlsafe_b64encode(
+        str(last_id).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Returns the row id a cursor points after"""
+    try:
+        padding = '=' * (-len(cursor) % 4)
+        return int(base64.urlsafe_b64decode((cursor + padding).encode()))
+    except (binascii.Error, ValueError, UnicodeDecodeError):
+        raise PaginationError('Invalid cursor {}'.format(cursor))
+
+
+def page_args():
+    """Returns the page size and the id to start after from the query
+    string, the latter being None for the first page"""
+    config = current_app.config
+    limit = request.args.get('limit', config['DEFAULT_PAGE_SIZE'])
+    try:
+        limit = int(limit)
+    except ValueError:
+        raise PaginationError('limit must be a number')
+    if limit < 1:
+        raise PaginationError('limit must be greater than 0')
+    limit = min(limit, config['MAX_PAGE_SIZE'])
+
+    cursor = request.args.get('cursor')
+    return limit, decode_cursor(cursor) if cursor else None
+
+
+def since_arg():
+    """Returns the `since` query parameter as a naive UTC datetime, or None
+    when it is not given"""
+    since = request.args.get('since')
+    if not since:
+        return None
+    try:
+        since = parser.parse(since)
+    except (ValueError, OverflowError):
+        raise PaginationError('Invalid since date {}'.format(since))
+    if since.tzinfo is not None:
+        since = since.astimezone(tz.tzutc()).replace(tzinfo=None)
+    return since
+
+
+def next_link(rows, limit):
+    """Returns the rows of the page and the URL of the next one.
+
+    rows must hold up to limit + 1 rows ordered by id, the extra row only
+    telling us that another page exists.
+    """
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+
+    args = request.args.to_dict()
+    args.update(request.view_args or {})
+    args['limit'] = limit
+    args['cursor'] = encode_cursor(rows[-1].id)
+    return rows, url_for(request.endpoint, _external=True, **args)
+
+
+def link_header(url):
+    """Returns the headers advertising the next page, if there is one"""
+    if not url:
+        return {}
+    return {'Link': '<{}>; rel="next"'.format(url)}
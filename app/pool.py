@@ -0,0 +1,136 @@
+"""This file contains the database extension with a configurable and
+instrumented connection pool.
+
+The pool is sized with the SQLALCHEMY_POOL_SIZE, SQLALCHEMY_MAX_OVERFLOW,
+SQLALCHEMY_POOL_TIMEOUT and SQLALCHEMY_POOL_RECYCLE settings of the app
+config. SQLALCHEMY_POOL_PRE_PING tests every connection as it is checked
+out and SQLALCHEMY_STATEMENT_TIMEOUT caps how long a Postgres statement
+may run, in milliseconds.
+"""
+import sqlite3
+import threading
+import time
+
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, exc, orm
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+POOL_OPTIONS = ('pool_size', 'max_overflow', 'pool_timeout', 'pool_recycle')
+
+
+class InstrumentedQueuePool(QueuePool):
+    """A QueuePool that counts how long checkouts wait for a connection and
+    how often it has to open connections beyond its size.
+
+    With ping_on_checkout every connection is tested before it is handed
+    out and replaced when the database dropped it, which SQLAlchemy only
+    offers itself from version 1.2 on.
+    """
+
+    def __init__(self, creator, ping_on_checkout=False, **kw):
+        super(InstrumentedQueuePool, self).__init__(creator, **kw)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.overflows = 0
+        self.timeouts = 0
+        if ping_on_checkout:
+            event.listen(self, 'checkout', ping_connection)
+
+    def _do_get(self):
+        overflow = self._overflow
+        started = time.monotonic()
+        try:
+            connection = super(InstrumentedQueuePool, self)._do_get()
+        except exc.TimeoutError:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        waited = time.monotonic() - started
+
+        with self._stats_lock:
+            self.checkouts += 1
+            self.wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+            # The overflow counts up from -pool_size as connections open
+            if self._overflow > max(overflow, 0):
+                self.overflows += 1
+        return connection
+
+    def stats(self):
+        """Returns the state of the pool and its checkout counters"""
+        with self._stats_lock:
+            return {
+                'size': self.size(),
+                'max_overflow': self._max_overflow,
+                'checked_out': self.checkedout(),
+                'checked_in': self.checkedin(),
+                'overflow': max(self.overflow(), 0),
+                'checkouts': self.checkouts,
+                'wait_seconds_total': round(self.wait_seconds, 6),
+                'wait_seconds_max': round(self.max_wait_seconds, 6),
+                'overflow_events': self.overflows,
+                'timeouts': self.timeouts
+            }
+
+
+def ping_connection(dbapi_connection, connection_record, connection_proxy):
+    """Checks a connection is alive as it leaves the pool. Raising
+    DisconnectionError makes the pool retry with a new connection."""
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute('SELECT 1')
+    except Exception:
+        raise exc.DisconnectionError()
+    finally:
+        cursor.close()
+
+
+class PooledSQLAlchemy(SQLAlchemy):
+    """The Flask-SQLAlchemy extension, creating engines with an
+    InstrumentedQueuePool set up from the app config and sessions that
+    can read from replicas"""
+
+    def create_session(self, options):
+        from app.routing import RoutingSession
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def apply_driver_hacks(self, app, info, options):
+        if info.drivername.startswith('sqlite'):
+            # SQLite connections can not move between threads, so it keeps
+            # the pool Flask-SQLAlchemy picks for it
+            for option in POOL_OPTIONS:
+                options.pop(option, None)
+            return super(PooledSQLAlchemy, self).apply_driver_hacks(
+                app, info, options)
+
+        result = super(PooledSQLAlchemy, self).apply_driver_hacks(
+            app, info, options)
+        options['poolclass'] = InstrumentedQueuePool
+        options['ping_on_checkout'] = app.config.get(
+            'SQLALCHEMY_POOL_PRE_PING', False)
+        statement_timeout = app.config.get('SQLALCHEMY_STATEMENT_TIMEOUT')
+        if statement_timeout and info.drivername.startswith('postgresql'):
+            options.setdefault('connect_args', {})['options'] = \
+                '-c statement_timeout={:d}'.format(statement_timeout)
+        return result
+
+
+@event.listens_for(Engine, 'connect')
+def enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    """SQLite ignores foreign keys, and so ON DELETE CASCADE, unless every
+    connection turns them on"""
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
+
+
+def pool_stats(engine):
+    """Returns the state of the connection pool of engine"""
+    pool = engine.pool
+    if isinstance(pool, InstrumentedQueuePool):
+        return pool.stats()
+    return {'pool': type(pool).__name__, 'status': pool.status()}
@@ -0,0 +1,133 @@
+"""This file contains the per-request profiler.
+
+Every request counts the SQL statements it runs and times them through
+SQLAlchemy engine events, and times authentication and serialization
+with the timed context manager. The numbers are sent back in a
+Server-Timing header and requests that go over the PROFILE_BUDGET_*
+settings are logged as warnings.
+"""
+import time
+from contextlib import contextmanager
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class Profile(object):
+    """The counters of one request. The db time includes the queries run
+    while authenticating."""
+    __slots__ = ('started', 'queries', 'timings')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.timings = {'db': 0.0, 'auth': 0.0, 'serialize': 0.0}
+
+
+def current_profile():
+    """Returns the profile of the current request, if it is profiled"""
+    return g.get('profile') if has_request_context() else None
+
+
+@contextmanager
+def timed(name):
+    """Adds the time spent in the block to the name timing of the current
+    request"""
+    profile = current_profile()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if profile is not None:
+            profile.timings[name] += time.perf_counter() - started
+
+
+def record_query(context):
+    """Adds the statement of the execution context to the current profile"""
+    started = getattr(context, 'query_started', None)
+    profile = current_profile()
+    if started is not None and profile is not None:
+        profile.queries += 1
+        profile.timings['db'] += time.perf_counter() - started
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context,
+                          executemany):
+    # The start time lives on the execution context of the statement, so a
+    # statement that fails can not leave it behind on the connection
+    if context is not None:
+        context.query_started = time.perf_counter()
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context,
+                         executemany):
+    record_query(context)
+
+
+def handle_error(exception_context):
+    # Failed statements, such as those cut off by the statement timeout,
+    # took time all the same
+    record_query(exception_context.execution_context)
+
+
+class RequestProfiler(object):
+    """Profiles every request of the app when PROFILE_ENABLED is set"""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Configure the profiler from the app config"""
+        self.enabled = app.config.get('PROFILE_ENABLED', True)
+        self.budget_queries = app.config.get('PROFILE_BUDGET_QUERIES')
+        self.budget_db_ms = app.config.get('PROFILE_BUDGET_DB_MS')
+        self.budget_ms = app.config.get('PROFILE_BUDGET_MS')
+        if not self.enabled:
+            return
+
+        # Engine events are global, so they are only listened for once
+        if not event.contains(Engine, 'before_cursor_execute',
+                              before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute',
+                         before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', after_cursor_execute)
+            event.listen(Engine, 'handle_error', handle_error)
+        app.before_request(self._start)
+        app.after_request(self._finish)
+
+    def _start(self):
+        g.profile = Profile()
+
+    def _finish(self, response):
+        profile = g.get('profile')
+        if profile is None:
+            return response
+        total_ms = (time.perf_counter() - profile.started) * 1000
+        timings_ms = dict((name, seconds * 1000)
+                          for name, seconds in profile.timings.items())
+
+        response.headers['Server-Timing'] = ', '.join([
+            'total;dur={:.2f}'.format(total_ms),
+            'db;dur={:.2f};desc="{} queries"'.format(timings_ms['db'],
+                                                    profile.queries),
+            'auth;dur={:.2f}'.format(timings_ms['auth']),
+            'serialize;dur={:.2f}'.format(timings_ms['serialize'])
+        ])
+
+        if self.over_budget(profile.queries, timings_ms['db'], total_ms):
+            current_app.logger.warning(
+                'Request over budget: %s %s (%s) took %.2fms, %d queries '
+                'in %.2fms, auth %.2fms, serialize %.2fms', request.method,
+                request.full_path, request.endpoint, total_ms,
+                profile.queries, timings_ms['db'], timings_ms['auth'],
+                timings_ms['serialize'])
+        return response
+
+    def over_budget(self, queries, db_ms, total_ms):
+        """Checks if a request went over any of the budgets"""
+        budgets = [(queries, self.budget_queries), (db_ms, self.budget_db_ms),
+                   (total_ms, self.budget_ms)]
+        return any(budget is not None and value > budget
+                   for value, budget in budgets)
@@ -0,0 +1,68 @@
+"""This file contains the worker that deletes the soft deleted shopping
+lists and their items in chunks, so that no single statement holds locks
+on a big list for long
+"""
+import logging
+import time
+
+from app import db
+from app.models import ShoppingList, ShoppingListItem
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+
+def deleted_lists(limit):
+    """Returns the ids of up to limit soft deleted lists, deleted longest
+    ago first"""
+    return [row.id for row in db.session.query(ShoppingList.id).filter(
+        ShoppingList.deleted_at.isnot(None)).order_by(
+            ShoppingList.deleted_at).limit(limit)]
+
+
+def purge_list(shoppinglist_id, batch_size):
+    """Deletes the items of a list batch_size at a time, committing after
+    each chunk, and then the list. Returns the number of items deleted."""
+    purged = 0
+    while True:
+        ids = [row.id for row in db.session.query(ShoppingListItem.id).filter(
+            ShoppingListItem.shoppinglist_id == shoppinglist_id).limit(
+                batch_size)]
+        if not ids:
+            break
+        purged += ShoppingListItem.query.filter(
+            ShoppingListItem.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+
+    # Another worker may have purged it already, which is fine
+    ShoppingList.query.filter(
+        ShoppingList.id == shoppinglist_id,
+        ShoppingList.deleted_at.isnot(None)).delete(
+            synchronize_session=False)
+    db.session.commit()
+    return purged
+
+
+def purge(batch_size=None, max_lists=None):
+    """Purges up to max_lists soft deleted lists. Returns the number of
+    lists and of items purged."""
+    config = current_app.config
+    batch_size = batch_size or config['LIST_PURGE_BATCH_SIZE']
+    max_lists = max_lists or config['LIST_PURGE_MAX_LISTS']
+
+    lists = deleted_lists(max_lists)
+    items = sum(purge_list(shoppinglist_id, batch_size)
+                for shoppinglist_id in lists)
+    return len(lists), items
+
+
+def run_worker(poll_interval=None, batch_size=None):
+    """Keeps purging deleted lists, sleeping when there are none left"""
+    poll_interval = poll_interval or current_app.config[
+        'LIST_PURGE_POLL_INTERVAL']
+    while True:
+        lists, items = purge(batch_size)
+        if lists:
+            logger.info('Purged %d shopping lists and %d items', lists, items)
+        if lists < current_app.config['LIST_PURGE_MAX_LISTS']:
+            time.sleep(poll_interval)
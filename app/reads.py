@@ -0,0 +1,129 @@
+"""This file contains the read layer behind the list, item and search
+endpoints.
+
+The endpoints only return a handful of columns, so rather than loading
+full ORM instances into the session, which tracks the state of every one
+of them, the queries here select just those columns and stream them with
+yield_per into small __slots__ records.
+"""
+from app import db
+from app.models import ShoppingList, ShoppingListItem
+from app.search import engine
+from flask import current_app
+
+
+class ShoppingListRecord(object):
+    """The columns of a shopping list the endpoints return"""
+    __slots__ = ('id', 'name', 'description', 'date_created',
+                 'date_modified', 'user_id')
+
+    def __init__(self, row):
+        (self.id, self.name, self.description, self.date_created,
+         self.date_modified, self.user_id) = row
+
+
+class ItemRecord(object):
+    """The columns of a shopping list item the endpoints return"""
+    __slots__ = ('id', 'name', 'description', 'date_created',
+                 'date_modified', 'shoppinglist_id')
+
+    def __init__(self, row):
+        (self.id, self.name, self.description, self.date_created,
+         self.date_modified, self.shoppinglist_id) = row
+
+
+SHOPPINGLIST_COLUMNS = [
+    getattr(ShoppingList, name) for name in ShoppingListRecord.__slots__
+]
+ITEM_COLUMNS = [getattr(ShoppingListItem, name) for name in ItemRecord.__slots__]
+
+
+def stream(query, record, batch_size=None):
+    """Yields a record for every row of query, fetching batch_size rows
+    from the database at a time"""
+    batch_size = batch_size or current_app.config['READ_BATCH_SIZE']
+    for row in query.yield_per(batch_size):
+        yield record(row)
+
+
+def shoppinglist_page(user_id, limit, after_id=None):
+    """Get a page of the lists belonging to user_id, see
+    ShoppingList.page_query"""
+    query = ShoppingList.page_query(user_id, limit, after_id).with_entities(
+        *SHOPPINGLIST_COLUMNS)
+    return list(stream(query, ShoppingListRecord))
+
+
+def item_page(shoppinglist_id, user_id, limit, after_id=None, since=None):
+    """Get a page of the items of a shopping list owned by user_id, see
+    ShoppingListItem.page_query"""
+    query = ShoppingListItem.page_query(
+        shoppinglist_id, user_id, limit, after_id, since).with_entities(
+            ShoppingList.id.label('list_id'), *ITEM_COLUMNS)
+    # The list is outer joined to its items so an empty list gives one row
+    # without an item
+    return [
+        record for record in stream(query, lambda row: ItemRecord(row[1:]))
+        if record.id is not None
+    ]
+
+
+def items_query(shoppinglist_ids, per_list):
+    """Query the item columns of the first per_list items of all the lists
+    with shoppinglist_ids, list by list in id order"""
+    ranked = ShoppingListItem.query.with_entities(
+        *ITEM_COLUMNS + [db.func.row_number().over(
+            partition_by=ShoppingListItem.shoppinglist_id,
+            order_by=ShoppingListItem.id).label('position')]).filter(
+                ShoppingListItem.shoppinglist_id.in_(
+                    shoppinglist_ids)).subquery()
+    return db.session.query(
+        *[ranked.c[column.key] for column in ITEM_COLUMNS]).filter(
+            ranked.c.position <= per_list).order_by(
+                ranked.c.shoppinglist_id, ranked.c.id)
+
+
+def items_by_list(shoppinglist_ids, per_list):
+    """Get up to per_list items of all the lists with shoppinglist_ids with
+    one query, as a dict of the items of every list keyed by its id"""
+    if not shoppinglist_ids:
+        return {}
+    items = {}
+    for record in stream(items_query(shoppinglist_ids, per_list), ItemRecord):
+        items.setdefault(record.shoppinglist_id, []).append(record)
+    return items
+
+
+def item_counts(shoppinglist_ids):
+    """Get the number of items in every list with shoppinglist_ids with one
+    query, as a dict keyed by list id"""
+    if not shoppinglist_ids:
+        return {}
+    return dict(
+        db.session.query(ShoppingListItem.shoppinglist_id,
+                         db.func.count(ShoppingListItem.id)).filter(
+                             ShoppingListItem.shoppinglist_id.in_(
+                                 shoppinglist_ids)).group_by(
+                                     ShoppingListItem.shoppinglist_id))
+
+
+def search(model, query, columns, record, search_term, limit):
+    """Returns up to limit records of the rows of query matching
+    search_term, best matches first"""
+    query = engine.search_query(model, query, search_term)
+    if query is None:
+        return []
+    return list(stream(query.with_entities(*columns).limit(limit), record))
+
+
+def search_shoppinglists(user_id, search_term, limit):
+    """Searches the shopping lists of user_id"""
+    return search(ShoppingList, engine.user_shoppinglists(user_id),
+                  SHOPPINGLIST_COLUMNS, ShoppingListRecord, search_term,
+                  limit)
+
+
+def search_items(user_id, search_term, limit):
+    """Searches the items in the shopping lists of user_id"""
+    return search(ShoppingListItem, engine.user_items(user_id), ITEM_COLUMNS,
+                  ItemRecord, search_term, limit)
@@ -0,0 +1,116 @@
+"""This file contains the routing of read-only requests to read replicas.
+
+Replicas are listed in SQLALCHEMY_REPLICA_URIS and become binds named
+replica_0, replica_1 and so on. The GET methods marked with
+read_from_replica send their queries to one of them, while everything
+else, including any flush, goes to the primary. A user who wrote
+something keeps reading from the primary for REPLICA_STICKINESS seconds
+so they always see their own changes.
+"""
+import itertools
+import threading
+
+from flask import g, has_app_context, request
+from flask_sqlalchemy import SignallingSession
+
+from app.cache import LRUCache, RedisBackend
+
+# Requests that never change anything
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class RoutingSession(SignallingSession):
+    """A session that queries the replica picked for the current request,
+    if there is one, and the primary otherwise"""
+
+    def __init__(self, db, **options):
+        self.db = db
+        super(RoutingSession, self).__init__(db, **options)
+
+    def get_bind(self, mapper=None, clause=None):
+        replica = g.get('read_replica') if has_app_context() else None
+        if replica is not None and not self._flushing:
+            return self.db.get_engine(self.app, bind=replica)
+        return super(RoutingSession, self).get_bind(mapper, clause)
+
+
+class ReplicaRouter(object):
+    """Picks the database each read-only request reads from.
+
+    The users who recently wrote are remembered in an LRUCache of this
+    process, or in Redis when the response cache uses it, so that every
+    worker sends them to the primary.
+    """
+
+    def __init__(self, app=None):
+        self.replicas = []
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Configure the router and the replica binds from the app config"""
+        from app import response_cache
+
+        uris = app.config.get('SQLALCHEMY_REPLICA_URIS') or []
+        self.replicas = ['replica_{}'.format(index) for index in
+                         range(len(uris))]
+        binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+        binds.update(zip(self.replicas, uris))
+        app.config['SQLALCHEMY_BINDS'] = binds
+
+        self.stickiness = app.config.get('REPLICA_STICKINESS', 5)
+        self._sticky = LRUCache(
+            app.config.get('REPLICA_STICKY_USERS', 100000), self.stickiness)
+        backend = response_cache.backend
+        self._shared = backend.client if isinstance(
+            backend, RedisBackend) else None
+        self._next_replica = itertools.cycle(self.replicas)
+        self.replica_reads = 0
+        self.primary_reads = 0
+
+        app.after_request(self._stick_writers)
+
+    @property
+    def shared(self):
+        """Whether every worker process sees the same sticky users"""
+        return self._shared is not None
+
+    def stick(self, user_id):
+        """Sends the reads of user_id to the primary for a while"""
+        if self._shared is not None:
+            self._shared.set('replica_sticky:{}'.format(user_id), 1,
+                             ex=max(int(self.stickiness), 1))
+        else:
+            self._sticky.set(user_id, True)
+
+    def is_sticky(self, user_id):
+        """Checks if user_id wrote something within the stickiness window"""
+        if self._shared is not None:
+            return self._shared.get(
+                'replica_sticky:{}'.format(user_id)) is not None
+        return self._sticky.get(user_id) is not None
+
+    def route(self, user_id):
+        """Picks the database the current request of user_id reads from"""
+        if not self.replicas or self.is_sticky(user_id):
+            with self._lock:
+                self.primary_reads += 1
+            return
+        with self._lock:
+            self.replica_reads += 1
+            g.read_replica = next(self._next_replica)
+
+    def _stick_writers(self, response):
+        if request.method not in READ_METHODS and g.get('user_id'):
+            self.stick(g.user_id)
+        return response
+
+    def stats(self):
+        """Returns the replicas and how many reads went to each side"""
+        with self._lock:
+            return {
+                'replicas': len(self.replicas),
+                'replica_reads': self.replica_reads,
+                'primary_reads': self.primary_reads
+            }
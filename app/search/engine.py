@@ -0,0 +1,118 @@
+"""This file contains the full-text search engine behind the search endpoint.
+
+Shopping lists and items are searched on their name and description.
+Postgres uses a GIN index over a tsvector expression and SQLite uses FTS5
+tables kept in sync by triggers, both created along with the tables and by
+the migrations. Other databases fall back to a LIKE scan.
+"""
+import re
+
+from app import db
+from app.models import ShoppingList, ShoppingListItem
+from sqlalchemy import DDL, event
+
+# Text search configuration used by the Postgres indexes and queries. It
+# neither stems nor drops stopwords, like the FTS5 tables of SQLite, so
+# prefixes such as 'off' still match 'office'.
+TEXT_CONFIG = 'simple'
+
+# The queries must use the very same expression as the index
+POSTGRES_DOCUMENT = "to_tsvector('" + TEXT_CONFIG + "', " \
+    "coalesce({prefix}name, '') || ' ' || coalesce({prefix}description, ''))"
+
+POSTGRES_INDEX = "CREATE INDEX ix_{table}_search ON {table} " \
+    "USING gin ((" + POSTGRES_DOCUMENT.format(prefix='') + "))"
+
+SQLITE_FTS = [
+    "CREATE VIRTUAL TABLE {table}_fts USING fts5(name, description, "
+    "content='{table}', content_rowid='id')",
+    "CREATE TRIGGER {table}_fts_insert AFTER INSERT ON {table} BEGIN "
+    "INSERT INTO {table}_fts(rowid, name, description) "
+    "VALUES (new.id, new.name, new.description); END",
+    "CREATE TRIGGER {table}_fts_delete AFTER DELETE ON {table} BEGIN "
+    "INSERT INTO {table}_fts({table}_fts, rowid, name, description) "
+    "VALUES ('delete', old.id, old.name, old.description); END",
+    "CREATE TRIGGER {table}_fts_update AFTER UPDATE ON {table} BEGIN "
+    "INSERT INTO {table}_fts({table}_fts, rowid, name, description) "
+    "VALUES ('delete', old.id, old.name, old.description); "
+    "INSERT INTO {table}_fts(rowid, name, description) "
+    "VALUES (new.id, new.name, new.description); END",
+]
+
+# Lets create the search indexes whenever the tables are created
+for model in (ShoppingList, ShoppingListItem):
+    table = model.__table__
+    event.listen(table, 'after_create', DDL(
+        POSTGRES_INDEX.format(table=table.name)).execute_if(
+            dialect='postgresql'))
+    for statement in SQLITE_FTS:
+        event.listen(table, 'after_create', DDL(
+            statement.format(table=table.name)).execute_if(dialect='sqlite'))
+    event.listen(table, 'before_drop', DDL(
+        'DROP TABLE IF EXISTS {}_fts'.format(table.name)).execute_if(
+            dialect='sqlite'))
+
+
+def search_terms(search_term):
+    """Splits the search string into words, dropping any punctuation that
+    the text search query syntax would interpret"""
+    return re.findall(r'\w+', search_term, re.UNICODE)
+
+
+def postgres_search(model, query, terms):
+    """Ranks rows of model matching all terms with the GIN index"""
+    document = db.literal_column(POSTGRES_DOCUMENT.format(
+        prefix=model.__tablename__ + '.'))
+    # The last word is matched as a prefix so partial words still match
+    ts_query = db.func.to_tsquery(
+        db.literal_column("'{}'".format(TEXT_CONFIG)),
+        ' & '.join(terms) + ':*')
+    return query.filter(document.op('@@')(ts_query)).order_by(
+        db.func.ts_rank(document, ts_query).desc())
+
+
+def sqlite_search(model, query, terms):
+    """Ranks rows of model matching all terms with the FTS5 table"""
+    fts_name = model.__tablename__ + '_fts'
+    fts = db.table(fts_name, db.column('rowid'))
+    match = ' '.join('"{}"'.format(term) for term in terms) + '*'
+    return query.join(fts, fts.c.rowid == model.id).filter(
+        db.literal_column(fts_name).op('MATCH')(match)).order_by(
+            db.literal_column(fts_name + '.rank'))
+
+
+def like_search(model, query, terms):
+    """Scans rows of model whose name or description holds every term"""
+    for term in terms:
+        pattern = '%' + term + '%'
+        query = query.filter(
+            db.or_(model.name.like(pattern), model.description.like(pattern)))
+    return query.order_by(model.id)
+
+
+BACKENDS = {
+    'postgresql': postgres_search,
+    'sqlite': sqlite_search,
+}
+
+
+def search_query(model, query, search_term):
+    """Narrows query down to the rows of model matching search_term, best
+    matches first. Returns None when there is nothing to search for."""
+    terms = search_terms(search_term)
+    if not terms:
+        return None
+    backend = BACKENDS.get(db.engine.dialect.name, like_search)
+    return backend(model, query, terms)
+
+
+def user_shoppinglists(user_id):
+    """Query the shopping lists of user_id"""
+    return ShoppingList.query.filter(ShoppingList.user_id == user_id)
+
+
+def user_items(user_id):
+    """Query the items in the shopping lists of user_id"""
+    return ShoppingListItem.query.join(
+        ShoppingList, ShoppingList.id == ShoppingListItem.shoppinglist_id
+    ).filter(ShoppingList.user_id == user_id)
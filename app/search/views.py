@@ -1,7 +1,11 @@
 """This file contains API endpoint logic for the APP"""
-from app.decorators import check_logged_in
-from app.models import ShoppingList, ShoppingListItem
-from flask import jsonify, make_response, request
+from app import reads
+from app.decorators import (cached_response, check_logged_in,
+                            read_from_replica)
+from app.serializers import jsonify
+from app.serializers.item import item_serializer
+from app.serializers.shoppinglist import shoppinglist_result_serializer
+from flask import make_response, request
 from flask.views import MethodView
 
 from . import search_blueprint
@@ -9,46 +13,21 @@ from . import search_blueprint
 
 class SearchView(MethodView):
     @check_logged_in
+    @cached_response('search')
+    @read_from_replica
     def get(self, user_id):
         """This section handles the search functionality of the API"""
         search_term = str(request.args.get('q', ''))
         limit = int(request.args.get('limit', 10))
-        # TODO: Check if authenticated before search
-        # Search for entry in shopping lists
-        shoppinglists = ShoppingList.query.filter(
-            ShoppingList.name.like("%" + search_term + "%")).limit(limit)
+        # Search the user's shopping lists, best matches first
+        shoppinglists = reads.search_shoppinglists(user_id, search_term, limit)
 
-        # Search for entry in shopping list items
-        shoppinglist_items = ShoppingListItem.query.filter(
-            ShoppingListItem.name.like("%" + search_term + "%")).limit(limit)
+        # Search the items in the user's shopping lists
+        shoppinglist_items = reads.search_items(user_id, search_term, limit)
 
-        results = []
-
-        # Prepare shopping list query results for returning to requestor
-        for shoppinglist in shoppinglists:
-            obj = {
-                'id': shoppinglist.id,
-                'name': shoppinglist.name,
-                'description': shoppinglist.description,
-                'date_created': shoppinglist.date_created,
-                'date_modified': shoppinglist.date_modified,
-                'user_id': shoppinglist.user_id,
-                'type': 'list'
-            }
-            results.append(obj)
-
-        # Prepare shopping list item query results for returning to requestor
-        for item in shoppinglist_items:
-            obj = {
-                'id': item.id,
-                'name': item.name,
-                'description': item.description,
-                'date_created': item.date_created,
-                'date_modified': item.date_modified,
-                'shopping_list_id': item.shoppinglist_id,
-                'type': 'item'
-            }
-            results.append(obj)
+        # Prepare the lists and then the items for returning to requestor
+        results = shoppinglist_result_serializer.many(shoppinglists)
+        results.extend(item_serializer.many(shoppinglist_items))
 
         if len(results) == 0:
             # Return a message if search didnot yield any results
@@ -0,0 +1,166 @@
+"""This file contains the generator of synthetic users, shopping lists and
+items for reproducing production scale locally.
+
+The data comes from a seeded random generator, so the same options give
+the same data. Rows get their ids up front and are written in batches,
+with COPY on Postgres and executemany inserts elsewhere, and every user
+shares one password hash so bcrypt runs once for the whole run.
+"""
+import csv
+import io
+import random
+import time
+from datetime import datetime, timedelta
+
+from app import db, password_hasher
+from app.models import ShoppingList, ShoppingListItem, User
+
+LIST_NAMES = ('Groceries', 'Weekly shop', 'Party', 'Hardware store',
+              'Pharmacy', 'Back to school', 'Camping trip', 'Holiday gifts',
+              'Office supplies', 'Garden', 'Baby things', 'Barbecue')
+ITEM_NAMES = ('Milk', 'Bread', 'Eggs', 'Rice', 'Sugar', 'Tea', 'Coffee',
+              'Apples', 'Bananas', 'Tomatoes', 'Onions', 'Soap', 'Batteries',
+              'Light bulbs', 'Notebooks', 'Pens', 'Tent', 'Charcoal', 'Paint',
+              'Nails', 'Nappies', 'Sausages', 'Matches', 'Toothpaste')
+UNITS = ('1 kg', '2 kg', '500 g', '1 litre', '2 litres', 'a pack', 'a dozen',
+         'a box', 'two', 'the big one')
+
+# The data is dated within the year before this day
+EPOCH = datetime(2017, 9, 1)
+
+# Models in the order their rows must reach the database
+MODELS = (User, ShoppingList, ShoppingListItem)
+
+
+class Seeder(object):
+    """Buffers the rows of each table and writes them batch_size at a time,
+    timing how long each table takes"""
+
+    def __init__(self, batch_size=10000):
+        self.batch_size = batch_size
+        self.copy = db.engine.dialect.name == 'postgresql'
+        self.rows = dict((model, []) for model in MODELS)
+        self.counts = dict((model, 0) for model in MODELS)
+        self.seconds = dict((model, 0.0) for model in MODELS)
+
+    def next_id(self, model):
+        """Returns the first id after the rows already in model's table"""
+        return (db.session.query(db.func.max(model.id)).scalar() or 0) + 1
+
+    def add(self, model, row):
+        """Buffers row, writing the table when its batch is full"""
+        self.rows[model].append(row)
+        if len(self.rows[model]) >= self.batch_size:
+            self.flush(model)
+
+    def flush(self, model=None):
+        """Writes the buffered rows of model, or of every table, after the
+        rows of the tables it references"""
+        for parent in MODELS[:MODELS.index(model) + 1 if model else None]:
+            rows = self.rows[parent]
+            if not rows:
+                continue
+            started = time.perf_counter()
+            if self.copy:
+                self.copy_rows(parent.__table__, rows)
+            else:
+                db.session.execute(parent.__table__.insert(), rows)
+                db.session.commit()
+            self.seconds[parent] += time.perf_counter() - started
+            self.counts[parent] += len(rows)
+            self.rows[parent] = []
+
+    def copy_rows(self, table, rows):
+        """Streams rows into table with COPY"""
+        columns = sorted(rows[0])
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow([row[column] for column in columns])
+        buffer.seek(0)
+
+        connection = db.session.connection().connection
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                'COPY {} ({}) FROM STDIN WITH (FORMAT csv)'.format(
+                    table.name, ', '.join(columns)), buffer)
+        db.session.commit()
+
+    def reset_sequences(self):
+        """Moves the Postgres id sequences past the ids given out here"""
+        if not self.copy:
+            return
+        for model in MODELS:
+            table = model.__tablename__
+            db.session.execute(
+                "SELECT setval(pg_get_serial_sequence('{0}', 'id'), "
+                "(SELECT max(id) FROM {0}))".format(table))
+        db.session.commit()
+
+    def report(self):
+        """Returns the rows written to each table and their rate"""
+        return [{
+            'table': model.__tablename__,
+            'rows': self.counts[model],
+            'seconds': round(self.seconds[model], 2),
+            'rows_per_sec': round(self.counts[model] / self.seconds[model])
+            if self.seconds[model] else 0
+        } for model in MODELS]
+
+
+def seed(users, lists_per_user=10, items_per_list=20, power_users=0,
+         power_user_lists=10000, password='seed1234', password_hash=None,
+         random_seed=0, batch_size=10000):
+    """Adds users with lists and items and returns the insert throughput
+    of each table.
+
+    Users own lists_per_user lists and lists hold items_per_list items on
+    average, except for the first power_users users who own
+    power_user_lists lists each. Every user's password is password, or
+    the bcrypt hash password_hash when given.
+    """
+    rng = random.Random(random_seed)
+    seeder = Seeder(batch_size)
+    password_hash = password_hash or password_hasher.generate(password)
+    user_id = seeder.next_id(User)
+    list_id = seeder.next_id(ShoppingList)
+    item_id = seeder.next_id(ShoppingListItem)
+
+    for index in range(users):
+        seeder.add(User, {
+            'id': user_id,
+            'email': 'user{}@example.com'.format(user_id),
+            'password': password_hash
+        })
+        lists = power_user_lists if index < power_users else rng.randint(
+            0, 2 * lists_per_user)
+
+        for _ in range(lists):
+            list_created = EPOCH - timedelta(seconds=rng.randint(0, 31536000))
+            seeder.add(ShoppingList, {
+                'id': list_id,
+                'name': rng.choice(LIST_NAMES),
+                'description': 'For {}'.format(rng.choice(LIST_NAMES).lower()),
+                'date_created': list_created,
+                'date_modified': list_created,
+                'user_id': user_id
+            })
+
+            for _ in range(rng.randint(0, 2 * items_per_list)):
+                item_created = list_created + timedelta(
+                    seconds=rng.randint(0, 86400))
+                seeder.add(ShoppingListItem, {
+                    'id': item_id,
+                    'name': rng.choice(ITEM_NAMES),
+                    'description': rng.choice(UNITS),
+                    'date_created': item_created,
+                    'date_modified': item_created,
+                    'shoppinglist_id': list_id
+                })
+                item_id += 1
+            list_id += 1
+        user_id += 1
+
+    seeder.flush()
+    seeder.reset_sequences()
+    return seeder.report()
@@ -0,0 +1,107 @@
+"""This package contains the serializers that turn shopping lists and items
+into the JSON the endpoints return.
+
+Every resource has a module holding its serializers. A serializer is built
+once from the fields of the resource, so turning a row into a dict is one
+attrgetter call and a zip. Datetimes are formatted as HTTP dates, the way
+Flask's jsonify does, and the responses are encoded with orjson or ujson
+when one of them is installed.
+"""
+import json
+from functools import lru_cache
+from operator import attrgetter
+
+from app.profiling import timed
+from flask import current_app
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+WEEKDAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+MONTHS = (None, 'Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug',
+          'Sep', 'Oct', 'Nov', 'Dec')
+
+
+@lru_cache(maxsize=4096)
+def format_datetime(value):
+    """Formats a naive UTC datetime as an HTTP date, such as
+    'Tue, 17 Oct 2017 09:30:00 GMT'.
+
+    Rows saved together share their timestamps, so the formatted dates
+    are cached.
+    """
+    if value is None:
+        return None
+    return '%s, %02d %s %04d %02d:%02d:%02d GMT' % (
+        WEEKDAYS[value.weekday()], value.day, MONTHS[value.month],
+        value.year, value.hour, value.minute, value.second)
+
+
+if orjson is not None:
+    ENCODER = 'orjson'
+
+    def dumps(data):
+        """Encodes data as UTF-8 JSON"""
+        return orjson.dumps(data)
+elif ujson is not None:
+    ENCODER = 'ujson'
+
+    def dumps(data):
+        """Encodes data as UTF-8 JSON"""
+        return ujson.dumps(
+            data, ensure_ascii=False, escape_forward_slashes=False).encode()
+else:
+    ENCODER = 'json'
+
+    def dumps(data):
+        """Encodes data as UTF-8 JSON"""
+        return json.dumps(
+            data, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def jsonify(data):
+    """Returns a JSON response of data, which must already be serialized
+    down to plain dicts, lists, strings and numbers"""
+    with timed('serialize'):
+        body = dumps(data)
+    return current_app.response_class(body, mimetype='application/json')
+
+
+class Serializer(object):
+    """Turns objects into the dicts a resource is returned as.
+
+    fields lists the keys of the dicts. A key is read from the attribute of
+    the same name unless given as a (key, attribute) pair. The keys in
+    dates hold datetimes and constants are added to every dict.
+    """
+
+    def __init__(self, fields, dates=(), **constants):
+        fields = [(field, field) if isinstance(field, str) else field
+                  for field in fields]
+        self.keys = tuple(key for key, _ in fields)
+        self.getter = attrgetter(*(attribute for _, attribute in fields))
+        self.dates = tuple(
+            index for index, key in enumerate(self.keys) if key in dates)
+        self.constants = constants
+
+    def one(self, obj, **extra):
+        """Returns the dict of obj, along with the extra keys given"""
+        values = list(self.getter(obj))
+        for index in self.dates:
+            values[index] = format_datetime(values[index])
+        data = dict(zip(self.keys, values))
+        data.update(self.constants)
+        data.update(extra)
+        return data
+
+    def many(self, objs, **extra):
+        """Returns the list of dicts of objs"""
+        with timed('serialize'):
+            return [self.one(obj, **extra) for obj in objs]
@@ -0,0 +1,16 @@
+"""This file contains the serializers of shopping list items"""
+from . import Serializer
+
+DATES = ('date_created', 'date_modified')
+
+# An item as it is listed and shown in search results
+item_serializer = Serializer(
+    ('id', 'name', 'description', 'date_created', 'date_modified',
+     ('shopping_list_id', 'shoppinglist_id')),
+    DATES,
+    type='item')
+
+# An item as it is created and edited, the views add the user_id
+saved_item_serializer = Serializer(
+    ('id', 'name', 'description', 'date_created', 'date_modified',
+     'shoppinglist_id'), DATES)
@@ -0,0 +1,12 @@
+"""This file contains the serializers of shopping lists"""
+from . import Serializer
+
+FIELDS = ('id', 'name', 'description', 'date_created', 'date_modified',
+          'user_id')
+DATES = ('date_created', 'date_modified')
+
+# A shopping list as it is created, edited and listed
+shoppinglist_serializer = Serializer(FIELDS, DATES)
+
+# A shopping list as it is shown on its own and in search results
+shoppinglist_result_serializer = Serializer(FIELDS, DATES, type='list')
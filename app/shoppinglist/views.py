@@ -1,36 +1,91 @@
 """This file contains API endpoint logic for the APP"""
 
-from app.decorators import check_logged_in
+from app import conditional, reads
+from app.decorators import (cached_response, check_logged_in,
+                            read_from_replica)
 from app.models import ShoppingList
-from flask import jsonify, make_response, request
+from app.pagination import encode_cursor, link_header, next_link, page_args
+from app.serializers import jsonify
+from app.serializers.item import item_serializer
+from app.serializers.shoppinglist import (shoppinglist_result_serializer,
+                                          shoppinglist_serializer)
+from flask import current_app, make_response, request, url_for
 from flask.views import MethodView
 
 from . import shoppinglist_blueprint
 
+# Related data that can be embedded in lists with ?include=
+INCLUDES = ('items', 'item_count')
+
+
+def include_arg():
+    """Returns the set of related data asked for with the `include` query
+    parameter, such as ?include=items,item_count"""
+    include = set(filter(None, request.args.get('include', '').split(',')))
+    unknown = include.difference(INCLUDES)
+    if unknown:
+        raise ValueError('Can not include {}, choose from {}'.format(
+            ','.join(sorted(unknown)), ','.join(INCLUDES)))
+    return include
+
+
+def embed(results, include):
+    """Adds the related data in include to the serialized lists, fetching
+    each of them for all the lists with a single query.
+
+    Lists embed up to MAX_EMBEDDED_ITEMS items. Lists holding more get an
+    items_next link to the next page of their items.
+    """
+    shoppinglist_ids = [result['id'] for result in results]
+    if 'items' in include:
+        per_list = current_app.config['MAX_EMBEDDED_ITEMS']
+        # Lets fetch one more item to tell if a list holds more
+        items = reads.items_by_list(shoppinglist_ids, per_list + 1)
+        for result in results:
+            list_items = items.get(result['id'], [])
+            if len(list_items) > per_list:
+                list_items = list_items[:per_list]
+                result['items_next'] = url_for(
+                    'item.item_view', id=result['id'], limit=per_list,
+                    cursor=encode_cursor(list_items[-1].id), _external=True)
+            result['items'] = item_serializer.many(list_items)
+    if 'item_count' in include:
+        counts = reads.item_counts(shoppinglist_ids)
+        for result in results:
+            result['item_count'] = counts.get(result['id'], 0)
+    return results
+
 
 class ShoppinglistsView(MethodView):
     """Handle Creation and listing of shopping lists"""
 
     @check_logged_in
+    @cached_response('shoppinglists')
+    @read_from_replica
     def get(self, user_id):
         # Executes if request is GET
-        # Return all shopping list for authed User
-        shoppinglists = ShoppingList.get_all(user_id)
-        results = []
-
-        for shoppinglist in shoppinglists:
-            obj = {
-                'id': shoppinglist.id,
-                'name': shoppinglist.name,
-                'description': shoppinglist.description,
-                'date_created': shoppinglist.date_created,
-                'date_modified': shoppinglist.date_modified,
-                'user_id': shoppinglist.user_id
-            }
-            results.append(obj)
-
-        # Return reponse with shopping lists and set server code
-        return make_response(jsonify(results)), 200
+        # Return a page of the shopping lists of the authed User
+        try:
+            limit, after_id = page_args()
+            include = include_arg()
+        except ValueError as e:
+            return {"message": str(e)}, 400
+
+        # Lets answer from the client's cache when the lists, and the items
+        # when they are included, are unchanged
+        etag, last_modified = conditional.validators(
+            *ShoppingList.fingerprint(user_id))
+        if conditional.is_not_modified(etag, last_modified):
+            return conditional.not_modified(etag, last_modified)
+
+        shoppinglists, next_url = next_link(
+            reads.shoppinglist_page(user_id, limit, after_id), limit)
+        results = embed(shoppinglist_serializer.many(shoppinglists), include)
+
+        # Return reponse with shopping lists and a link to the next page
+        headers = conditional.headers(etag, last_modified)
+        headers.update(link_header(next_url))
+        return make_response(jsonify(results)), 200, headers
 
     @check_logged_in
     def post(self, user_id):
@@ -40,14 +95,7 @@ class ShoppinglistsView(MethodView):
             shoppinglist = ShoppingList(
                 name=name, user_id=user_id, description=description)
             shoppinglist.save()
-            response = jsonify({
-                'id': shoppinglist.id,
-                'name': shoppinglist.name,
-                'description': shoppinglist.description,
-                'date_created': shoppinglist.date_created,
-                'date_modified': shoppinglist.date_modified,
-                'user_id': user_id
-            })
+            response = jsonify(shoppinglist_serializer.one(shoppinglist))
 
             return make_response(response), 201
         else:
@@ -62,24 +110,37 @@ class ShoppinglistManipulationView(MethodView):
 
     @check_logged_in
     def delete(self, user_id, id):
-        shoppinglist = ShoppingList.query.filter_by(id=id).first()
-        if not shoppinglist:
+        if current_app.config['SOFT_DELETE_LISTS']:
+            # Lets hide the list right away and leave deleting its items
+            # to the purge worker
+            deleted = ShoppingList.soft_delete(id, user_id)
+        else:
+            shoppinglist = ShoppingList.query.filter_by(
+                id=id, user_id=user_id).first()
+            if shoppinglist:
+                # The database deletes its items along with it
+                shoppinglist.delete()
+            deleted = shoppinglist is not None
+
+        if not deleted:
             # When no shopping list is found, we throw an
             # HTTPException with a 404 not found status code
             return {
                 "message": "shoppinglist with id {} not found".format(id)
             }, 404
-
-        if request.method == "DELETE":
-            # We handle DELETE the Delete request here
-            shoppinglist.delete()
-            return {
-                "message": "shoppinglist {} deleted".format(shoppinglist.id)
-            }, 200
+        return {"message": "shoppinglist {} deleted".format(id)}, 200
 
     @check_logged_in
+    @cached_response('shoppinglist')
+    @read_from_replica
     def get(self, user_id, id):
-        shoppinglist = ShoppingList.query.filter_by(id=id).first()
+        try:
+            include = include_arg()
+        except ValueError as e:
+            return {"message": str(e)}, 400
+
+        shoppinglist = ShoppingList.query.filter_by(
+            id=id, user_id=user_id).first()
         if not shoppinglist:
             # When no shopping list is found, we throw an
             # HTTPException with a 404 not found status code
@@ -87,27 +148,18 @@ class ShoppinglistManipulationView(MethodView):
                 "message": "shoppinglist with id {} not found".format(id)
             }, 404
 
-        results = []
-
         # Prepare shopping list query results for returning to
         # requestor
-        obj = {
-            'id': shoppinglist.id,
-            'name': shoppinglist.name,
-            'description': shoppinglist.description,
-            'date_created': shoppinglist.date_created,
-            'date_modified': shoppinglist.date_modified,
-            'user_id': shoppinglist.user_id,
-            'type': 'list'
-        }
-        results.append(obj)
+        results = embed([shoppinglist_result_serializer.one(shoppinglist)],
+                        include)
         return make_response(jsonify(results)), 200
 
     @check_logged_in
     def put(self, user_id, id):
         # We handle PUT request to edit list here
         # Grab the name form parameter and save it to the database
-        shoppinglist = ShoppingList.query.filter_by(id=id).first()
+        shoppinglist = ShoppingList.query.filter_by(
+            id=id, user_id=user_id).first()
         if not shoppinglist:
             # When no shopping list is found, we throw an
             # HTTPException with a 404 not found status code
@@ -124,14 +176,7 @@ class ShoppinglistManipulationView(MethodView):
         shoppinglist.save()
 
         # Now we prepare a response and return it to the requester
-        response = {
-            'id': shoppinglist.id,
-            'name': shoppinglist.name,
-            'description': shoppinglist.description,
-            'date_created': shoppinglist.date_created,
-            'date_modified': shoppinglist.date_modified,
-            'user_id': shoppinglist.user_id
-        }
+        response = shoppinglist_serializer.one(shoppinglist)
         return make_response(jsonify(response)), 200
 
 
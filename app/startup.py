@@ -0,0 +1,143 @@
+"""This file contains the timing of the app's startup and the lazy set up
+of the extensions that most requests never use.
+
+create_app records how long loading the models and the config, setting
+up each extension and registering the blueprints took, in milliseconds,
+in app.startup_timings. With LAZY_EXTENSIONS set, a LazyExtension only
+imports its extension and sets it up for an app the first time that app
+uses it, and LazyBlueprints only register the blueprints once the app
+first matches or builds a URL.
+"""
+import importlib
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from flask import current_app, has_app_context
+
+
+class StartupTimer(object):
+    """Times the phases of creating an app"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.timings = OrderedDict()
+
+    @contextmanager
+    def phase(self, name):
+        """Records the time spent in the block under name"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = round(
+                (time.perf_counter() - started) * 1000, 3)
+
+    def finish(self):
+        """Returns the timings along with the total"""
+        self.timings['total'] = round(
+            (time.perf_counter() - self.started) * 1000, 3)
+        return self.timings
+
+
+class LazyExtension(object):
+    """Stands in for the Flask extension class at path, e.g.
+    'flask_mail:Mail'.
+
+    Attributes are looked up on the extension, which is imported on first
+    use and set up for the current app, if there is one, the first time
+    that app uses it. Apps without LAZY_EXTENSIONS set it up right away in
+    init_app.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._extension = None
+        self._apps = weakref.WeakSet()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Sets the extension up for app unless it is lazy"""
+        if not app.config.get('LAZY_EXTENSIONS', False):
+            self.set_up(app)
+
+    def load(self):
+        """Returns the extension, importing it on first use"""
+        with self._lock:
+            if self._extension is None:
+                module, name = self.path.split(':')
+                self._extension = getattr(
+                    importlib.import_module(module), name)()
+        return self._extension
+
+    def set_up(self, app):
+        """Returns the extension, once it is set up for app"""
+        self.load()
+        with self._lock:
+            if app not in self._apps:
+                self._extension.init_app(app)
+                self._apps.add(app)
+        return self._extension
+
+    def __getattr__(self, name):
+        # Only reached for the attributes of the extension itself
+        if not has_app_context():
+            return getattr(self.load(), name)
+        return getattr(self.set_up(current_app._get_current_object()), name)
+
+
+class LazyBlueprints(object):
+    """Registers the blueprints at paths, e.g. 'app.auth:auth_blueprint',
+    with an app.
+
+    Registering them compiles every URL rule, which is most of the cost of
+    create_app once the views are imported. Apps with LAZY_EXTENSIONS
+    register them the first time they match or build a URL, so apps that
+    only ever push app contexts, like the manage.py commands and the tests
+    that send no request, never pay for it. The time it took replaces the
+    blueprints entry of app.startup_timings.
+    """
+
+    def __init__(self, paths):
+        self.paths = paths
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Registers the blueprints with app, or sets them up to be
+        registered on first use"""
+        if not app.config.get('LAZY_EXTENSIONS', False):
+            self.register(app)
+            return
+
+        create_url_adapter = app.create_url_adapter
+
+        def register_first(request):
+            # App contexts ask for an adapter up front too, which only
+            # builds URLs when there is a SERVER_NAME
+            if request is not None or app.config.get('SERVER_NAME'):
+                self.load(app)
+            return create_url_adapter(request)
+
+        # Every request and url_for asks the app for a URL adapter first
+        app.create_url_adapter = register_first
+
+    def load(self, app):
+        """Registers the blueprints with app unless they already are"""
+        with self._lock:
+            if 'create_url_adapter' not in vars(app):
+                return
+            del app.create_url_adapter
+            started = time.perf_counter()
+            self.register(app)
+            if hasattr(app, 'startup_timings'):
+                app.startup_timings['blueprints'] = round(
+                    (time.perf_counter() - started) * 1000, 3)
+
+    def register(self, app):
+        """Imports the blueprints and registers them with app"""
+        for path in self.paths:
+            module, name = path.split(':')
+            app.register_blueprint(
+                getattr(importlib.import_module(module), name))
@@ -0,0 +1,116 @@
+"""This file contains the warm-up each worker runs before it takes traffic
+and the readiness check behind GET /v1/ready.
+
+Warming up opens SQLALCHEMY_POOL_SIZE connections to the primary and to
+every replica, configures the mappers, registers the blueprints, runs a
+first query per table, loads the blacklisted tokens index and starts the
+password hashing threads, so that the first requests do not pay for any
+of it. It refuses to start a worker that keeps a cache of its own when
+there are several.
+"""
+import logging
+import os
+import threading
+import time
+
+from app import (blacklist_index, blueprints, db, password_hasher,
+                 replica_router, response_cache, token_cache)
+from app.cache import MemoryBackend
+from sqlalchemy import orm
+
+logger = logging.getLogger(__name__)
+
+_warmed_up = threading.Event()
+
+
+def open_connections(engine, count):
+    """Checks out count connections of engine at once and returns them to
+    the pool, leaving that many open"""
+    connections = []
+    try:
+        for _ in range(count):
+            connection = engine.connect()
+            connection.scalar('SELECT 1')
+            connections.append(connection)
+    finally:
+        for connection in connections:
+            connection.close()
+    return len(connections)
+
+
+def process_local_caches():
+    """Returns the enabled caches that only this process sees"""
+    caches = []
+    if response_cache.enabled and isinstance(response_cache.backend,
+                                             MemoryBackend):
+        caches.append('the response cache (set RESPONSE_CACHE_BACKEND=redis)')
+    if token_cache.max_size > 0:
+        caches.append('the token cache (set TOKEN_CACHE_SIZE=0)')
+    if replica_router.replicas and not replica_router.shared:
+        caches.append('the replica stickiness (set '
+                      'RESPONSE_CACHE_BACKEND=redis)')
+    if not blacklist_index.shared:
+        caches.append('the blacklist index (set '
+                      'RESPONSE_CACHE_BACKEND=redis)')
+    return caches
+
+
+def warm_up(app, workers=None):
+    """Gets the worker of app ready to serve and marks it ready.
+
+    workers is the number of worker processes serving the app, taken from
+    WEB_CONCURRENCY by default.
+    """
+    from app.models import (BlacklistToken, ShoppingList, ShoppingListItem,
+                            User)
+
+    if workers is None:
+        workers = int(os.getenv('WEB_CONCURRENCY', 1))
+    if workers > 1:
+        # Lets not serve stale or revoked data from the caches of the other
+        # workers, which this worker's writes and logouts never reach
+        caches = process_local_caches()
+        if caches:
+            raise RuntimeError(
+                '{} workers can not share {}'.format(
+                    workers, ', '.join(caches)))
+
+    started = time.perf_counter()
+    with app.app_context():
+        orm.configure_mappers()
+        blueprints.load(app)
+
+        pool_size = app.config.get('SQLALCHEMY_POOL_SIZE') or 1
+        binds = [None] + replica_router.replicas
+        for bind in binds:
+            open_connections(db.get_engine(app, bind=bind), pool_size)
+
+        for model in [User, ShoppingList, ShoppingListItem, BlacklistToken]:
+            model.query.limit(1).all()
+        blacklist_index.load()
+        password_hasher.generate('warm-up')
+        db.session.remove()
+
+    _warmed_up.set()
+    logger.info('Warmed up %d database pools in %.2fs', len(binds),
+                time.perf_counter() - started)
+
+
+def database_is_reachable():
+    """Checks the primary database answers"""
+    try:
+        db.session.execute('SELECT 1')
+        return True
+    except Exception as e:
+        logger.warning('Database is not reachable: %s', e)
+        return False
+    finally:
+        db.session.remove()
+
+
+def readiness():
+    """Returns the checks a worker must pass before it is sent traffic"""
+    return {
+        'warmed_up': _warmed_up.is_set(),
+        'database': database_is_reachable()
+    }
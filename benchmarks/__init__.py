@@ -0,0 +1,3 @@
+"""This package contains micro benchmarks for the API. Run a benchmark as a
+module from the project root, e.g. `python -m benchmarks.bench_blacklist`
+"""
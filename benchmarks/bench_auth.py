@@ -0,0 +1,91 @@
+"""This benchmark measures latency and throughput of the registration and
+login endpoints, which are dominated by bcrypt. Compare a run with
+--pool-size 0 (hashing inline on the request thread) against one using
+the hashing pool.
+"""
+import argparse
+import threading
+import time
+
+from app import password_hasher
+
+from .common import create_bench_app, percentile, report
+
+
+def run_concurrently(function, requests, concurrency):
+    """Calls function(i) for every i in range(requests) on concurrency
+    threads and returns the latency statistics in milliseconds"""
+    samples = []
+    lock = threading.Lock()
+    counter = iter(range(requests))
+
+    def worker():
+        while True:
+            with lock:
+                index = next(counter, None)
+            if index is None:
+                return
+            started = time.perf_counter()
+            function(index)
+            elapsed = (time.perf_counter() - started) * 1e3
+            with lock:
+                samples.append(elapsed)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    samples.sort()
+    return {
+        'requests': requests,
+        'concurrency': concurrency,
+        'p50_ms': round(percentile(samples, 0.50), 2),
+        'p99_ms': round(percentile(samples, 0.99), 2),
+        'requests_per_sec': round(requests / elapsed, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rounds', type=int, default=12)
+    parser.add_argument('--pool-size', type=int, default=None)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    app = create_bench_app()
+    app.config['BCRYPT_LOG_ROUNDS'] = args.rounds
+    if args.pool_size is not None:
+        app.config['BCRYPT_POOL_SIZE'] = args.pool_size
+    app.config['BCRYPT_MAX_PENDING'] = args.concurrency
+    password_hasher.init_app(app)
+    client = app.test_client()
+
+    def register(index):
+        # SQLite only takes one writer at a time, so registration is
+        # measured without concurrency
+        client.post('/v1/auth/register', data={
+            'email': 'user{}@example.com'.format(index),
+            'password': 'password{}'.format(index)
+        })
+
+    def login(index):
+        index = index % args.requests
+        app.test_client().post('/v1/auth/login', data={
+            'email': 'user{}@example.com'.format(index),
+            'password': 'password{}'.format(index)
+        })
+
+    report('auth', {
+        'bcrypt_rounds': args.rounds,
+        'pool_size': password_hasher.pool_size,
+        'register': run_concurrently(register, args.requests, 1),
+        'login': run_concurrently(login, args.requests, args.concurrency)
+    })
+
+
+if __name__ == '__main__':
+    main()
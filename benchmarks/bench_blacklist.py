@@ -0,0 +1,61 @@
+"""This benchmark compares blacklist checks with and without the in-memory
+index once the blacklist holds a large number of tokens
+"""
+import argparse
+import uuid
+from datetime import datetime
+
+from app import blacklist_index, db
+from app.models import BlacklistToken
+
+from .common import create_bench_app, measure, report
+
+
+def fill_blacklist(count, batch_size=10000):
+    """Inserts count random tokens into the blacklist table"""
+    table = BlacklistToken.__table__
+    now = datetime.now()
+    for start in range(0, count, batch_size):
+        rows = [{
+            'token_digest': BlacklistToken.digest(uuid.uuid4().hex),
+            'blacklisted_on': now
+        } for _ in range(min(batch_size, count - start))]
+        db.session.execute(table.insert(), rows)
+        db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tokens', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=10000)
+    args = parser.parse_args()
+
+    app = create_bench_app()
+    with app.app_context():
+        fill_blacklist(args.tokens)
+        blacklisted = BlacklistToken(token=uuid.uuid4().hex)
+        blacklisted.save()
+
+        def query_database():
+            # This is the lookup every check did before the index existed
+            token_digest = BlacklistToken.digest(uuid.uuid4().hex)
+            BlacklistToken.query.filter_by(token_digest=token_digest).first()
+
+        def check_unknown():
+            BlacklistToken.check_blacklist(uuid.uuid4().hex)
+
+        def check_blacklisted():
+            BlacklistToken.check_blacklist(blacklisted.token)
+
+        results = {'database_only': measure(query_database, args.repeat)}
+        blacklist_index.load()
+        results['indexed_not_blacklisted'] = measure(
+            check_unknown, args.repeat)
+        results['indexed_blacklisted'] = measure(
+            check_blacklisted, args.repeat)
+        results['index'] = blacklist_index.stats()
+        report('blacklist', results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""This benchmark compares adding items one request at a time against
+adding them with the batch endpoint
+"""
+import argparse
+import json
+import time
+
+from .common import create_bench_app, report
+
+
+def login(client):
+    """Registers and logs in a user, returning their auth headers"""
+    user_data = {'email': 'bench@example.com', 'password': 'bench'}
+    client.post('/v1/auth/register', data=user_data)
+    response = client.post('/v1/auth/login', data=user_data)
+    access_token = json.loads(response.data.decode())['access_token']
+    return dict(Authorization='Bearer ' + access_token)
+
+
+def create_list(client, headers):
+    response = client.post(
+        '/v1/shoppinglists/', headers=headers, data={'name': 'Groceries'})
+    return json.loads(response.data.decode())['id']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--items', type=int, default=2000)
+    parser.add_argument('--batch-size', type=int, default=50)
+    args = parser.parse_args()
+
+    app = create_bench_app()
+    client = app.test_client()
+    headers = login(client)
+    items = [{'name': 'Item {}'.format(index), 'description': 'bench'}
+             for index in range(args.items)]
+
+    items_url = '/v1/shoppinglists/{}/items'.format(
+        create_list(client, headers))
+    started = time.perf_counter()
+    for item in items:
+        client.post(items_url, headers=headers, data=item)
+    single_elapsed = time.perf_counter() - started
+
+    batch_url = '/v1/shoppinglists/{}/items/batch'.format(
+        create_list(client, headers))
+    started = time.perf_counter()
+    for start in range(0, args.items, args.batch_size):
+        client.post(
+            batch_url,
+            headers=headers,
+            content_type='application/json',
+            data=json.dumps(items[start:start + args.batch_size]))
+    batch_elapsed = time.perf_counter() - started
+
+    report('bulk_items', {
+        'items': args.items,
+        'batch_size': args.batch_size,
+        'single_rows_per_sec': round(args.items / single_elapsed, 1),
+        'batch_rows_per_sec': round(args.items / batch_elapsed, 1)
+    })
+
+
+if __name__ == '__main__':
+    main()
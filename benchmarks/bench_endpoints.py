@@ -0,0 +1,313 @@
+"""This benchmark drives every route of the auth, shoppinglist, item and
+search blueprints, through the test client or over HTTP, against a
+database holding --scale item rows, and reports the p50/p99 latency and
+throughput of each one.
+
+Results are compared with the baseline stored for the transport and
+scale, and the run exits with status 1 when a route answers with other
+status codes than in the baseline or got slower than the baseline
+allows. Record a baseline on a quiet machine with
+--save-baseline; baselines only compare runs on the same hardware.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from app import db, response_cache
+from app.models import ShoppingList, ShoppingListItem, User
+
+from .common import create_bench_app, percentile, report
+
+SCALES = {'1k': 1000, '100k': 100000, '1m': 1000000}
+ITEMS_PER_LIST = 100
+PASSWORD = 'bench1234'
+BASELINES = os.path.join(os.path.dirname(__file__), 'baselines')
+
+
+def seed(rows, batch_size=10000):
+    """Creates the benchmark user owning rows items spread over lists of
+    ITEMS_PER_LIST, and returns the user id and the list ids"""
+    user = User(email='bench@example.com', password=PASSWORD)
+    user.save()
+    user_id = user.id
+
+    lists = max(rows // ITEMS_PER_LIST, 1)
+    table = ShoppingList.__table__
+    for start in range(0, lists, batch_size):
+        db.session.execute(table.insert(), [{
+            'name': 'List {}'.format(index),
+            'description': 'bench',
+            'user_id': user_id
+        } for index in range(start, min(start + batch_size, lists))])
+        db.session.commit()
+    list_ids = [row.id for row in db.session.query(ShoppingList.id).filter_by(
+        user_id=user_id).order_by(ShoppingList.id)]
+
+    table = ShoppingListItem.__table__
+    for start in range(0, rows, batch_size):
+        db.session.execute(table.insert(), [{
+            'name': 'Item {}'.format(index),
+            'description': 'bench',
+            'shoppinglist_id': list_ids[index // ITEMS_PER_LIST % lists]
+        } for index in range(start, min(start + batch_size, rows))])
+        db.session.commit()
+    return user_id, list_ids
+
+
+def routes(app, user_id, list_ids):
+    """Returns the routes to benchmark by endpoint and method. Each one
+    builds the method, path, JSON body and headers of its index-th
+    request, creating whatever that request deletes beforehand."""
+
+    def token(for_user_id):
+        with app.app_context():
+            return User.query.get(for_user_id).generate_token(
+                for_user_id).decode()
+
+    auth = {'Authorization': 'Bearer ' + token(user_id)}
+    with app.app_context():
+        reset_user = User(email='reset@example.com', password=PASSWORD)
+        reset_user.save()
+        reset_user_id = reset_user.id
+    list_id = list_ids[0]
+    with app.app_context():
+        item_ids = [row.id for row in db.session.query(
+            ShoppingListItem.id).filter_by(shoppinglist_id=list_id).order_by(
+                ShoppingListItem.id)]
+
+    def new_list():
+        with app.app_context():
+            shoppinglist = ShoppingList(
+                name='Doomed', user_id=user_id, description='bench')
+            shoppinglist.save()
+            return shoppinglist.id
+
+    def new_items(count):
+        with app.app_context():
+            return [item.id for item in ShoppingListItem.bulk_create(
+                list_id, [{'name': 'Doomed', 'description': 'bench'}] *
+                count)]
+
+    def some_list(index):
+        return list_ids[index % len(list_ids)]
+
+    def some_item(index):
+        return item_ids[index % len(item_ids)]
+
+    return {
+        'auth.registration_view POST': lambda index: (
+            'POST', '/v1/auth/register', {
+                'email': 'user{}@example.com'.format(index),
+                'password': PASSWORD
+            }, {}),
+        'auth.login_view POST': lambda index: (
+            'POST', '/v1/auth/login', {
+                'email': 'bench@example.com',
+                'password': PASSWORD
+            }, {}),
+        'auth.logout_view POST': lambda index: (
+            'POST', '/v1/auth/logout', None,
+            {'Authorization': 'Bearer ' + token(user_id)}),
+        'auth.password_reset_view POST': lambda index: (
+            'POST', '/v1/auth/reset-password',
+            {'email': 'reset@example.com'}, {}),
+        'auth.password_reset_view GET': lambda index: (
+            'GET', '/v1/auth/reset-password?auth_token={}'.format(
+                token(reset_user_id)), None, {}),
+        'shoppinglist.shoppinglists_view GET': lambda index: (
+            'GET', '/v1/shoppinglists/', None, auth),
+        'shoppinglist.shoppinglists_view POST': lambda index: (
+            'POST', '/v1/shoppinglists/', {
+                'name': 'New {}'.format(index),
+                'description': 'bench'
+            }, auth),
+        'shoppinglist.shoppinglist_manipulation_view GET': lambda index: (
+            'GET', '/v1/shoppinglists/{}'.format(some_list(index)), None,
+            auth),
+        'shoppinglist.shoppinglist_manipulation_view PUT': lambda index: (
+            'PUT', '/v1/shoppinglists/{}'.format(some_list(index)), {
+                'name': 'Renamed {}'.format(index)
+            }, auth),
+        'shoppinglist.shoppinglist_manipulation_view DELETE': lambda index: (
+            'DELETE', '/v1/shoppinglists/{}'.format(new_list()), None, auth),
+        'item.item_view GET': lambda index: (
+            'GET', '/v1/shoppinglists/{}/items'.format(some_list(index)),
+            None, auth),
+        'item.item_view POST': lambda index: (
+            'POST', '/v1/shoppinglists/{}/items'.format(list_id), {
+                'name': 'New {}'.format(index),
+                'description': 'bench'
+            }, auth),
+        'item.item_manipulation_view PUT': lambda index: (
+            'PUT', '/v1/shoppinglists/{}/items/{}'.format(
+                list_id, some_item(index)), {
+                    'name': 'Renamed {}'.format(index)
+                }, auth),
+        'item.item_manipulation_view DELETE': lambda index: (
+            'DELETE', '/v1/shoppinglists/{}/items/{}'.format(
+                list_id, new_items(1)[0]), None, auth),
+        'item.item_batch_view POST': lambda index: (
+            'POST', '/v1/shoppinglists/{}/items/batch'.format(list_id), [{
+                'name': 'Batch {}'.format(number),
+                'description': 'bench'
+            } for number in range(10)], auth),
+        'item.item_batch_view PATCH': lambda index: (
+            'PATCH', '/v1/shoppinglists/{}/items/batch'.format(list_id), {
+                'ids': [some_item(index + number) for number in range(10)],
+                'description': 'Patched {}'.format(index)
+            }, auth),
+        'item.item_batch_view DELETE': lambda index: (
+            'DELETE', '/v1/shoppinglists/{}/items/batch'.format(list_id),
+            {'ids': new_items(10)}, auth),
+        'search.search_view GET': lambda index: (
+            'GET', '/v1/shoppinglists/search/?q=Item+{}'.format(index), None,
+            auth),
+    }
+
+
+def client_sender(app):
+    """Returns a function sending a request through the test client"""
+    client = app.test_client()
+
+    def send(method, path, body, headers):
+        data = json.dumps(body) if body is not None else None
+        return client.open(path, method=method, data=data, headers=headers,
+                           content_type='application/json').status_code
+    return send
+
+
+def http_sender(app):
+    """Serves app from a thread and returns a function sending a request
+    to it over HTTP"""
+    import requests
+    from werkzeug.serving import make_server
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    session = requests.Session()
+    base_url = 'http://127.0.0.1:{}'.format(server.server_port)
+
+    def send(method, path, body, headers):
+        return session.request(method, base_url + path, json=body,
+                               headers=headers).status_code
+    return send
+
+
+SENDERS = {'client': client_sender, 'http': http_sender}
+
+
+def run_route(send, build, repeat):
+    """Sends repeat requests built by build and returns their latency
+    statistics in milliseconds, throughput and status codes"""
+    samples = []
+    statuses = Counter()
+    for index in range(repeat):
+        method, path, body, headers = build(index)
+        started = time.perf_counter()
+        statuses[send(method, path, body, headers)] += 1
+        samples.append((time.perf_counter() - started) * 1e3)
+    elapsed = sum(samples) / 1e3
+    samples.sort()
+    return {
+        'requests': repeat,
+        'p50_ms': round(percentile(samples, 0.50), 3),
+        'p99_ms': round(percentile(samples, 0.99), 3),
+        'requests_per_sec': round(repeat / elapsed, 1),
+        'statuses': dict((str(code), count)
+                         for code, count in statuses.items())
+    }
+
+
+def regressions(results, baseline, threshold, min_delta_ms):
+    """Returns the routes answering with other status codes than their
+    baseline, or slower than it by more than threshold, ignoring latency
+    changes under min_delta_ms"""
+    flagged = []
+    for route, result in sorted(results.items()):
+        before = baseline.get(route)
+        if not before:
+            continue
+        # A route that starts failing fast must not pass for a speedup
+        if sorted(result['statuses']) != sorted(before['statuses']):
+            flagged.append('{} statuses {} != baseline {}'.format(
+                route, ','.join(sorted(result['statuses'])),
+                ','.join(sorted(before['statuses']))))
+        for stat in ['p50_ms', 'p99_ms']:
+            if result[stat] > before[stat] * (1 + threshold) and \
+                    result[stat] - before[stat] > min_delta_ms:
+                flagged.append('{} {} {} > baseline {}'.format(
+                    route, stat, result[stat], before[stat]))
+        if result['requests_per_sec'] < \
+                before['requests_per_sec'] * (1 - threshold):
+            flagged.append('{} requests_per_sec {} < baseline {}'.format(
+                route, result['requests_per_sec'],
+                before['requests_per_sec']))
+    return flagged
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--scale', choices=sorted(SCALES), default='1k')
+    parser.add_argument('--transport', choices=sorted(SENDERS),
+                        default='client')
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--route', action='append', default=None,
+                        help='Only run routes starting with this, e.g. item.')
+    parser.add_argument('--response-cache', action='store_true',
+                        help='Serve repeated GETs from the response cache')
+    parser.add_argument('--baseline', default=None)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='Allowed slowdown against the baseline')
+    parser.add_argument('--min-delta-ms', type=float, default=1.0)
+    args = parser.parse_args()
+    baseline_path = args.baseline or os.path.join(
+        BASELINES, 'endpoints-{}-{}.json'.format(args.transport, args.scale))
+
+    app = create_bench_app()
+    # Over budget warnings would drown the report
+    app.logger.setLevel(logging.ERROR)
+    response_cache.enabled = args.response_cache
+    started = time.perf_counter()
+    with app.app_context():
+        user_id, list_ids = seed(SCALES[args.scale])
+        db.session.remove()
+    seconds_seeding = round(time.perf_counter() - started, 1)
+
+    send = SENDERS[args.transport](app)
+    results = {}
+    for route, build in sorted(routes(app, user_id, list_ids).items()):
+        if args.route and not any(route.startswith(prefix)
+                                  for prefix in args.route):
+            continue
+        results[route] = run_route(send, build, args.repeat)
+
+    flagged = []
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(baseline_path), exist_ok=True)
+        with open(baseline_path, 'w') as baseline_file:
+            json.dump(results, baseline_file, indent=2, sort_keys=True)
+    elif os.path.exists(baseline_path):
+        with open(baseline_path) as baseline_file:
+            flagged = regressions(results, json.load(baseline_file),
+                                  args.threshold, args.min_delta_ms)
+
+    report('endpoints', {
+        'scale': args.scale,
+        'transport': args.transport,
+        'seconds_seeding': seconds_seeding,
+        'routes': results,
+        'regressions': flagged
+    })
+    if flagged:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
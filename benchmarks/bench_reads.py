@@ -0,0 +1,115 @@
+"""This benchmark compares reading a large shopping list through ORM
+instances against reading just the needed columns with the read layer.
+
+Each read path runs in its own process so that their peak memory can be
+told apart.
+"""
+import argparse
+import multiprocessing
+import resource
+import time
+import tracemalloc
+
+from app import db, reads
+from app.models import ShoppingList, ShoppingListItem, User
+
+from .common import create_bench_app, report
+
+
+def fill_list(items, batch_size=10000):
+    """Creates a user with one shopping list holding items items and
+    returns their ids"""
+    user = User(email='bench@example.com', password='bench')
+    user.save()
+    shoppinglist = ShoppingList(
+        name='Groceries', user_id=user.id, description='bench')
+    shoppinglist.save()
+
+    table = ShoppingListItem.__table__
+    for start in range(0, items, batch_size):
+        db.session.execute(table.insert(), [{
+            'name': 'Item {}'.format(index),
+            'description': 'bench',
+            'shoppinglist_id': shoppinglist.id
+        } for index in range(start, min(start + batch_size, items))])
+        db.session.commit()
+    return user.id, shoppinglist.id
+
+
+def read_orm(shoppinglist_id, user_id, items):
+    return ShoppingListItem.get_page(shoppinglist_id, user_id, items)
+
+
+def read_columns(shoppinglist_id, user_id, items):
+    return reads.item_page(shoppinglist_id, user_id, items)
+
+
+PATHS = {'orm': read_orm, 'columns': read_columns}
+
+
+def run_path(app, path, shoppinglist_id, user_id, items, repeat, results):
+    """Reads the list repeat times the way the endpoint does and records
+    the per row cost and memory use of path"""
+    with app.app_context():
+        # Connections must not be shared with the parent process
+        db.engine.dispose()
+
+        def read():
+            rows = PATHS[path](shoppinglist_id, user_id, items)
+            [{
+                'id': row.id,
+                'name': row.name,
+                'description': row.description,
+                'date_created': row.date_created,
+                'date_modified': row.date_modified,
+                'shopping_list_id': row.shoppinglist_id
+            } for row in rows]
+            db.session.remove()
+            return len(rows)
+
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        started = time.perf_counter()
+        for _ in range(repeat):
+            rows = read()
+        elapsed = time.perf_counter() - started
+        rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        # Tracing slows everything down so it gets a run of its own
+        tracemalloc.start()
+        read()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    results[path] = {
+        'rows': rows,
+        'per_row_us': round(elapsed / repeat / rows * 1e6, 3),
+        'peak_python_kb': peak // 1024,
+        # ru_maxrss is in kilobytes on Linux
+        'peak_rss_growth_kb': rss_after - rss_before
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--items', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app = create_bench_app()
+    with app.app_context():
+        user_id, shoppinglist_id = fill_list(args.items)
+        db.session.remove()
+
+    results = multiprocessing.Manager().dict()
+    for path in sorted(PATHS):
+        process = multiprocessing.Process(
+            target=run_path,
+            args=(app, path, shoppinglist_id, user_id, args.items,
+                  args.repeat, results))
+        process.start()
+        process.join()
+    report('reads', dict(results))
+
+
+if __name__ == '__main__':
+    main()
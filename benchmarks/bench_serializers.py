@@ -0,0 +1,105 @@
+"""This benchmark compares serializing the responses of the collection
+endpoints with the serializers against the dicts and stdlib jsonify the
+views used to build
+"""
+import argparse
+from datetime import datetime, timedelta
+
+import flask
+from app import create_app, serializers
+from app.reads import ItemRecord, ShoppingListRecord
+from app.serializers.item import item_serializer, saved_item_serializer
+from app.serializers.shoppinglist import (shoppinglist_result_serializer,
+                                          shoppinglist_serializer)
+
+from .common import measure, report
+
+
+def list_dict(shoppinglist):
+    return {
+        'id': shoppinglist.id,
+        'name': shoppinglist.name,
+        'description': shoppinglist.description,
+        'date_created': shoppinglist.date_created,
+        'date_modified': shoppinglist.date_modified,
+        'user_id': shoppinglist.user_id
+    }
+
+
+def item_dict(item):
+    return {
+        'id': item.id,
+        'name': item.name,
+        'description': item.description,
+        'date_created': item.date_created,
+        'date_modified': item.date_modified,
+        'shopping_list_id': item.shoppinglist_id,
+        'type': 'item'
+    }
+
+
+def saved_item_dict(item):
+    return {
+        'id': item.id,
+        'name': item.name,
+        'description': item.description,
+        'date_created': item.date_created,
+        'date_modified': item.date_modified,
+        'user_id': 1,
+        'shoppinglist_id': item.shoppinglist_id
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=1000)
+    args = parser.parse_args()
+
+    # Every row gets its own creation date so that the formatted dates
+    # are not all served from the cache
+    now = datetime.utcnow()
+    created = [now - timedelta(seconds=index) for index in range(args.rows)]
+    shoppinglists = [
+        ShoppingListRecord((index, 'List {}'.format(index), 'bench',
+                            created[index], now, 1))
+        for index in range(args.rows)
+    ]
+    items = [
+        ItemRecord((index, 'Item {}'.format(index), 'bench', created[index],
+                    now, 1)) for index in range(args.rows)
+    ]
+
+    endpoints = {
+        'GET /shoppinglists/': (
+            lambda: [list_dict(row) for row in shoppinglists],
+            lambda: shoppinglist_serializer.many(shoppinglists)),
+        'GET /shoppinglists/<id>/items': (
+            lambda: [item_dict(row) for row in items],
+            lambda: item_serializer.many(items)),
+        'GET /shoppinglists/search/': (
+            lambda: [dict(list_dict(row), type='list')
+                     for row in shoppinglists] +
+            [item_dict(row) for row in items],
+            lambda: shoppinglist_result_serializer.many(shoppinglists) +
+            item_serializer.many(items)),
+        'POST /shoppinglists/<id>/items/batch': (
+            lambda: [saved_item_dict(row) for row in items],
+            lambda: saved_item_serializer.many(items, user_id=1)),
+    }
+
+    app = create_app(config_name='testing')
+    results = {'encoder': serializers.ENCODER, 'rows': args.rows}
+    with app.test_request_context():
+        for endpoint, (build_dicts, serialize) in sorted(endpoints.items()):
+            results[endpoint] = {
+                'flask_jsonify': measure(
+                    lambda: flask.jsonify(build_dicts()), args.repeat),
+                'serializer': measure(
+                    lambda: serializers.jsonify(serialize()), args.repeat)
+            }
+    report('serializers', results)
+
+
+if __name__ == '__main__':
+    main()
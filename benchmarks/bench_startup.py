@@ -0,0 +1,68 @@
+"""This benchmark measures the cold start of a worker, importing the app
+and creating it in a fresh interpreter, and the cost of every further
+create_app call, as paid once per test, with and without
+LAZY_EXTENSIONS.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from .common import measure, percentile, report
+
+COLD_START = '''
+import json, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+flask_app = app.create_app('testing')
+created = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'startup_ms': flask_app.startup_timings
+}))
+'''
+
+
+def cold_start(lazy, runs):
+    """Starts runs interpreters and returns their median timings"""
+    env = dict(os.environ, LAZY_EXTENSIONS='1' if lazy else '0')
+    samples = [json.loads(subprocess.check_output(
+        [sys.executable, '-c', COLD_START], env=env).decode())
+        for _ in range(runs)]
+    imports = sorted(sample['import_ms'] for sample in samples)
+    creates = sorted(sample['create_app_ms'] for sample in samples)
+    return {
+        'import_ms': round(percentile(imports, 0.5), 2),
+        'create_app_ms': round(percentile(creates, 0.5), 2),
+        'total_ms': round(percentile(imports, 0.5) +
+                          percentile(creates, 0.5), 2),
+        'create_app_phases_ms': samples[len(samples) // 2]['startup_ms']
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    from app import create_app
+    from instance.config import TestingConfig
+
+    results = {}
+    for lazy in [False, True]:
+        TestingConfig.LAZY_EXTENSIONS = lazy
+        create_app('testing')
+        results['lazy' if lazy else 'eager'] = {
+            'cold_start': cold_start(lazy, args.runs),
+            'create_app_per_test': measure(
+                lambda: create_app('testing'), args.repeat)
+        }
+    report('startup', results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""This file contains helpers shared by the benchmarks"""
+import json
+import os
+import tempfile
+import time
+
+from app import create_app, db
+
+
+def create_bench_app():
+    """Creates a testing app bound to an empty benchmark database.
+
+    The database is taken from BENCH_DATABASE_URI and defaults to a
+    throwaway SQLite file.
+    """
+    app = create_app(config_name='testing')
+    database_uri = os.getenv('BENCH_DATABASE_URI')
+    if not database_uri:
+        database_uri = 'sqlite:///' + os.path.join(
+            tempfile.mkdtemp(), 'bench.db')
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri
+
+    with app.app_context():
+        db.session.close()
+        db.drop_all()
+        db.create_all()
+    return app
+
+
+def percentile(samples, fraction):
+    """Returns the value below which fraction of the sorted samples fall"""
+    index = min(int(round(fraction * (len(samples) - 1))), len(samples) - 1)
+    return samples[index]
+
+
+def measure(function, repeat=1000):
+    """Calls function repeat times and returns its latency statistics in
+    microseconds along with its throughput"""
+    samples = []
+    started = time.perf_counter()
+    for _ in range(repeat):
+        call_started = time.perf_counter()
+        function()
+        samples.append((time.perf_counter() - call_started) * 1e6)
+    elapsed = time.perf_counter() - started
+    samples.sort()
+    return {
+        'calls': repeat,
+        'mean_us': round(sum(samples) / repeat, 2),
+        'p50_us': round(percentile(samples, 0.50), 2),
+        'p99_us': round(percentile(samples, 0.99), 2),
+        'ops_per_sec': round(repeat / elapsed, 1)
+    }
+
+
+def report(name, results):
+    """Prints benchmark results as JSON"""
+    print(json.dumps({'benchmark': name, 'results': results}, indent=2))
@@ -0,0 +1,53 @@
+"""This file contains the gunicorn settings for serving wsgi.py.
+
+gunicorn forks WEB_CONCURRENCY worker processes, one per core by
+default, each serving WEB_THREADS requests at once. Every worker creates
+and warms up its own app, so it only accepts traffic once its database
+pool is open. Keep WEB_THREADS at or below DB_POOL_SIZE plus
+DB_MAX_OVERFLOW so requests do not queue for connections.
+
+Send SIGHUP to restart the workers gracefully, for instance after a
+deploy, and SIGTERM to let them finish their requests before stopping.
+"""
+import glob
+import multiprocessing
+import os
+
+bind = os.getenv('BIND', '0.0.0.0:{}'.format(os.getenv('PORT', 5000)))
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+threads = int(os.getenv('WEB_THREADS', 4))
+worker_class = 'gthread'
+
+# Each worker loads the app after it is forked, so no database connection
+# is ever shared between processes
+preload_app = False
+
+timeout = int(os.getenv('WEB_TIMEOUT', 30))
+graceful_timeout = int(os.getenv('WEB_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+
+# Lets replace workers after this many requests so that leaks can not
+# build up, with some jitter so they do not all restart at once
+max_requests = int(os.getenv('WEB_MAX_REQUESTS', 10000))
+max_requests_jitter = max_requests // 10
+
+accesslog = os.getenv('WEB_ACCESS_LOG')
+errorlog = '-'
+
+
+def on_starting(server):
+    """Tell the workers how many of them there are and drop the Prometheus
+    metrics left behind by a previous run"""
+    # app/warmup.py refuses to run several workers with per-process caches
+    os.environ['WEB_CONCURRENCY'] = str(server.cfg.workers)
+    directory = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+    if directory:
+        for path in glob.glob(os.path.join(directory, '*.db')):
+            os.remove(path)
+
+
+def child_exit(server, worker):
+    """Stop reporting the gauges of a worker that exited"""
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -11,26 +11,129 @@ class Config(object):
     SQLALCHEMY_DATABASE_URI = 'postgresql://postgres@localhost/'\
         'shoppinglist'
 
-    # email server
-    MAIL_SERVER = 'smtp.gmail.com'
-    MAIL_PORT = 587
-    MAIL_USE_TLS = True
+    # Database connections of each worker process, see app/pool.py. At
+    # most SQLALCHEMY_POOL_SIZE + SQLALCHEMY_MAX_OVERFLOW are opened and a
+    # request waits up to SQLALCHEMY_POOL_TIMEOUT seconds for one of them.
+    # The statement timeout is in milliseconds, 0 disables it.
+    SQLALCHEMY_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+    SQLALCHEMY_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 10))
+    SQLALCHEMY_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', 30))
+    SQLALCHEMY_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))
+    SQLALCHEMY_POOL_PRE_PING = True
+    SQLALCHEMY_STATEMENT_TIMEOUT = int(os.getenv('DB_STATEMENT_TIMEOUT', 5000))
+
+    # Read replicas for the read-only GET endpoints, see app/routing.py.
+    # Users read from the primary for REPLICA_STICKINESS seconds after they
+    # write, which should be longer than the replication lag.
+    SQLALCHEMY_REPLICA_URIS = [
+        uri for uri in os.getenv('DB_REPLICA_URIS', '').split(',') if uri
+    ]
+    REPLICA_STICKINESS = int(os.getenv('REPLICA_STICKINESS', 5))
+
+    # Flask-Mail and bcrypt are only loaded once an app sends mail or
+    # handles a password, and the blueprints only registered once it
+    # routes a request, which keeps app creation cheap
+    LAZY_EXTENSIONS = os.getenv('LAZY_EXTENSIONS', '1') == '1'
+
+    # Requests are counted and timed for the Prometheus metrics, and the
+    # pool and caches sampled at most once every so many seconds
+    METRICS_ENABLED = True
+    METRICS_SAMPLE_INTERVAL = 1
+
+    # Requests report their query count and timings in a Server-Timing
+    # header and are logged when they run more queries or take longer, in
+    # milliseconds, than these budgets
+    PROFILE_ENABLED = True
+    PROFILE_BUDGET_QUERIES = 10
+    PROFILE_BUDGET_DB_MS = 100
+    PROFILE_BUDGET_MS = 250
+
+    # email server, point it at a local debugging server with
+    # MAIL_SERVER=localhost MAIL_PORT=1025 MAIL_USE_TLS=0 MAIL_USERNAME=
+    MAIL_SERVER = os.getenv('MAIL_SERVER', 'smtp.gmail.com')
+    MAIL_PORT = int(os.getenv('MAIL_PORT', 587))
+    MAIL_USE_TLS = os.getenv('MAIL_USE_TLS', '1') == '1'
     MAIL_USE_SSL = False
-    MAIL_USERNAME = 'test.mail.ug@gmail.com'
-    MAIL_PASSWORD = '!kampala01'
+    MAIL_USERNAME = os.getenv('MAIL_USERNAME', 'test.mail.ug@gmail.com')
+    MAIL_PASSWORD = os.getenv('MAIL_PASSWORD', '!kampala01')
     # MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
     # MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
 
+    # Emails are queued in the outbox and sent by `manage.py send_mail`.
+    # Failed emails are retried after MAIL_OUTBOX_RETRY_DELAY seconds,
+    # doubling the delay on every attempt.
+    MAIL_OUTBOX_BATCH_SIZE = 50
+    MAIL_OUTBOX_MAX_ATTEMPTS = 5
+    MAIL_OUTBOX_RETRY_DELAY = 30
+    MAIL_OUTBOX_POLL_INTERVAL = 5
+
+    # DELETE /v1/shoppinglists/<id> only hides the list and
+    # `manage.py purge_lists` deletes it and its items later, up to
+    # LIST_PURGE_MAX_LISTS lists per round and LIST_PURGE_BATCH_SIZE items
+    # per statement. Otherwise the list and its items are deleted at once.
+    SOFT_DELETE_LISTS = os.getenv('SOFT_DELETE_LISTS', '1') == '1'
+    LIST_PURGE_BATCH_SIZE = 1000
+    LIST_PURGE_MAX_LISTS = 100
+    LIST_PURGE_POLL_INTERVAL = 5
+
     # administrator list
     ADMINS = ['test.mail.ug@gmail.com']
 
     # API Versioning
     API_VERSION = 'v1'
 
+    # Page size of collection endpoints, set per request with ?limit=
+    DEFAULT_PAGE_SIZE = 100
+    MAX_PAGE_SIZE = 1000
+
+    # Most items embedded in each list with ?include=items
+    MAX_EMBEDDED_ITEMS = 100
+
+    # Rows fetched from the database at a time by the read layer
+    READ_BATCH_SIZE = 500
+
+    # Most items that can be created in one batch request
+    MAX_BATCH_SIZE = 500
+
+    # Verified access tokens cache, size in entries and TTL in seconds.
+    # It lives in each process, so a logout only drops the token from the
+    # cache of the worker that handled it. Set TOKEN_CACHE_SIZE=0 to turn
+    # it off when running several workers.
+    TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 10000))
+    TOKEN_CACHE_TTL = 60
+
+    # Cache of GET responses, size in entries and TTL in seconds. The
+    # memory backend only suits a single worker process, set
+    # RESPONSE_CACHE_BACKEND=redis to share the cache between workers.
+    RESPONSE_CACHE_ENABLED = os.getenv('RESPONSE_CACHE_ENABLED', '1') == '1'
+    RESPONSE_CACHE_BACKEND = os.getenv('RESPONSE_CACHE_BACKEND', 'memory')
+    RESPONSE_CACHE_REDIS_URL = os.getenv('RESPONSE_CACHE_REDIS_URL',
+                                         'redis://localhost:6379/0')
+    RESPONSE_CACHE_SIZE = 10000
+    RESPONSE_CACHE_TTL = 60
+
+    # Bloom filter of blacklisted tokens, refreshed every few seconds and
+    # loaded from the snapshot written by `manage.py rebuild_blacklist_index`.
+    # Workers sharing the Redis response cache also see each other's
+    # logouts at once through it.
+    BLACKLIST_INDEX_CAPACITY = 1000000
+    BLACKLIST_INDEX_ERROR_RATE = 0.001
+    BLACKLIST_INDEX_REFRESH = 5
+    BLACKLIST_INDEX_PATH = os.getenv('BLACKLIST_INDEX_PATH')
+
+    # Password hashing cost and the worker pool that runs it. At most
+    # BCRYPT_MAX_PENDING hashes may wait for one of the workers.
+    BCRYPT_LOG_ROUNDS = int(os.getenv('BCRYPT_LOG_ROUNDS', 12))
+    BCRYPT_POOL_SIZE = os.cpu_count()
+    BCRYPT_MAX_PENDING = 64
+
 
 class DevelopmentConfig(Config):
     """Configurations for Development."""
     DEBUG = True
+    SQLALCHEMY_POOL_SIZE = 2
+    # Leave slow queries running while debugging them
+    SQLALCHEMY_STATEMENT_TIMEOUT = 0
 
 
 class TestingConfig(Config):
@@ -39,6 +142,10 @@ class TestingConfig(Config):
     SQLALCHEMY_DATABASE_URI = 'postgresql://postgres@localhost/'\
         'shoppinglist'
     DEBUG = True
+    # The lowest cost bcrypt accepts keeps the tests fast
+    BCRYPT_LOG_ROUNDS = 4
+    SQLALCHEMY_POOL_SIZE = 2
+    SQLALCHEMY_MAX_OVERFLOW = 5
 
 
 class StagingConfig(Config):
@@ -50,6 +157,11 @@ class ProductionConfig(Config):
     """Configurations for Production."""
     DEBUG = False
     TESTING = False
+    SQLALCHEMY_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 10))
+    SQLALCHEMY_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 5))
+    # gunicorn runs several workers, which must share their caches
+    RESPONSE_CACHE_BACKEND = os.getenv('RESPONSE_CACHE_BACKEND', 'redis')
+    TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 0))
 
 
 app_config = {
@@ -1,6 +1,8 @@
 """This file provides database migration commands"""
 # import class for handling our commands
-from app import create_app, db, models
+from app import (advisor, blacklist_index, create_app, db, models, outbox,
+                 purge, seeding)
+from app.models import BlacklistToken
 from flask_migrate import Migrate, MigrateCommand
 from flask_script import Manager
 
@@ -10,5 +12,83 @@ manager = Manager(app)
 
 manager.add_command('db', MigrateCommand)
 
+
+@MigrateCommand.command
+def advise():
+    """EXPLAIN the queries of the hot endpoints and flag table scans"""
+    report, flagged = advisor.advise()
+    print('\n'.join(report))
+    print('{} queries scan a whole table'.format(flagged))
+
+
+@manager.command
+def rebuild_blacklist_index():
+    """Rebuild the blacklisted tokens index and write its snapshot"""
+    bloom = blacklist_index.rebuild()
+    print('Indexed {} blacklisted tokens in {} bytes'.format(
+        bloom.count, len(bloom.bits)))
+    if not blacklist_index.snapshot_path:
+        print('BLACKLIST_INDEX_PATH is not set, no snapshot was written')
+
+
+@manager.command
+def purge_blacklist():
+    """Delete blacklisted tokens that have already expired"""
+    print('Purged {} expired blacklisted tokens'.format(
+        BlacklistToken.purge_expired()))
+
+
+@manager.option('-l', '--loop', dest='loop', action='store_true',
+                help='Keep polling for deleted lists instead of exiting')
+@manager.option('-b', '--batch-size', dest='batch_size', type=int,
+                default=None, help='Items deleted per statement')
+def purge_lists(loop=False, batch_size=None):
+    """Delete the soft deleted shopping lists and their items"""
+    if loop:
+        return purge.run_worker(batch_size=batch_size)
+    lists, items = purge.purge(batch_size)
+    print('Purged {} shopping lists and {} items'.format(lists, items))
+
+
+@manager.option('-u', '--users', dest='users', type=int, default=1000)
+@manager.option('-l', '--lists-per-user', dest='lists_per_user', type=int,
+                default=10, help='Average lists of an ordinary user')
+@manager.option('-i', '--items-per-list', dest='items_per_list', type=int,
+                default=20, help='Average items of a list')
+@manager.option('-p', '--power-users', dest='power_users', type=int,
+                default=0, help='Users owning --power-user-lists lists')
+@manager.option('--power-user-lists', dest='power_user_lists', type=int,
+                default=10000)
+@manager.option('--password', dest='password', default='seed1234')
+@manager.option('--password-hash', dest='password_hash', default=None,
+                help='bcrypt hash given to every user instead of hashing '
+                '--password')
+@manager.option('-s', '--seed', dest='random_seed', type=int, default=0,
+                help='Seed of the random data, the same seed gives the '
+                'same data')
+@manager.option('-b', '--batch-size', dest='batch_size', type=int,
+                default=10000)
+def seed(users, lists_per_user, items_per_list, power_users,
+         power_user_lists, password, password_hash, random_seed, batch_size):
+    """Fill the database with synthetic users, shopping lists and items"""
+    for table in seeding.seed(users, lists_per_user, items_per_list,
+                              power_users, power_user_lists, password,
+                              password_hash, random_seed, batch_size):
+        print('Inserted {rows} rows into {table} in {seconds}s '
+              '({rows_per_sec} rows/s)'.format(**table))
+
+
+@manager.option('-l', '--loop', dest='loop', action='store_true',
+                help='Keep polling the outbox instead of exiting')
+@manager.option('-b', '--batch-size', dest='batch_size', type=int,
+                default=None, help='Emails sent per SMTP connection')
+def send_mail(loop=False, batch_size=None):
+    """Send the emails waiting in the outbox"""
+    if loop:
+        return outbox.run_worker(batch_size=batch_size)
+    sent, failed = outbox.drain(batch_size)
+    print('Sent {} emails, {} failed'.format(sent, failed))
+
+
 if __name__ == '__main__':
     manager.run()
@@ -0,0 +1,38 @@
+"""add mail outbox
+
+Revision ID: 3b1f0c7d92ae
+Revises: 8f627ba9e660
+Create Date: 2026-10-18 11:26:05.913842
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b1f0c7d92ae'
+down_revision = '8f627ba9e660'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'mail_outbox',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('subject', sa.String(length=255), nullable=False),
+        sa.Column('sender', sa.String(length=255), nullable=False),
+        sa.Column('recipients', sa.Text(), nullable=False),
+        sa.Column('html', sa.Text(), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'))
+    op.create_index('ix_mail_outbox_next_attempt_at', 'mail_outbox',
+                    ['next_attempt_at'])
+
+
+def downgrade():
+    op.drop_index('ix_mail_outbox_next_attempt_at', table_name='mail_outbox')
+    op.drop_table('mail_outbox')
@@ -0,0 +1,60 @@
+"""add full-text search indexes
+
+Revision ID: 5d2e8a4c1b07
+Revises: 3b1f0c7d92ae
+Create Date: 2026-10-18 13:41:52.207115
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '5d2e8a4c1b07'
+down_revision = '3b1f0c7d92ae'
+branch_labels = None
+depends_on = None
+
+TABLES = ('shoppinglist', 'item_shoppinglist')
+
+POSTGRES_INDEX = "CREATE INDEX ix_{table}_search ON {table} USING gin " \
+    "((to_tsvector('english', coalesce(name, '') || ' ' || " \
+    "coalesce(description, ''))))"
+
+SQLITE_FTS = [
+    "CREATE VIRTUAL TABLE {table}_fts USING fts5(name, description, "
+    "content='{table}', content_rowid='id')",
+    "CREATE TRIGGER {table}_fts_insert AFTER INSERT ON {table} BEGIN "
+    "INSERT INTO {table}_fts(rowid, name, description) "
+    "VALUES (new.id, new.name, new.description); END",
+    "CREATE TRIGGER {table}_fts_delete AFTER DELETE ON {table} BEGIN "
+    "INSERT INTO {table}_fts({table}_fts, rowid, name, description) "
+    "VALUES ('delete', old.id, old.name, old.description); END",
+    "CREATE TRIGGER {table}_fts_update AFTER UPDATE ON {table} BEGIN "
+    "INSERT INTO {table}_fts({table}_fts, rowid, name, description) "
+    "VALUES ('delete', old.id, old.name, old.description); "
+    "INSERT INTO {table}_fts(rowid, name, description) "
+    "VALUES (new.id, new.name, new.description); END",
+    # Index the rows that already exist
+    "INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')",
+]
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    for table in TABLES:
+        if dialect == 'postgresql':
+            op.execute(POSTGRES_INDEX.format(table=table))
+        elif dialect == 'sqlite':
+            for statement in SQLITE_FTS:
+                op.execute(statement.format(table=table))
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    for table in TABLES:
+        if dialect == 'postgresql':
+            op.drop_index('ix_{}_search'.format(table), table_name=table)
+        elif dialect == 'sqlite':
+            for trigger in ('insert', 'delete', 'update'):
+                op.execute('DROP TRIGGER {}_fts_{}'.format(table, trigger))
+            op.execute('DROP TABLE {}_fts'.format(table))
@@ -0,0 +1,84 @@
+"""store blacklisted token digests
+
+Revision ID: 8f627ba9e660
+Revises: c4687a801a88
+Create Date: 2026-10-18 10:03:27.540931
+
+"""
+import hashlib
+from datetime import datetime
+
+from alembic import op
+import jwt
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8f627ba9e660'
+down_revision = 'c4687a801a88'
+branch_labels = None
+depends_on = None
+
+blacklist_tokens = sa.table(
+    'blacklist_tokens',
+    sa.column('id', sa.Integer),
+    sa.column('token', sa.String),
+    sa.column('token_digest', sa.String),
+    sa.column('expires_at', sa.DateTime))
+
+
+def token_expiry(token):
+    """Returns the expiry of a stored token, if it has a readable one"""
+    try:
+        payload = jwt.decode(token, verify=False)
+        return datetime.utcfromtimestamp(payload['exp'])
+    except (jwt.InvalidTokenError, KeyError, TypeError, ValueError):
+        return None
+
+
+def upgrade():
+    op.add_column('blacklist_tokens',
+                  sa.Column('token_digest', sa.String(length=64),
+                            nullable=True))
+    op.add_column('blacklist_tokens',
+                  sa.Column('expires_at', sa.DateTime(), nullable=True))
+
+    # Lets replace every stored token with its digest and expiry
+    connection = op.get_bind()
+    rows = connection.execute(
+        sa.select([blacklist_tokens.c.id, blacklist_tokens.c.token])).fetchall()
+    for row_id, token in rows:
+        connection.execute(
+            blacklist_tokens.update().where(
+                blacklist_tokens.c.id == row_id).values(
+                    token_digest=hashlib.sha256(token.encode()).hexdigest(),
+                    expires_at=token_expiry(token)))
+
+    with op.batch_alter_table('blacklist_tokens') as batch_op:
+        batch_op.alter_column('token_digest', existing_type=sa.String(64),
+                              nullable=False)
+        batch_op.drop_constraint('blacklist_tokens_token_key', type_='unique')
+        batch_op.drop_column('token')
+        batch_op.create_unique_constraint('blacklist_tokens_token_digest_key',
+                                          ['token_digest'])
+        batch_op.create_index('ix_blacklist_tokens_expires_at',
+                              ['expires_at'])
+
+
+def downgrade():
+    # The raw tokens can not be recovered, so the digests are kept in
+    # their place. Those rows no longer match any token.
+    with op.batch_alter_table('blacklist_tokens') as batch_op:
+        batch_op.drop_index('ix_blacklist_tokens_expires_at')
+        batch_op.drop_constraint('blacklist_tokens_token_digest_key',
+                                 type_='unique')
+        batch_op.alter_column('token_digest',
+                              new_column_name='token',
+                              existing_type=sa.String(64),
+                              type_=sa.String(500),
+                              existing_nullable=False)
+        batch_op.drop_column('expires_at')
+
+    with op.batch_alter_table('blacklist_tokens') as batch_op:
+        batch_op.create_unique_constraint('blacklist_tokens_token_key',
+                                          ['token'])
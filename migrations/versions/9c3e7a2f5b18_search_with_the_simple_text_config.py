@@ -0,0 +1,38 @@
+"""search with the simple text config
+
+Revision ID: 9c3e7a2f5b18
+Revises: f1a4c7e9b352
+Create Date: 2026-10-18 22:05:31.640217
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '9c3e7a2f5b18'
+down_revision = 'f1a4c7e9b352'
+branch_labels = None
+depends_on = None
+
+TABLES = ('shoppinglist', 'item_shoppinglist')
+
+POSTGRES_INDEX = "CREATE INDEX ix_{table}_search ON {table} USING gin " \
+    "((to_tsvector('{config}', coalesce(name, '') || ' ' || " \
+    "coalesce(description, ''))))"
+
+
+def replace_indexes(config):
+    # SQLite searches its FTS5 tables, which never stemmed
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for table in TABLES:
+        op.drop_index('ix_{}_search'.format(table), table_name=table)
+        op.execute(POSTGRES_INDEX.format(table=table, config=config))
+
+
+def upgrade():
+    replace_indexes('simple')
+
+
+def downgrade():
+    replace_indexes('english')
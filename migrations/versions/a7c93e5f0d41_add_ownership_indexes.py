@@ -0,0 +1,28 @@
+"""add ownership indexes
+
+Revision ID: a7c93e5f0d41
+Revises: 5d2e8a4c1b07
+Create Date: 2026-10-18 15:02:19.664380
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c93e5f0d41'
+down_revision = '5d2e8a4c1b07'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_shoppinglist_user_id_id', 'shoppinglist',
+                    ['user_id', 'id'])
+    op.create_index('ix_item_shoppinglist_shoppinglist_id_id',
+                    'item_shoppinglist', ['shoppinglist_id', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_item_shoppinglist_shoppinglist_id_id',
+                  table_name='item_shoppinglist')
+    op.drop_index('ix_shoppinglist_user_id_id', table_name='shoppinglist')
@@ -0,0 +1,43 @@
+"""render outbox mail when sent
+
+Revision ID: b6d1e04f7a29
+Revises: e3b9d2c5f814
+Create Date: 2026-10-18 20:12:44.518302
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6d1e04f7a29'
+down_revision = 'e3b9d2c5f814'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Queued emails hold reset tokens and passwords in their HTML and can't
+    # be turned into templates, so they are dropped
+    op.execute('DELETE FROM mail_outbox')
+    with op.batch_alter_table('mail_outbox') as batch_op:
+        batch_op.drop_column('html')
+        batch_op.add_column(
+            sa.Column('template', sa.String(length=64), nullable=False))
+        batch_op.add_column(
+            sa.Column('user_id', sa.Integer(), nullable=True))
+        batch_op.add_column(
+            sa.Column('link', sa.String(length=255), nullable=True))
+        batch_op.create_foreign_key('mail_outbox_user_id_fkey', 'users',
+                                    ['user_id'], ['id'], ondelete='CASCADE')
+
+
+def downgrade():
+    op.execute('DELETE FROM mail_outbox')
+    with op.batch_alter_table('mail_outbox') as batch_op:
+        batch_op.drop_constraint('mail_outbox_user_id_fkey',
+                                 type_='foreignkey')
+        batch_op.drop_column('link')
+        batch_op.drop_column('user_id')
+        batch_op.drop_column('template')
+        batch_op.add_column(sa.Column('html', sa.Text(), nullable=False))
@@ -0,0 +1,84 @@
+"""cascade and soft delete lists
+
+Revision ID: e3b9d2c5f814
+Revises: a7c93e5f0d41
+Create Date: 2026-10-18 18:41:07.352918
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e3b9d2c5f814'
+down_revision = 'a7c93e5f0d41'
+branch_labels = None
+depends_on = None
+
+# The names Postgres gave the foreign keys of the initial tables
+FOREIGN_KEYS = [
+    ('shoppinglist_user_id_fkey', 'shoppinglist', 'users', 'user_id'),
+    ('item_shoppinglist_shoppinglist_id_fkey', 'item_shoppinglist',
+     'shoppinglist', 'shoppinglist_id'),
+]
+
+
+# SQLite neither names foreign keys nor alters them, so its tables are
+# copied with the new keys, which drops their search triggers
+SQLITE_NAMING_CONVENTION = {
+    'fk': '%(table_name)s_%(column_0_name)s_fkey',
+}
+
+SQLITE_FTS_TRIGGERS = [
+    "CREATE TRIGGER {table}_fts_insert AFTER INSERT ON {table} BEGIN "
+    "INSERT INTO {table}_fts(rowid, name, description) "
+    "VALUES (new.id, new.name, new.description); END",
+    "CREATE TRIGGER {table}_fts_delete AFTER DELETE ON {table} BEGIN "
+    "INSERT INTO {table}_fts({table}_fts, rowid, name, description) "
+    "VALUES ('delete', old.id, old.name, old.description); END",
+    "CREATE TRIGGER {table}_fts_update AFTER UPDATE ON {table} BEGIN "
+    "INSERT INTO {table}_fts({table}_fts, rowid, name, description) "
+    "VALUES ('delete', old.id, old.name, old.description); "
+    "INSERT INTO {table}_fts(rowid, name, description) "
+    "VALUES (new.id, new.name, new.description); END",
+]
+
+
+def rebuild_sqlite_foreign_keys(ondelete):
+    # Lets copy the tables with foreign keys off, as dropping the old
+    # shoppinglist table would otherwise delete or orphan its items
+    op.execute('PRAGMA foreign_keys=OFF')
+    for name, table, referent, column in FOREIGN_KEYS:
+        with op.batch_alter_table(
+                table, recreate='always',
+                naming_convention=SQLITE_NAMING_CONVENTION) as batch_op:
+            batch_op.drop_constraint(name, type_='foreignkey')
+            batch_op.create_foreign_key(name, referent, [column], ['id'],
+                                        ondelete=ondelete)
+        for statement in SQLITE_FTS_TRIGGERS:
+            op.execute(statement.format(table=table))
+    op.execute('PRAGMA foreign_keys=ON')
+
+
+def replace_foreign_keys(ondelete):
+    if op.get_bind().dialect.name == 'sqlite':
+        rebuild_sqlite_foreign_keys(ondelete)
+        return
+    for name, table, referent, column in FOREIGN_KEYS:
+        op.drop_constraint(name, table, type_='foreignkey')
+        op.create_foreign_key(name, table, referent, [column], ['id'],
+                              ondelete=ondelete)
+
+
+def upgrade():
+    op.add_column('shoppinglist',
+                  sa.Column('deleted_at', sa.DateTime(), nullable=True))
+    op.create_index('ix_shoppinglist_deleted_at', 'shoppinglist',
+                    ['deleted_at'])
+    replace_foreign_keys('CASCADE')
+
+
+def downgrade():
+    replace_foreign_keys(None)
+    op.drop_index('ix_shoppinglist_deleted_at', table_name='shoppinglist')
+    op.drop_column('shoppinglist', 'deleted_at')
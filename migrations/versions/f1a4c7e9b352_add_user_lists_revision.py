@@ -0,0 +1,36 @@
+"""add user lists revision
+
+Revision ID: f1a4c7e9b352
+Revises: b6d1e04f7a29
+Create Date: 2026-10-18 20:47:31.204118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1a4c7e9b352'
+down_revision = 'b6d1e04f7a29'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('users', sa.Column('lists_revision', sa.Integer(),
+                                     server_default='0', nullable=False))
+    op.add_column('users',
+                  sa.Column('lists_modified_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    # SQLite copies the users table to drop the columns, and dropping the
+    # old one must not touch the lists referencing it
+    sqlite = op.get_bind().dialect.name == 'sqlite'
+    if sqlite:
+        op.execute('PRAGMA foreign_keys=OFF')
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('lists_modified_at')
+        batch_op.drop_column('lists_revision')
+    if sqlite:
+        op.execute('PRAGMA foreign_keys=ON')
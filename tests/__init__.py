@@ -0,0 +1,20 @@
+"""This package contains the test cases of the API"""
+
+
+class StandInRedis(object):
+    """Takes the place of a Redis server shared by several workers"""
+
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, ex=None):
+        self.values[key] = value.encode()
+
+    def incr(self, key):
+        self.values[key] = str(int(self.values.get(key, 0)) + 1).encode()
+
+    def expire(self, key, ttl):
+        pass
@@ -2,11 +2,18 @@
  features
 """
 import json
+import threading
 import time
+from datetime import datetime, timedelta
 from unittest import TestCase
 
-from app import create_app, db
-from app.models import BlacklistToken
+import jwt
+
+from app import (blacklist_index, create_app, db, mail, outbox,
+                 password_hasher, response_cache, token_cache)
+from app.cache import RedisBackend
+from app.models import BlacklistToken, OutboxMail, User
+from tests import StandInRedis
 
 
 class AuthTestCase(TestCase):
@@ -160,3 +167,185 @@ class AuthTestCase(TestCase):
             self.assertTrue(
                 result['message'] == 'Token blacklisted. Please log in again.')
             self.assertEqual(logout_response.status_code, 401)
+
+    def test_logged_out_token_is_not_served_from_cache(self):
+        """Test a cached token stops working once the user logs out"""
+        self.client().post('/v1/auth/register', data=self.user_data)
+        login_response = self.client().post(
+            '/v1/auth/login', data=self.user_data)
+        access_token = json.loads(login_response.data.decode())['access_token']
+        headers = dict(Authorization='Bearer ' + access_token)
+
+        # The second request should be served from the token cache
+        self.assertEqual(
+            self.client().get('/v1/shoppinglists/', headers=headers)
+            .status_code, 200)
+        self.assertEqual(
+            self.client().get('/v1/shoppinglists/', headers=headers)
+            .status_code, 200)
+        self.assertEqual(token_cache.stats()['hits'], 1)
+
+        logout_response = self.client().post('/v1/auth/logout', headers=headers)
+        self.assertEqual(logout_response.status_code, 200)
+
+        # Now the token must be rejected even though it was cached
+        response = self.client().get('/v1/shoppinglists/', headers=headers)
+        result = json.loads(response.data.decode())
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(result['message'],
+                         'Token blacklisted. Please log in again.')
+
+    def test_blacklist_index_picks_up_tokens_from_other_processes(self):
+        """Test the blacklist index sees rows it did not insert itself"""
+        with self.app.app_context():
+            blacklist_index.refresh_interval = 0
+            self.assertFalse(BlacklistToken.check_blacklist('other-token'))
+
+            # Insert a row the way another worker process would
+            db.session.execute(BlacklistToken.__table__.insert(), {
+                'token_digest': BlacklistToken.digest('other-token'),
+                'blacklisted_on': datetime.now()
+            })
+            db.session.commit()
+
+            self.assertTrue(BlacklistToken.check_blacklist('other-token'))
+
+    def test_logouts_reach_every_worker_at_once(self):
+        """Test a worker sharing Redis sees tokens blacklisted by another
+        worker without waiting for its index to refresh"""
+        response_cache.backend = RedisBackend(StandInRedis(), 60)
+        blacklist_index.init_app(self.app)
+        with self.app.app_context():
+            self.assertFalse(BlacklistToken.check_blacklist('other-token'))
+
+            # Blacklist the token the way another worker process would
+            db.session.execute(BlacklistToken.__table__.insert(), {
+                'token_digest': BlacklistToken.digest('other-token'),
+                'blacklisted_on': datetime.now()
+            })
+            db.session.commit()
+            response_cache.backend.client.incr(blacklist_index.version_key)
+
+            self.assertTrue(BlacklistToken.check_blacklist('other-token'))
+
+    def test_blacklist_index_grows_in_the_background(self):
+        """Test a full blacklist index keeps answering while a bigger one
+        is built, and misses no token blacklisted meanwhile"""
+        blacklist_index.capacity = 1
+        with self.app.app_context():
+            self.assertFalse(BlacklistToken.check_blacklist('first-token'))
+            BlacklistToken(token='first-token').save()
+            BlacklistToken(token='second-token').save()
+
+            self.assertTrue(BlacklistToken.check_blacklist('first-token'))
+            BlacklistToken(token='third-token').save()
+            blacklist_index._grower.join()
+
+            self.assertGreater(blacklist_index.stats()['capacity'], 1)
+            for token in ['first-token', 'second-token', 'third-token']:
+                self.assertTrue(BlacklistToken.check_blacklist(token))
+            self.assertFalse(BlacklistToken.check_blacklist('other-token'))
+
+    def test_expired_blacklist_entries_are_purged(self):
+        """Test blacklisted tokens are kept until they expire"""
+        with self.app.app_context():
+            expired_token = jwt.encode({
+                'exp': datetime.utcnow() - timedelta(minutes=1)
+            }, 'mys3cr3t').decode()
+            live_token = jwt.encode({
+                'exp': datetime.utcnow() + timedelta(minutes=1)
+            }, 'mys3cr3t').decode()
+            BlacklistToken(token=expired_token).save()
+            BlacklistToken(token=live_token).save()
+
+            self.assertEqual(BlacklistToken.purge_expired(), 1)
+            self.assertFalse(BlacklistToken.check_blacklist(expired_token))
+            self.assertTrue(BlacklistToken.check_blacklist(live_token))
+
+    def test_password_is_rehashed_when_cost_changes(self):
+        """Test logging in upgrades a hash made with another bcrypt cost"""
+        self.client().post('/v1/auth/register', data=self.user_data)
+
+        password_hasher.log_rounds = 5
+        login_response = self.client().post(
+            '/v1/auth/login', data=self.user_data)
+        self.assertEqual(login_response.status_code, 200)
+
+        with self.app.app_context():
+            user = User.query.filter_by(email=self.user_data['email']).first()
+            self.assertTrue(user.password.startswith('$2b$05$'))
+            self.assertTrue(user.password_is_valid(self.user_data['password']))
+
+    def test_new_password_is_only_set_once_it_is_sent(self):
+        """Test a password reset keeps no secret in the outbox and leaves the
+        old password in place until the new one is sent"""
+        self.client().post('/v1/auth/register', data=self.user_data)
+        with self.app.app_context():
+            user = User.query.filter_by(email=self.user_data['email']).first()
+            access_token = user.generate_token(user.id).decode()
+
+        with mail.record_messages() as outgoing:
+            reset_response = self.client().get(
+                '/v1/auth/reset-password?auth_token={}'.format(access_token))
+            self.assertEqual(reset_response.status_code, 200)
+
+            with self.app.app_context():
+                outbox_mail = OutboxMail.query.one()
+                self.assertEqual(outbox_mail.template, 'new_password')
+                self.assertFalse(hasattr(outbox_mail, 'html'))
+
+                # Lets leave no free slot in the hasher
+                password_hasher._slots = threading.BoundedSemaphore(1)
+                password_hasher._slots.acquire()
+                self.assertEqual(outbox.drain(), (0, 1))
+                self.assertEqual(OutboxMail.query.one().attempts, 1)
+
+                password_hasher._slots = threading.BoundedSemaphore(1)
+                user = User.query.filter_by(
+                    email=self.user_data['email']).first()
+                self.assertTrue(
+                    user.password_is_valid(self.user_data['password']))
+                OutboxMail.query.update({'next_attempt_at': datetime.utcnow()})
+                self.assertEqual(outbox.drain(), (1, 0))
+
+        self.assertEqual(len(outgoing), 1)
+        password = outgoing[0].html.split('<b>')[1].split('</b>')[0]
+        login_response = self.client().post('/v1/auth/login', data={
+            'email': self.user_data['email'],
+            'password': password
+        })
+        self.assertEqual(login_response.status_code, 200)
+
+    def test_outbox_gives_up_on_failing_emails(self):
+        """Test an email is deleted once it has failed its last attempt"""
+        with self.app.app_context():
+            OutboxMail.enqueue('Subject', 'sender@example.com',
+                               ['someone@example.com'], 'no_such_template')
+            for attempt in range(self.app.config['MAIL_OUTBOX_MAX_ATTEMPTS']):
+                self.assertEqual(OutboxMail.query.count(), 1)
+                OutboxMail.query.update({'next_attempt_at': datetime.utcnow()})
+                self.assertEqual(outbox.drain(), (0, 1))
+            self.assertEqual(OutboxMail.query.count(), 0)
+
+    def test_password_reset_email_is_sent_from_the_outbox(self):
+        """Test a password reset queues its email for the outbox worker"""
+        self.client().post('/v1/auth/register', data=self.user_data)
+
+        with mail.record_messages() as outgoing:
+            reset_response = self.client().post(
+                '/v1/auth/reset-password',
+                data={'email': self.user_data['email']})
+            self.assertEqual(reset_response.status_code, 200)
+
+            # Nothing is sent while handling the request
+            self.assertEqual(len(outgoing), 0)
+
+            with self.app.app_context():
+                # The reset token is only created when the email is sent
+                self.assertEqual(OutboxMail.query.one().template,
+                                 'password_reset_link')
+                self.assertEqual(outbox.drain(), (1, 0))
+                self.assertEqual(OutboxMail.query.count(), 0)
+
+        self.assertEqual(len(outgoing), 1)
+        self.assertIn('reset-password?auth_token=', outgoing[0].html)
@@ -0,0 +1,181 @@
+"""This file contains some test cases for the instrumentation of the API"""
+import json
+import sqlite3
+from unittest import TestCase
+
+from app import (blacklist_index, create_app, db, mail, request_profiler,
+                 response_cache, token_cache, warmup)
+from app.cache import RedisBackend
+from app.pool import InstrumentedQueuePool
+from app.profiling import Profile
+from flask import g
+from sqlalchemy import exc
+from tests import StandInRedis
+
+
+class InstrumentationTests(TestCase):
+    """This class represents the instrumentation test scenarios"""
+
+    def setUp(self):
+        """Initialise useful variables"""
+        self.app = create_app(config_name="testing")
+        self.client = self.app.test_client
+
+    def test_pool_counts_waits_and_overflow(self):
+        """Test the pool counts checkouts, overflow and timeouts"""
+        pool = InstrumentedQueuePool(
+            lambda: sqlite3.connect(':memory:'),
+            ping_on_checkout=True,
+            pool_size=1,
+            max_overflow=1,
+            timeout=0.01)
+        first = pool.connect()
+        second = pool.connect()
+        self.assertRaises(exc.TimeoutError, pool.connect)
+
+        stats = pool.stats()
+        self.assertEqual(stats['checked_out'], 2)
+        self.assertEqual(stats['checkouts'], 2)
+        self.assertEqual(stats['overflow_events'], 1)
+        self.assertEqual(stats['timeouts'], 1)
+
+        first.close()
+        second.close()
+        stats = pool.stats()
+        self.assertEqual(stats['checked_out'], 0)
+        self.assertEqual(stats['checked_in'], 1)
+
+    def test_postgres_pool_is_configured(self):
+        """Test Postgres engines get the pool set in the app config"""
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = \
+            'postgresql://postgres@localhost/shoppinglist'
+        with self.app.app_context():
+            pool = db.get_engine(self.app).pool
+            self.assertIsInstance(pool, InstrumentedQueuePool)
+            self.assertEqual(pool.size(),
+                             self.app.config['SQLALCHEMY_POOL_SIZE'])
+            self.assertEqual(pool.stats()['max_overflow'],
+                             self.app.config['SQLALCHEMY_MAX_OVERFLOW'])
+
+    def test_instrumentation_reports_pool_and_caches(self):
+        """Test API reports the state of the pool and the caches"""
+        response = self.client().get('/v1/instrumentation')
+        self.assertEqual(response.status_code, 200)
+        stats = json.loads(response.data.decode())
+        for name in ['db_pool', 'response_cache', 'token_cache']:
+            self.assertIn(name, stats)
+
+    def test_responses_report_server_timing(self):
+        """Test API reports the queries and timings of every request"""
+        with self.app.app_context():
+            db.session.close()
+            db.drop_all()
+            db.create_all()
+        user_data = {'email': 'user@test.com', 'password': 'test1234'}
+        self.client().post('/v1/auth/register', data=user_data)
+        login_response = self.client().post('/v1/auth/login', data=user_data)
+        access_token = json.loads(login_response.data.decode())['access_token']
+
+        response = self.client().get(
+            '/v1/shoppinglists/',
+            headers=dict(Authorization="Bearer " + access_token))
+        self.assertEqual(response.status_code, 200)
+        timing = response.headers['Server-Timing']
+        for name in ['total;dur=', 'db;dur=', 'auth;dur=', 'serialize;dur=']:
+            self.assertIn(name, timing)
+        self.assertNotIn('desc="0 queries"', timing)
+
+    def test_failed_queries_are_profiled(self):
+        """Test a failed statement is counted and leaves nothing behind on
+        its connection"""
+        with self.app.test_request_context():
+            g.profile = Profile()
+            with db.engine.connect() as connection:
+                self.assertRaises(exc.DBAPIError, connection.execute,
+                                  'SELECT * FROM no_such_table')
+                connection.execute('SELECT 1')
+                self.assertNotIn('query_started', connection.info)
+            self.assertEqual(g.profile.queries, 2)
+            self.assertGreater(g.profile.timings['db'], 0)
+
+    def test_requests_over_budget_are_logged(self):
+        """Test API logs the requests that go over the budgets"""
+        request_profiler.budget_ms = 0
+        with self.assertLogs(self.app.logger, level='WARNING') as logs:
+            self.client().get('/v1/instrumentation')
+        self.assertIn('Request over budget: GET /v1/instrumentation',
+                      logs.output[-1])
+
+    def test_metrics_count_requests_per_endpoint(self):
+        """Test API reports requests and latencies in Prometheus format"""
+        self.client().get('/v1/instrumentation')
+        response = self.client().get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain'))
+        metrics = response.data.decode()
+        self.assertIn('shoppinglist_requests_total{endpoint="instrumentation.'
+                      'instrumentation_view",method="GET",status="200"}',
+                      metrics)
+        self.assertIn('shoppinglist_request_duration_seconds_bucket{'
+                      'endpoint="instrumentation.instrumentation_view"',
+                      metrics)
+        self.assertIn('shoppinglist_cache_lookups_total', metrics)
+
+    def test_worker_is_ready_once_warmed_up(self):
+        """Test API reports it is ready after warming up"""
+        with self.app.app_context():
+            db.session.close()
+            db.drop_all()
+            db.create_all()
+        warmup.warm_up(self.app)
+        response = self.client().get('/v1/ready')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            json.loads(response.data.decode()),
+            {'warmed_up': True, 'database': True})
+
+    def test_workers_only_start_with_shared_caches(self):
+        """Test several workers refuse to start while they keep caches of
+        their own"""
+        with self.app.app_context():
+            db.session.close()
+            db.drop_all()
+            db.create_all()
+        with self.assertRaises(RuntimeError) as raised:
+            warmup.warm_up(self.app, workers=2)
+        self.assertIn('response cache', str(raised.exception))
+        self.assertIn('token cache', str(raised.exception))
+        self.assertIn('blacklist index', str(raised.exception))
+
+        response_cache.backend = RedisBackend(StandInRedis(), 60)
+        blacklist_index.init_app(self.app)
+        token_cache.max_size = 0
+        warmup.warm_up(self.app, workers=2)
+        response = self.client().get('/v1/ready')
+        self.assertEqual(response.status_code, 200)
+
+    def test_blueprints_are_registered_on_first_request(self):
+        """Test lazy apps only register their blueprints once they route a
+        request"""
+        with self.app.app_context():
+            self.assertNotIn('auth', self.app.blueprints)
+
+        response = self.client().get('/v1/instrumentation')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('auth', self.app.blueprints)
+        startup = json.loads(response.data.decode())['startup_ms']
+        self.assertGreater(startup['blueprints'], 0)
+
+    def test_mail_is_set_up_on_first_use(self):
+        """Test lazy apps only set up Flask-Mail when they use it and report
+        how long their startup took"""
+        self.assertTrue(self.app.config['LAZY_EXTENSIONS'])
+        self.assertNotIn('mail', self.app.extensions)
+        with self.app.app_context():
+            self.assertTrue(callable(mail.send))
+        self.assertIn('mail', self.app.extensions)
+
+        response = self.client().get('/v1/instrumentation')
+        startup = json.loads(response.data.decode())['startup_ms']
+        for phase in ['config', 'db', 'mail', 'blueprints', 'total']:
+            self.assertIn(phase, startup)
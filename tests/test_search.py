@@ -0,0 +1,85 @@
+"""This file contains test cases for searching shopping lists and items"""
+import json
+from unittest import TestCase
+
+from app import create_app, db
+
+
+class SearchTests(TestCase):
+    """This class represents the search test scenarios"""
+
+    def setUp(self):
+        """Initialise useful variables"""
+        self.app = create_app(config_name="testing")
+        self.client = self.app.test_client
+
+        # binds the app to the current context
+        with self.app.app_context():
+            # create all tables
+            db.session.close()
+            db.drop_all()
+            db.create_all()
+
+    def login_user(self, email="user@test.com", password="test1234"):
+        """This method registers and logs in a user, returning the headers
+        to authenticate as them"""
+        user_data = {'email': email, 'password': password}
+        self.client().post('/v1/auth/register', data=user_data)
+        login_response = self.client().post('/v1/auth/login', data=user_data)
+        access_token = json.loads(login_response.data.decode())['access_token']
+        return dict(Authorization="Bearer " + access_token)
+
+    def create_list(self, headers, name, description='', items=()):
+        """This method creates a shopping list with some items"""
+        new_list_response = self.client().post(
+            '/v1/shoppinglists/',
+            headers=headers,
+            data={'name': name, 'description': description})
+        list_id = json.loads(new_list_response.data.decode())['id']
+        for item in items:
+            self.client().post(
+                '/v1/shoppinglists/{}/items'.format(list_id),
+                headers=headers,
+                data={'name': item})
+        return list_id
+
+    def search(self, headers, search_term):
+        """This method searches and returns the names of the results"""
+        response = self.client().get(
+            '/v1/shoppinglists/search/?q=' + search_term, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        results = json.loads(response.data.decode())
+        if isinstance(results, dict):
+            return []
+        return [(result['type'], result['name']) for result in results]
+
+    def test_search_matches_names_and_descriptions(self):
+        """Test search finds lists and items by name and description"""
+        headers = self.login_user()
+        self.create_list(headers, 'Weekend', 'Milk for the party',
+                         items=['Whole milk', 'Bread'])
+        self.create_list(headers, 'Office supplies', items=['Pens'])
+
+        self.assertEqual(
+            self.search(headers, 'milk'),
+            [('list', 'Weekend'), ('item', 'Whole milk')])
+
+        # The last word is matched as a prefix
+        self.assertEqual(self.search(headers, 'off'),
+                         [('list', 'Office supplies')])
+        self.assertEqual(self.search(headers, 'nothing'), [])
+
+    def test_search_only_returns_the_users_own_lists(self):
+        """Test search does not leak other users' lists and items"""
+        headers = self.login_user()
+        self.create_list(headers, 'Birthday cake', items=['Cake flour'])
+        self.create_list(headers, 'Renamed later')
+
+        other_headers = self.login_user(email='other@test.com')
+        self.assertEqual(self.search(other_headers, 'cake'), [])
+
+        # Edits are reflected in the search index
+        self.client().put(
+            '/v1/shoppinglists/2', headers=headers, data={'name': 'Garden'})
+        self.assertEqual(self.search(headers, 'garden'), [('list', 'Garden')])
+        self.assertEqual(self.search(headers, 'renamed'), [])
@@ -2,9 +2,20 @@
 manipulation of shopping lists and items within them
 """
 import json
+import os
+import tempfile
 from unittest import TestCase
 
-from app import create_app, db
+from datetime import datetime
+
+from app import (advisor, create_app, db, purge, replica_router,
+                 response_cache, seeding)
+from app.cache import MemoryBackend, RedisBackend
+from app.models import ShoppingList, ShoppingListItem, User
+from app.serializers import format_datetime
+from sqlalchemy import event
+from tests import StandInRedis
+from werkzeug.http import http_date
 
 
 class ShoppingListTests(TestCase):
@@ -75,6 +86,41 @@ class ShoppingListTests(TestCase):
         # Check that the list previously created is returned
         self.assertIn('Back to School shopping', str(res.data))
 
+    def test_shoppinglists_are_paginated(self):
+        """Test API returns shopping lists a page at a time"""
+        self.register_user()
+        login_response = self.login_user()
+        access_token = json.loads(login_response.data.decode())['access_token']
+        headers = dict(Authorization="Bearer " + access_token)
+
+        # Lets create a few shopping lists to page through
+        for name in ['First list', 'Second list', 'Third list']:
+            self.client().post(
+                '/v1/shoppinglists/', headers=headers, data={'name': name})
+
+        first_page = self.client().get(
+            '/v1/shoppinglists/?limit=2', headers=headers)
+        self.assertEqual(first_page.status_code, 200)
+        self.assertEqual(
+            [shoppinglist['name']
+             for shoppinglist in json.loads(first_page.data.decode())],
+            ['First list', 'Second list'])
+
+        # Follow the link to the next page
+        next_url = first_page.headers['Link'].split(';')[0].strip('<>')
+        second_page = self.client().get(next_url, headers=headers)
+        self.assertEqual(second_page.status_code, 200)
+        self.assertEqual(
+            [shoppinglist['name']
+             for shoppinglist in json.loads(second_page.data.decode())],
+            ['Third list'])
+        self.assertNotIn('Link', second_page.headers)
+
+        # A cursor that was not issued by the API is rejected
+        bad_cursor = self.client().get(
+            '/v1/shoppinglists/?cursor=!!', headers=headers)
+        self.assertEqual(bad_cursor.status_code, 400)
+
     def test_api_can_get_shoppinglist_by_id(self):
         """Test API can get a single shoppinglist by using it's id."""
         self.register_user()
@@ -173,6 +219,67 @@ class ShoppingListTests(TestCase):
         # Check that the server could not find the resource
         self.assertEqual(response.status_code, 404)
 
+    def create_list_with_items(self, headers, items=5):
+        """Creates a shopping list holding items items and returns its id"""
+        new_list_response = self.client().post(
+            '/v1/shoppinglists/', headers=headers,
+            data={'name': 'Big party'})
+        shoppinglist_id = json.loads(new_list_response.data.decode())['id']
+        self.client().post(
+            '/v1/shoppinglists/{}/items/batch'.format(shoppinglist_id),
+            headers=headers,
+            data=json.dumps([{'name': 'Item {}'.format(index)}
+                             for index in range(items)]),
+            content_type='application/json')
+        return shoppinglist_id
+
+    def test_deleted_shoppinglists_are_purged_in_chunks(self):
+        """Test deleting a list hides it at once and the purge worker
+        removes it and its items later"""
+        self.register_user()
+        login_response = self.login_user()
+        access_token = json.loads(login_response.data.decode())['access_token']
+        headers = dict(Authorization="Bearer " + access_token)
+        shoppinglist_id = self.create_list_with_items(headers)
+
+        delete_response = self.client().delete(
+            '/v1/shoppinglists/{}'.format(shoppinglist_id), headers=headers)
+        self.assertEqual(delete_response.status_code, 200)
+        for url in ['/v1/shoppinglists/{}', '/v1/shoppinglists/{}/items']:
+            response = self.client().get(
+                url.format(shoppinglist_id), headers=headers)
+            self.assertEqual(response.status_code, 404)
+        response = self.client().delete(
+            '/v1/shoppinglists/{}'.format(shoppinglist_id), headers=headers)
+        self.assertEqual(response.status_code, 404)
+
+        with self.app.app_context():
+            self.assertEqual(ShoppingListItem.query.count(), 5)
+            self.assertEqual(purge.purge(batch_size=2), (1, 5))
+            self.assertEqual(ShoppingList.query.count(), 0)
+            self.assertEqual(ShoppingListItem.query.count(), 0)
+            self.assertEqual(purge.purge(), (0, 0))
+
+    def test_shoppinglist_items_are_deleted_by_the_database(self):
+        """Test deleting a list right away deletes its items through
+        ON DELETE CASCADE"""
+        self.app.config['SOFT_DELETE_LISTS'] = False
+        self.register_user()
+        login_response = self.login_user()
+        access_token = json.loads(login_response.data.decode())['access_token']
+        headers = dict(Authorization="Bearer " + access_token)
+        shoppinglist_id = self.create_list_with_items(headers)
+        kept_id = self.create_list_with_items(headers, items=2)
+
+        delete_response = self.client().delete(
+            '/v1/shoppinglists/{}'.format(shoppinglist_id), headers=headers)
+        self.assertEqual(delete_response.status_code, 200)
+        with self.app.app_context():
+            self.assertIsNone(ShoppingList.query.get(shoppinglist_id))
+            self.assertEqual(
+                [item.shoppinglist_id
+                 for item in ShoppingListItem.query.all()], [kept_id] * 2)
+
     def test_shoppinglist_item_creation(self):
         """Test API can add items to a shopping list"""
         self.register_user()
@@ -204,6 +311,444 @@ class ShoppingListTests(TestCase):
         # Lets check that the server managed to create resource
         self.assertEqual(add_item_response.status_code, 201)
 
+    def test_shoppinglist_items_are_paginated(self):
+        """Test API returns the items of a list a page at a time"""
+        self.register_user()
+        login_response = self.login_user()
+        access_token = json.loads(login_response.data.decode())['access_token']
+        headers = dict(Authorization="Bearer " + access_token)
+
+        new_list_response = self.client().post(
+            '/v1/shoppinglists/', headers=headers, data={'name': 'Groceries'})
+        list_id = json.loads(new_list_response.data.decode())['id']
+        items_url = '/v1/shoppinglists/{}/items'.format(list_id)
+        for name in ['Milk', 'Bread', 'Eggs']:
+            self.client().post(items_url, headers=headers, data={'name': name})
+
+        first_page = self.client().get(
+            items_url + '?limit=2', headers=headers)
+        self.assertEqual(
+            [item['name'] for item in json.loads(first_page.data.decode())],
+            ['Milk', 'Bread'])
+
+        next_url = first_page.headers['Link'].split(';')[0].strip('<>')
+        second_page = self.client().get(next_url, headers=headers)
+        self.assertEqual(
+            [item['name'] for item in json.loads(second_page.data.decode())],
+            ['Eggs'])
+
+        # Nothing was modified after the far future
+        future_page = self.client().get(
+            items_url + '?since=2100-01-01T00:00:00Z', headers=headers)
+        self.assertEqual(future_page.status_code, 200)
+        self.assertEqual(json.loads(future_page.data.decode()), [])
+
+        # Another user can not see the items of this list
+        self.register_user(email='other@test.com')
+        other_login = self.login_user(email='other@test.com')
+        other_token = json.loads(other_login.data.decode())['access_token']
+        other_response = self.client().get(
+            items_url, headers=dict(Authorization="Bearer " + other_token))
+        self.assertEqual(other_response.status_code, 404)
+
+    def test_unchanged_collections_are_not_modified(self):
+        """Test API answers conditional GETs with 304 until the lists or
+        items change"""
+        self.register_user()
+        login_response = self.login_user()
+        access_token = json.loads(login_response.data.decode())['access_token']
+        headers = dict(Authorization="Bearer " + access_token)
+
+        new_list_response = self.client().post(
+            '/v1/shoppinglists/', headers=headers, data={'name': 'Groceries'})
+        list_id = json.loads(new_list_response.data.decode())['id']
+        items_url = '/v1/shoppinglists/{}/items'.format(list_id)
+        self.client().post(items_url, headers=headers, data={'name': 'Milk'})
+
+        # Lets date the last change in the past, as if it was made a while
+        # ago, since a burst of changes is dated ahead of the clock
+        with self.app.app_context():
+            User.query.update({'lists_modified_at': datetime(2017, 1, 1)})
+            db.session.commit()
+
+        for url in ['/v1/shoppinglists/', items_url]:
+            response = self.client().get(url, headers=headers)
+            self.assertEqual(response.status_code, 200)
+            etag = response.headers['ETag']
+            self.assertIn('ETag', response.headers[
+                'Access-Control-Expose-Headers'])
+
+            cached = self.client().get(
+                url, headers=dict(headers, **{'If-None-Match': etag}))
+            self.assertEqual(cached.status_code, 304)
+            self.assertEqual(cached.data, b'')
+            cached = self.client().get(
+                url,
+                headers=dict(headers, **{
+                    'If-Modified-Since': response.headers['Last-Modified']
+                }))
+            self.assertEqual(cached.status_code, 304)
+
+            # Another page is another representation
+            other_page = self.client().get(
+                url + '?limit=1', headers=dict(headers,
+                                               **{'If-None-Match': etag}))
+            self.assertEqual(other_page.status_code, 200)
+
+        # Deleting an item changes the items of the list
+        item_id = json.loads(self.client().post(
+            items_url, headers=headers, data={'name': 'Bread'}).data.decode())[
+                'id']
+        etag = self.client().get(items_url, headers=headers).headers['ETag']
+        self.client().delete(
+            '{}/{}'.format(items_url, item_id), headers=headers)
+        response = self.client().get(
+            items_url, headers=dict(headers, **{'If-None-Match': etag}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(json.loads(response.data.decode())), 1)
+
+    def test_collections_are_modified_by_renames_in_the_same_second(self):
+        """Test a conditional GET returns the new data after a row is renamed,
+        however soon after the previous change"""
+        self.register_user()
+        login_response = self.login_user()
+        access_token = json.loads(login_response.data.decode())['access_token']
+        headers = dict(Authorization="Bearer " + access_token)
+
+        list_id = json.loads(self.client().post(
+            '/v1/shoppinglists/', headers=headers,
+            data={'name': 'Groceries'}).data.decode())['id']
+        list_url = '/v1/shoppinglists/{}'.format(list_id)
+        items_url = list_url + '/items'
+        item_id = json.loads(self.client().post(
+            items_url, headers=headers, data={'name': 'Milk'}).data.decode())[
+                'id']
+
+        renames = [
+            ('/v1/shoppinglists/', lambda name: self.client().put(
+                list_url, headers=headers, data={'name': name})),
+            ('/v1/shoppinglists/?include=items', lambda name: self.client(
+            ).put('{}/{}'.format(items_url, item_id), headers=headers,
+                  data={'name': name})),
+            (items_url, lambda name: self.client().patch(
+                items_url + '/batch', headers=headers,
+                data=json.dumps({'ids': [item_id], 'name': name}),
+                content_type='application/json')),
+        ]
+        for url, rename in renames:
+            for name in ['First name', 'Second name']:
+                response = self.client().get(url, headers=headers)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(rename(name).status_code, 200)
+
+                # Changes this close together are dated ahead of the clock
+                # and sent without a date, so lets send the current one
+                for validators in [{
+                        'If-None-Match': response.headers['ETag']
+                }, {
+                        'If-Modified-Since': response.headers.get(
+                            'Last-Modified', http_date(datetime.utcnow()))
+                }]:
+                    renamed = self.client().get(
+                        url, headers=dict(headers, **validators))
+                    self.assertEqual(renamed.status_code, 200)
+                    self.assertIn(name, renamed.data.decode())
+
+    def test_items_can_be_included_in_lists(self):
+        """Test API embeds the items of every list on a page with a number
+        of queries that does not grow with the lists"""
+        self.register_user()
+        login_response = self.login_user()
+        access_token = json.loads(login_response.data.decode())['access_token']
+        headers = dict(Authorization="Bearer " + access_token)
+
+        def create_list(name, items):
+            response = self.client().post(
+                '/v1/shoppinglists/', headers=headers, data={'name': name})
+            list_id = json.loads(response.data.decode())['id']
+            for item in items:
+                self.client().post(
+                    '/v1/shoppinglists/{}/items'.format(list_id),
+                    headers=headers,
+                    data={'name': item})
+            return list_id
+
+        def count_queries(url):
+            statements = []
+            with self.app.app_context():
+                engine = db.engine
+
+                def count(*args):
+                    statements.append(args[2])
+
+                event.listen(engine, 'before_cursor_execute', count)
+                try:
+                    response = self.client().get(url, headers=headers)
+                finally:
+                    event.remove(engine, 'before_cursor_execute', count)
+            return response, len(statements)
+
+        groceries_id = create_list('Groceries', ['Milk', 'Bread'])
+        create_list('Hardware', [])
+        url = '/v1/shoppinglists/?include=items,item_count'
+        response, few_lists_queries = count_queries(url)
+        self.assertEqual(response.status_code, 200)
+        groceries, hardware = json.loads(response.data.decode())
+        self.assertEqual([item['name'] for item in groceries['items']],
+                         ['Milk', 'Bread'])
+        self.assertEqual(groceries['item_count'], 2)
+        self.assertEqual(hardware['items'], [])
+        self.assertEqual(hardware['item_count'], 0)
+
+        for index in range(3):
+            create_list('List {}'.format(index), ['Eggs'])
+        response, many_lists_queries = count_queries(url)
+        self.assertEqual(len(json.loads(response.data.decode())), 5)
+        self.assertEqual(many_lists_queries, few_lists_queries)
+
+        # Adding an item changes the lists that include it
+        etag = response.headers['ETag']
+        self.client().post(
+            '/v1/shoppinglists/{}/items'.format(groceries_id),
+            headers=headers,
+            data={'name': 'Eggs'})
+        response = self.client().get(
+            url, headers=dict(headers, **{'If-None-Match': etag}))
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client().get(
+            '/v1/shoppinglists/{}?include=item_count'.format(groceries_id),
+            headers=headers)
+        self.assertEqual(json.loads(response.data.decode())[0]['item_count'],
+                         3)
+        response = self.client().get(
+            '/v1/shoppinglists/?include=owner', headers=headers)
+        self.assertEqual(response.status_code, 400)
+
+    def test_embedded_items_are_capped_per_list(self):
+        """Test lists embed a bounded number of items and link to the rest"""
+        self.register_user()
+        login_response = self.login_user()
+        access_token = json.loads(login_response.data.decode())['access_token']
+        headers = dict(Authorization="Bearer " + access_token)
+
+        self.app.config['MAX_EMBEDDED_ITEMS'] = 2
+        big_id = self.create_list_with_items(headers, items=3)
+        self.create_list_with_items(headers, items=2)
+
+        response = self.client().get(
+            '/v1/shoppinglists/?include=items,item_count', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        big, small = json.loads(response.data.decode())
+        self.assertEqual([item['name'] for item in big['items']],
+                         ['Item 0', 'Item 1'])
+        self.assertEqual(big['item_count'], 3)
+        self.assertEqual(len(small['items']), 2)
+        self.assertNotIn('items_next', small)
+
+        next_response = self.client().get(big['items_next'], headers=headers)
+        self.assertIn('/v1/shoppinglists/{}/items'.format(big_id),
+                      big['items_next'])
+        self.assertEqual(
+            [item['name'] for item in json.loads(
+                next_response.data.decode())], ['Item 2'])
+
+    def test_responses_are_cached_until_changed(self):
+        """Test API serves GETs from the response cache until the user's
+        lists or items change"""
+        self.register_user()
+        login_response = self.login_user()
+        access_token = json.loads(login_response.data.decode())['access_token']
+        headers = dict(Authorization="Bearer " + access_token)
+
+        new_list_response = self.client().post(
+            '/v1/shoppinglists/', headers=headers, data={'name': 'Groceries'})
+        list_id = json.loads(new_list_response.data.decode())['id']
+        items_url = '/v1/shoppinglists/{}/items'.format(list_id)
+        item_response = self.client().post(
+            items_url, headers=headers, data={'name': 'Milk'})
+        item_id = json.loads(item_response.data.decode())['id']
+
+        for url in ['/v1/shoppinglists/', items_url]:
+            first = self.client().get(url, headers=headers)
+            self.assertEqual(first.headers['X-Cache'], 'MISS')
+            second = self.client().get(url, headers=headers)
+            self.assertEqual(second.headers['X-Cache'], 'HIT')
+            self.assertEqual(second.data, first.data)
+            cached = self.client().get(
+                url, headers=dict(headers,
+                                  **{'If-None-Match': first.headers['ETag']}))
+            self.assertEqual(cached.status_code, 304)
+
+        # Editing an item is seen straight away
+        self.client().put(
+            '{}/{}'.format(items_url, item_id),
+            headers=headers,
+            data={'name': 'Soy milk'})
+        response = self.client().get(items_url, headers=headers)
+        self.assertEqual(response.headers['X-Cache'], 'MISS')
+        self.assertEqual(json.loads(response.data.decode())[0]['name'],
+                         'Soy milk')
+
+        self.client().delete(
+            '/v1/shoppinglists/{}'.format(list_id), headers=headers)
+        response = self.client().get('/v1/shoppinglists/', headers=headers)
+        self.assertEqual(json.loads(response.data.decode()), [])
+
+        stats = json.loads(
+            self.client().get('/v1/instrumentation').data.decode())
+        self.assertEqual(stats['response_cache']['hits'], 4)
+        self.assertGreater(stats['response_cache']['hit_ratio'], 0)
+
+    def test_response_cache_generations_are_bounded(self):
+        """Test the memory backend keeps a bounded number of generations and
+        never hands out one it used before"""
+        backend = MemoryBackend(2, 60)
+        seen = set()
+        for user_id in [1, 2, 1, 3, 4, 1, 2]:
+            seen.add(backend.generation(user_id))
+            backend.bump(user_id)
+            generation = backend.generation(user_id)
+            self.assertNotIn(generation, seen)
+            seen.add(generation)
+        self.assertEqual(backend._generations.stats()['size'], 2)
+
+    def test_response_cache_can_be_shared(self):
+        """Test the shared backend of the response cache works against a
+        local stand-in for Redis"""
+
+        self.register_user()
+        login_response = self.login_user()
+        access_token = json.loads(login_response.data.decode())['access_token']
+        headers = dict(Authorization="Bearer " + access_token)
+        response_cache.backend = RedisBackend(StandInRedis(), 60)
+
+        first = self.client().get('/v1/shoppinglists/', headers=headers)
+        second = self.client().get('/v1/shoppinglists/', headers=headers)
+        self.assertEqual(second.headers['X-Cache'], 'HIT')
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second.headers['ETag'], first.headers['ETag'])
+
+        self.client().post(
+            '/v1/shoppinglists/', headers=headers, data={'name': 'Groceries'})
+        response = self.client().get('/v1/shoppinglists/', headers=headers)
+        self.assertEqual(response.headers['X-Cache'], 'MISS')
+        self.assertEqual(len(json.loads(response.data.decode())), 1)
+
+    def test_reads_go_to_replicas_after_the_stickiness_window(self):
+        """Test API reads from a replica unless the user just wrote"""
+        replica_uri = 'sqlite:///' + os.path.join(tempfile.mkdtemp(),
+                                                  'replica.db')
+        self.app.config['SQLALCHEMY_REPLICA_URIS'] = [replica_uri]
+        replica_router.init_app(self.app)
+        # The response cache would answer before the database is picked
+        response_cache.enabled = False
+        with self.app.app_context():
+            db.Model.metadata.create_all(
+                bind=db.get_engine(self.app, bind='replica_0'))
+
+        self.register_user()
+        login_response = self.login_user()
+        access_token = json.loads(login_response.data.decode())['access_token']
+        headers = dict(Authorization="Bearer " + access_token)
+        self.client().post(
+            '/v1/shoppinglists/', headers=headers, data={'name': 'Groceries'})
+
+        # The user just wrote, so they read their list from the primary
+        response = self.client().get('/v1/shoppinglists/', headers=headers)
+        self.assertEqual(len(json.loads(response.data.decode())), 1)
+
+        # Nothing replicates to the test replica, so once the window is
+        # over the list can not be seen there
+        replica_router._sticky.clear()
+        response = self.client().get('/v1/shoppinglists/', headers=headers)
+        self.assertEqual(json.loads(response.data.decode()), [])
+        self.assertEqual(replica_router.stats()['replica_reads'], 1)
+
+    def test_shoppinglist_items_can_be_added_in_batch(self):
+        """Test API can add many items to a shopping list in one request"""
+        self.register_user()
+        login_response = self.login_user()
+        access_token = json.loads(login_response.data.decode())['access_token']
+        headers = dict(Authorization="Bearer " + access_token)
+
+        new_list_response = self.client().post(
+            '/v1/shoppinglists/', headers=headers, data={'name': 'Groceries'})
+        list_id = json.loads(new_list_response.data.decode())['id']
+        batch_url = '/v1/shoppinglists/{}/items/batch'.format(list_id)
+
+        batch_response = self.client().post(
+            batch_url,
+            headers=headers,
+            content_type='application/json',
+            data=json.dumps([{'name': 'Milk', 'description': '2 litres'},
+                             {'name': 'Bread'}]))
+        self.assertEqual(batch_response.status_code, 201)
+        created = json.loads(batch_response.data.decode())
+        self.assertEqual([item['name'] for item in created],
+                         ['Milk', 'Bread'])
+        self.assertEqual(created[0]['description'], '2 litres')
+
+        # A batch with an invalid item is rejected as a whole
+        invalid_response = self.client().post(
+            batch_url,
+            headers=headers,
+            content_type='application/json',
+            data=json.dumps([{'name': 'Eggs'}, {'description': 'no name'}]))
+        self.assertEqual(invalid_response.status_code, 400)
+
+        items_response = self.client().get(
+            '/v1/shoppinglists/{}/items'.format(list_id), headers=headers)
+        self.assertEqual(len(json.loads(items_response.data.decode())), 2)
+
+    def test_shoppinglist_items_can_be_changed_in_batch(self):
+        """Test API can update and delete many items in one request"""
+        self.register_user()
+        login_response = self.login_user()
+        access_token = json.loads(login_response.data.decode())['access_token']
+        headers = dict(Authorization="Bearer " + access_token)
+
+        new_list_response = self.client().post(
+            '/v1/shoppinglists/', headers=headers, data={'name': 'Groceries'})
+        list_id = json.loads(new_list_response.data.decode())['id']
+        batch_url = '/v1/shoppinglists/{}/items/batch'.format(list_id)
+        created = json.loads(self.client().post(
+            batch_url,
+            headers=headers,
+            content_type='application/json',
+            data=json.dumps([{'name': 'Milk'}, {'name': 'Bread'},
+                             {'name': 'Eggs'}])).data.decode())
+
+        update_response = self.client().patch(
+            batch_url,
+            headers=headers,
+            content_type='application/json',
+            data=json.dumps({'ids': [created[0]['id'], created[1]['id']],
+                             'description': 'Bought'}))
+        self.assertEqual(update_response.status_code, 200)
+        self.assertEqual(json.loads(update_response.data.decode())['count'],
+                         2)
+
+        delete_response = self.client().delete(
+            batch_url,
+            headers=headers,
+            content_type='application/json',
+            data=json.dumps({'ids': 'all'}))
+        self.assertEqual(delete_response.status_code, 200)
+        self.assertEqual(json.loads(delete_response.data.decode())['count'],
+                         3)
+
+        # Another user's list can not be changed
+        self.register_user(email='other@test.com')
+        other_login = self.login_user(email='other@test.com')
+        other_token = json.loads(other_login.data.decode())['access_token']
+        other_response = self.client().delete(
+            batch_url,
+            headers=dict(Authorization="Bearer " + other_token),
+            content_type='application/json',
+            data=json.dumps({'ids': 'all'}))
+        self.assertEqual(other_response.status_code, 404)
+
     def test_shoppinglist_item_edited(self):
         """Test that API can edit items to list"""
         self.register_user()
@@ -288,6 +833,66 @@ class ShoppingListTests(TestCase):
         )
         self.assertEqual(delete_item_response.status_code, 200)
 
+    def test_serializers_format_dates_like_flask(self):
+        """Test serialized dates match the format of Flask's jsonify"""
+        for value in [datetime(2017, 1, 1), datetime(2017, 10, 17, 9, 5, 3),
+                      datetime(2020, 2, 29, 23, 59, 59, 999999)]:
+            self.assertEqual(format_datetime(value), http_date(value))
+        self.assertIsNone(format_datetime(None))
+
+        self.register_user()
+        login_response = self.login_user()
+        access_token = json.loads(login_response.data.decode())['access_token']
+        headers = dict(Authorization="Bearer " + access_token)
+        new_list_response = self.client().post(
+            '/v1/shoppinglists/', headers=headers, data={'name': 'Groceries'})
+        shoppinglist = json.loads(new_list_response.data.decode())
+        item_response = self.client().post(
+            '/v1/shoppinglists/{}/items'.format(shoppinglist['id']),
+            headers=headers,
+            data={'name': 'Milk', 'description': '2 litres'})
+        item = json.loads(item_response.data.decode())
+        self.assertEqual(item['shoppinglist_id'], shoppinglist['id'])
+        self.assertEqual(item['user_id'], shoppinglist['user_id'])
+        self.assertTrue(item['date_created'].endswith(' GMT'))
+
+    def test_hot_queries_use_indexes(self):
+        """Test none of the queries behind the busy endpoints scans a whole
+        table"""
+        with self.app.app_context():
+            report, flagged = advisor.advise()
+            self.assertEqual(flagged, 0, '\n'.join(report))
+
+    def test_seeded_data_can_be_used(self):
+        """Test the seeder adds the same skewed data for the same seed and
+        its users can log in"""
+        with self.app.app_context():
+            report = seeding.seed(5, lists_per_user=2, items_per_list=3,
+                                  power_users=1, power_user_lists=20,
+                                  batch_size=7)
+            rows = dict((table['table'], table['rows']) for table in report)
+            self.assertEqual(rows['users'], 5)
+            self.assertEqual(ShoppingList.query.count(), rows['shoppinglist'])
+            self.assertEqual(ShoppingListItem.query.count(),
+                             rows['item_shoppinglist'])
+            self.assertEqual(
+                ShoppingList.query.filter_by(user_id=1).count(), 20)
+            items = [(item.name, item.description) for item in
+                     ShoppingListItem.query.order_by(ShoppingListItem.id)]
+
+            db.session.remove()
+            db.drop_all()
+            db.create_all()
+            seeding.seed(5, lists_per_user=2, items_per_list=3,
+                         power_users=1, power_user_lists=20, batch_size=7)
+            self.assertEqual(items, [
+                (item.name, item.description) for item in
+                ShoppingListItem.query.order_by(ShoppingListItem.id)])
+
+        login_response = self.login_user(email='user1@example.com',
+                                         password='seed1234')
+        self.assertEqual(login_response.status_code, 200)
+
 
 # Make the tests conveniently executable
 if __name__ == "__main__":
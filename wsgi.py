@@ -0,0 +1,15 @@
+"""This file is the production entry point of the API. Serve it with
+gunicorn using the settings in gunicorn.conf.py:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+import os
+
+from app import create_app, warmup
+
+config_name = os.getenv('APP_SETTINGS', 'production')
+app = create_app(config_name)
+
+# Lets open the database connections and load the caches before this
+# worker accepts its first request
+warmup.warm_up(app)